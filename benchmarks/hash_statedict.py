@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the time needed to hash statedicts similar to the ones
+produced by file items and nodes and compares it to the previous
+implementation (which copied every dict into an OrderedDict first).
+
+Usage: python benchmarks/hash_statedict.py [STATEDICT_COUNT]
+"""
+from __future__ import print_function, unicode_literals
+
+from hashlib import sha1
+from json import dumps
+import sys
+from time import time
+
+from bundlewrap.utils.statedict import hash_statedict, order_dict
+
+
+def hash_statedict_ordered(sdict):
+    return sha1(dumps(order_dict(sdict)).encode('utf-8')).hexdigest()
+
+
+def make_statedicts(count):
+    statedicts = []
+    for i in range(count):
+        statedicts.append({
+            'content_hash': sha1(str(i).encode('utf-8')).hexdigest(),
+            'group': "root",
+            'mode': "0644",
+            'owner': "root",
+            'paths': ["/etc/bw_bench/{}".format(i), "/srv/bw_bench/{}".format(i)],
+            'size': i,
+            'type': "file",
+        })
+    # a node-level statedict mapping item ids to item hashes
+    statedicts.append({
+        "file:/etc/bw_bench/{}".format(i): sha1(str(i).encode('utf-8')).hexdigest()
+        for i in range(count)
+    })
+    return statedicts
+
+
+def measure(hash_function, statedicts):
+    start = time()
+    hashes = [hash_function(sdict) for sdict in statedicts]
+    return hashes, time() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    statedicts = make_statedicts(count)
+
+    old_hashes, old_duration = measure(hash_statedict_ordered, statedicts)
+    new_hashes, new_duration = measure(hash_statedict, statedicts)
+    assert old_hashes == new_hashes
+
+    print("statedicts hashed:   {}".format(len(statedicts)))
+    print("with OrderedDict:    {:.3f}s".format(old_duration))
+    print("with sort_keys:      {:.3f}s".format(new_duration))
+
+
+if __name__ == '__main__':
+    main()
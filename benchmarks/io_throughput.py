@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures how many lines per second the IOManager can print when
+several worker processes log at the same time (e.g. `bw run` returning
+lots of output or debug logging during `bw apply`).
+
+Output goes to stdout as usual, so redirect it:
+
+Usage: python benchmarks/io_throughput.py [PROCESSES] [LINES_PER_PROCESS] > /dev/null
+"""
+from __future__ import print_function, unicode_literals
+
+from multiprocessing import Process
+import sys
+from time import time
+
+from bundlewrap.utils.ui import io
+
+
+def log_lines(io_params, count):
+    io.activate_as_child(*io_params)
+    for i in range(count):
+        io.stdout("[node{}] {}".format(i % 500, "x" * 60))
+    io.flush()
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    io.activate_as_parent()
+    start = time()
+    workers = [
+        Process(target=log_lines, args=(io.child_parameters, lines))
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    io.shutdown()
+    duration = time() - start
+
+    total = processes * lines
+    sys.stderr.write("lines printed:   {}\n".format(total))
+    sys.stderr.write("time:            {:.3f}s\n".format(duration))
+    sys.stderr.write("lines/sec:       {:.0f}\n".format(total / duration))
+
+
+if __name__ == '__main__':
+    main()
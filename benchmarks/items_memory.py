@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures memory used by and time needed to create a large number of
+items on a single node.
+
+Usage: python3 benchmarks/items_memory.py [ITEM_COUNT]
+
+Requires Python 3.4+ (for tracemalloc).
+"""
+from __future__ import print_function, unicode_literals
+
+from os import mkdir
+import sys
+from tempfile import mkdtemp
+from time import time
+import tracemalloc
+
+from bundlewrap.repo import Repository
+from bundlewrap.utils.ui import io
+
+
+def make_repo(path, item_count):
+    with open(path + "/nodes.py", 'w') as f:
+        f.write("nodes = {'node1': {'bundles': ['bundle1']}}\n")
+    with open(path + "/groups.py", 'w') as f:
+        f.write("groups = {}\n")
+    for dirname in ("bundles", "bundles/bundle1", "hooks", "items", "libs"):
+        mkdir(path + "/" + dirname)
+    with open(path + "/bundles/bundle1/bundle.py", 'w') as f:
+        f.write("files = {\n")
+        for i in range(item_count):
+            f.write("    '/tmp/bw_bench/{0}': {{'content': '{0}', 'needs': ['file:/tmp/bw_bench']}},\n".format(i))
+        f.write("    '/tmp/bw_bench': {'content': ''},\n")
+        f.write("}\n")
+
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    path = mkdtemp()
+    make_repo(path, item_count)
+
+    io.activate_as_parent()
+    try:
+        repo = Repository(path)
+        node = repo.get_node("node1")
+        # load the bundle file outside of the measurement
+        node.bundles[0].bundle_attrs
+
+        tracemalloc.start()
+        start = time()
+        items = list(node.items)
+        duration = time() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time()
+        for i in range(10):
+            for item in items:
+                item.id
+        id_duration = time() - start
+    finally:
+        io.shutdown()
+
+    print("items created:        {}".format(len(items)))
+    print("creation time:        {:.3f}s".format(duration))
+    print("memory in use:        {:.1f} MiB ({:.0f} bytes per item)".format(
+        current / 1024.0 / 1024.0,
+        float(current) / len(items),
+    ))
+    print("peak memory:          {:.1f} MiB".format(peak / 1024.0 / 1024.0))
+    print("10x item.id lookups:  {:.3f}s".format(id_duration))
+
+
+if __name__ == '__main__':
+    main()
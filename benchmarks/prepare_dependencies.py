@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the time needed to prepare item dependencies for nodes with
+increasing numbers of items. The time per item should stay roughly
+constant as the number of items grows.
+
+Usage: python benchmarks/prepare_dependencies.py [ITEM_COUNT ...]
+"""
+from __future__ import print_function, unicode_literals
+
+from os import mkdir
+import sys
+from tempfile import mkdtemp
+from time import time
+
+from bundlewrap.deps import prepare_dependencies
+from bundlewrap.repo import Repository
+from bundlewrap.utils.ui import io
+
+
+def make_repo(path, item_count):
+    with open(path + "/nodes.py", 'w') as f:
+        f.write("nodes = {'node1': {'bundles': ['bundle1']}}\n")
+    with open(path + "/groups.py", 'w') as f:
+        f.write("groups = {}\n")
+    for dirname in ("bundles", "bundles/bundle1", "hooks", "items", "libs"):
+        mkdir(path + "/" + dirname)
+    with open(path + "/bundles/bundle1/bundle.py", 'w') as f:
+        f.write("directories = {\n")
+        for i in range(item_count // 10 + 1):
+            f.write("    '/tmp/bw_bench/{0}': {{}},\n".format(i))
+        f.write("}\n")
+        f.write("files = {\n")
+        for i in range(item_count):
+            f.write("    '/tmp/bw_bench/{0}/{1}': {{'content': '{1}'}},\n".format(i // 10, i))
+        f.write("}\n")
+
+
+def measure(item_count):
+    path = mkdtemp()
+    make_repo(path, item_count)
+    repo = Repository(path)
+    node = repo.get_node("node1")
+    items = list(node.items)
+
+    start = time()
+    prepare_dependencies(items)
+    return len(items), time() - start
+
+
+def main():
+    item_counts = [int(arg) for arg in sys.argv[1:]] or [1000, 2000, 4000, 8000]
+
+    io.activate_as_parent()
+    try:
+        results = [measure(item_count) for item_count in item_counts]
+    finally:
+        io.shutdown()
+
+    print("{:>8}  {:>10}  {:>12}".format("items", "time", "per item"))
+    for item_count, duration in results:
+        print("{:>8}  {:>9.3f}s  {:>10.1f}us".format(
+            item_count,
+            duration,
+            duration * 1000000 / item_count,
+        ))
+
+
+if __name__ == '__main__':
+    main()
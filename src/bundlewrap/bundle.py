@@ -13,6 +13,17 @@ from .utils.text import validate_name
 FILENAME_BUNDLE = "bundle.py"
 
 
+def item_types(*type_names):
+    """
+    Decorator for item generators that will cause them to only be
+    called for items of the given types (e.g. "user").
+    """
+    def decorator(item_generator):
+        item_generator.item_types = type_names
+        return item_generator
+    return decorator
+
+
 class Bundle(object):
     """
     A collection of config items, bound to a node.
@@ -46,13 +57,14 @@ class Bundle(object):
 
     @cached_property
     def bundle_attrs(self):
-        return get_all_attrs_from_file(
-            self.bundle_file,
-            base_env={
-                'node': self.node,
-                'repo': self.repo,
-            },
-        )
+        with self.repo._metadata_reader(self.node):
+            return get_all_attrs_from_file(
+                self.bundle_file,
+                base_env={
+                    'node': self.node,
+                    'repo': self.repo,
+                },
+            )
 
     @property
     def item_generator_names(self):
@@ -29,6 +29,8 @@ def main(*args, **kwargs):
     io.activate_as_parent(debug=pargs.debug)
 
     environ.setdefault('BWADDHOSTKEYS', "1" if pargs.add_ssh_host_keys else "0")
+    if pargs.max_ssh_connections is not None:
+        environ['BWMAXSSHCONNECTIONS'] = str(pargs.max_ssh_connections)
 
     if len(text_args) >= 1 and (
         text_args[0] == "--version" or
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from ..concurrency import WorkerPool
 from ..exceptions import WorkerException
-from ..utils.cmdline import get_target_nodes
+from ..node import ApplyJob
+from ..scheduler import longest_first, record_durations, run_node_jobs
+from ..utils.cmdline import get_target_nodes, ssh_connection_summary
+from ..utils.events import EventLog, emit
 from ..utils.text import bold, green, red, yellow
 from ..utils.text import error_summary, mark_for_translation as _
 from ..utils.ui import io
@@ -36,7 +38,6 @@ def format_node_result(result):
 def bw_apply(repo, args):
     errors = []
     target_nodes = get_target_nodes(repo, args['target'])
-    pending_nodes = target_nodes[:]
 
     repo.hooks.apply_start(
         repo,
@@ -46,86 +47,151 @@ def bw_apply(repo, args):
     )
 
     start_time = datetime.now()
+    events = None if args['events'] is None else EventLog(args['events'])
+    emit(
+        events,
+        'run_start',
+        command='apply',
+        nodes=[node.name for node in target_nodes],
+        target=args['target'],
+    )
 
-    worker_count = 1 if args['interactive'] else args['node_workers']
-    with WorkerPool(workers=worker_count) as worker_pool:
+    try:
+        drift_check_interval = None
+        if args['drift_check_hours'] is not None:
+            drift_check_interval = timedelta(hours=args['drift_check_hours'])
+
+        if args['interactive']:
+            node_workers = item_workers = workers = 1
+        else:
+            node_workers = args['node_workers']
+            item_workers = args['item_workers']
+            workers = args['workers'] or node_workers * item_workers
+
+        jobs = [
+            ApplyJob(
+                node,
+                drift_check_interval=drift_check_interval,
+                events=events,
+                fast=args['fast'],
+                force=args['force'],
+                interactive=args['interactive'],
+                # --drift-check-hours implies --skip-unchanged
+                skip_unchanged=args['skip_unchanged'] or drift_check_interval is not None,
+            ) for node in (
+                target_nodes if args['interactive'] else
+                longest_first(repo, target_nodes, 'apply')
+            )
+        ]
+
+        durations = {}
         results = {}
-        while worker_pool.keep_running():
-            try:
-                msg = worker_pool.get_event()
-            except WorkerException as e:
-                msg = "{} {}".format(red("!"), e.wrapped_exception)
-                if args['debug']:
-                    yield e.traceback
+        for job in run_node_jobs(
+            jobs,
+            workers=workers,
+            node_workers=node_workers,
+            item_workers=item_workers,
+            autoscale=args['autoscale'],
+        ):
+            node_name = job.node.name
+            if not job.done:
+                node_start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if args['interactive']:
+                    yield _("\n{}: run started at {}").format(
+                        bold(node_name),
+                        node_start_time,
+                    )
+                else:
+                    io.stdout(_("{}: run started at {}").format(
+                        node_name,
+                        node_start_time,
+                    ))
+                continue
+
+            for e in job.errors:
+                if isinstance(e, WorkerException):
+                    if args['debug']:
+                        yield e.traceback
+                    msg = "{} {}".format(red("!"), e.wrapped_exception)
+                    task_id = e.task_id
+                else:
+                    msg = "{} {}".format(red("!"), e)
+                    task_id = node_name
                 if not args['interactive']:
-                    msg = "{}: {}".format(e.task_id, msg)
+                    msg = "{}: {}".format(task_id, msg)
                 yield msg
                 errors.append(msg)
-                continue
-            if msg['msg'] == 'REQUEST_WORK':
-                if pending_nodes:
-                    node = pending_nodes.pop()
-                    node_start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+            if job.result is None:
+                if not job.errors:
+                    skipped_msg = _("{node}: skipped (configuration unchanged since last apply)")
                     if args['interactive']:
-                        yield _("\n{}: run started at {}").format(
-                            bold(node.name),
-                            node_start_time,
-                        )
+                        yield skipped_msg.format(node=bold(node_name))
                     else:
-                        io.stdout(_("{}: run started at {}").format(
-                            node.name,
-                            node_start_time,
-                        ))
-
-                    worker_pool.start_task(
-                        msg['wid'],
-                        node.apply,
-                        task_id=node.name,
-                        kwargs={
-                            'force': args['force'],
-                            'interactive': args['interactive'],
-                            'workers': args['item_workers'],
-                            'profiling': args['profiling'],
-                        },
-                    )
-                else:
-                    worker_pool.quit(msg['wid'])
-            elif msg['msg'] == 'FINISHED_WORK':
-                node_name = msg['task_id']
-                results[node_name] = msg['return_value']
-
-                if args['profiling']:
-                    total_time = 0.0
-                    yield _("{}: BEGIN PROFILING DATA (most expensive items first)").format(node_name)
-                    yield _("{}:    seconds   item").format(node_name)
-                    for time_elapsed, item_id in results[node_name].profiling_info:
-                        yield "{}: {:10.3f}   {}".format(node_name, time_elapsed.total_seconds(), item_id)
-                        total_time += time_elapsed.total_seconds()
-                    yield _("{}: {:10.3f}   (total)").format(node_name, total_time)
-                    yield _("{}: END PROFILING DATA").format(node_name)
-
-                if args['interactive']:
-                    yield _("\n{node}: run completed after {time}s ({stats})\n").format(
-                        node=bold(node_name),
-                        time=results[node_name].duration.total_seconds(),
-                        stats=format_node_result(results[node_name]),
+                        io.stdout(skipped_msg.format(node=node_name))
+                continue
+            results[node_name] = job.result
+            durations[node_name] = job.result.duration
+
+            if args['profiling']:
+                total_time = 0.0
+                yield _("{}: BEGIN PROFILING DATA (most expensive items first)").format(node_name)
+                yield _("{}:    seconds   item").format(node_name)
+                for time_elapsed, item_id in results[node_name].profiling_info:
+                    yield "{}: {:10.3f}   {}".format(
+                        node_name,
+                        time_elapsed.total_seconds(),
+                        item_id,
                     )
-                else:
-                    io.stdout(_("{node}: run completed after {time}s").format(
+                    total_time += time_elapsed.total_seconds()
+                yield _("{}: {:10.3f}   (total)").format(node_name, total_time)
+                for resource, usage in sorted(results[node_name].resource_usage.items()):
+                    yield _(
+                        "{node}: resource '{resource}' (capacity {capacity}) held for "
+                        "{held:.3f}s ({utilization:.0%} utilization), {delayed} item(s) "
+                        "had to wait for it"
+                    ).format(
+                        capacity=usage['capacity'],
+                        delayed=usage['delayed'],
+                        held=usage['held'].total_seconds(),
                         node=node_name,
-                        time=results[node_name].duration.total_seconds(),
-                    ))
-                    io.stdout(_("{node}: stats: {stats}").format(
-                        node=node_name,
-                        stats=format_node_result(results[node_name]),
-                    ))
-
-    error_summary(errors)
+                        resource=resource,
+                        utilization=usage['utilization'],
+                    )
+                yield _("{}: END PROFILING DATA").format(node_name)
+
+            if args['interactive']:
+                yield _("\n{node}: run completed after {time}s ({stats})\n").format(
+                    node=bold(node_name),
+                    time=results[node_name].duration.total_seconds(),
+                    stats=format_node_result(results[node_name]),
+                )
+            else:
+                io.stdout(_("{node}: run completed after {time}s").format(
+                    node=node_name,
+                    time=results[node_name].duration.total_seconds(),
+                ))
+                io.stdout(_("{node}: stats: {stats}").format(
+                    node=node_name,
+                    stats=format_node_result(results[node_name]),
+                ))
+
+        for line in ssh_connection_summary():
+            io.stdout(line)
+
+        record_durations(repo, 'apply', durations)
+
+        error_summary(errors)
+    finally:
+        # terminate the event stream even if the run was aborted
+        duration = datetime.now() - start_time
+        if events is not None:
+            events.emit('run_end', duration=duration.total_seconds(), errors=len(errors))
+            events.close()
 
     repo.hooks.apply_end(
         repo,
         args['target'],
         target_nodes,
-        duration=datetime.now() - start_time,
+        duration=duration,
     )
@@ -2,26 +2,64 @@
 from __future__ import unicode_literals
 
 from ..exceptions import NoSuchNode
+from ..utils.cache import read_cache, write_cache
 from ..utils.statedict import order_dict
-from ..utils.text import mark_for_translation as _, red
+from ..utils.text import mark_for_translation as _, red, validate_name
 
 
 def bw_hash(repo, args):
+    node = None
     if args['node_or_group']:
         try:
-            target = repo.get_node(args['node_or_group'])
+            node = target = repo.get_node(args['node_or_group'])
         except NoSuchNode:
             target = repo.get_group(args['node_or_group'])
             if args['item']:
                 yield _("{x} Cannot select item for group").format(x=red("!!!"))
                 yield 1
-                raise StopIteration()
+                return
         else:
             if args['item']:
                 target = target.get_item(args['item'])
     else:
         target = repo
 
+    if args['changed_since'] or args['save_snapshot']:
+        for snapshot_name in (args['changed_since'], args['save_snapshot']):
+            if snapshot_name is not None and not validate_name(snapshot_name):
+                yield _("{x} Invalid snapshot name: {name}").format(
+                    name=snapshot_name,
+                    x=red("!!!"),
+                )
+                yield 1
+                return
+        if args['item']:
+            yield _("{x} Cannot use snapshots for items").format(x=red("!!!"))
+            yield 1
+            return
+
+        if node is None:
+            node_hashes = target.cdict()
+        else:
+            node_hashes = {node.name: node.hash()}
+
+        if args['changed_since']:
+            snapshot = read_cache(repo.path, "hash_snapshots", args['changed_since'])
+            if snapshot is None:
+                yield _("{x} No such snapshot: {name}").format(
+                    name=args['changed_since'],
+                    x=red("!!!"),
+                )
+                yield 1
+                return
+            for node_name, node_hash in sorted(node_hashes.items()):
+                if snapshot.get(node_name) != node_hash:
+                    yield node_name
+
+        if args['save_snapshot']:
+            write_cache(repo.path, node_hashes, "hash_snapshots", args['save_snapshot'])
+        return
+
     if args['dict']:
         for key, value in order_dict(target.cdict()).items():
             yield "{}\t{}".format(key, value) if args['item'] else "{}  {}".format(value, key)
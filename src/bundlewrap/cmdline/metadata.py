@@ -3,20 +3,41 @@ from __future__ import unicode_literals
 
 from json import dumps
 
-from ..exceptions import NoSuchNode
+from ..exceptions import NoSuchNode, WorkerException
+from ..metadata import metadata_for_nodes
+from ..utils.cmdline import get_target_nodes
 from ..utils.text import force_text, mark_for_translation as _, red
 
 
 def bw_metadata(repo, args):
     try:
-        node = repo.get_node(args['node'])
+        node = repo.get_node(args['target'])
     except NoSuchNode:
-        yield _("{x} No such node: {node}").format(
-            node=args['node'],
+        if "," not in args['target'] and ":" not in args['target'] and \
+                args['target'] not in repo.group_dict:
+            yield _("{x} No such node: {node}").format(
+                node=args['target'],
+                x=red("!!!"),
+            )
+            yield 1
+            return
+    else:
+        for line in dumps(node.metadata, indent=4).splitlines():
+            yield force_text(line)
+        return
+
+    # multiple nodes: one JSON object per line as soon as it's ready
+    nodes = get_target_nodes(repo, args['target'])
+    try:
+        for node_name, metadata in metadata_for_nodes(nodes, workers=args['node_workers']):
+            yield force_text(dumps(
+                {'metadata': metadata, 'node': node_name},
+                sort_keys=True,
+            ))
+    except WorkerException as e:
+        yield _("{x} Failed to compute metadata for {node}").format(
+            node=e.task_id,
             x=red("!!!"),
         )
+        yield e.traceback
         yield 1
-        raise StopIteration()
-
-    for line in dumps(node.metadata, indent=4).splitlines():
-        yield force_text(line)
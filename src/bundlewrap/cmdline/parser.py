@@ -41,6 +41,15 @@ def build_parser_bw():
         dest='debug',
         help=_("print debugging info (implies -v)"),
     )
+    parser.add_argument(
+        "--max-ssh-connections",
+        default=None,
+        dest='max_ssh_connections',
+        help=_("never open more than N SSH connections at once "
+               "(across all nodes, see also BWMAXSSHCONNECTIONS)"),
+        metavar=_("N"),
+        type=int,
+    )
     parser.add_argument(
         "--version",
         action='version',
@@ -60,6 +69,40 @@ def build_parser_bw():
         type=str,
         help=_("target nodes, groups and/or bundle selectors"),
     )
+    parser_apply.add_argument(
+        "--autoscale",
+        action='store_true',
+        default=False,
+        dest='autoscale',
+        help=_("adjust the number of workers and parallel items while running, "
+               "using --workers and --parallel-items as upper bounds"),
+    )
+    parser_apply.add_argument(
+        "--drift-check-hours",
+        default=None,
+        dest='drift_check_hours',
+        help=_(
+            "like --skip-unchanged, but apply nodes anyway if their last "
+            "apply was more than HOURS ago"
+        ),
+        metavar=_("HOURS"),
+        type=float,
+    )
+    parser_apply.add_argument(
+        "--events",
+        default=None,
+        dest='events',
+        help=_("write apply progress as JSON lines to PATH or file descriptor N"),
+        metavar=_("PATH|fd:N"),
+    )
+    parser_apply.add_argument(
+        "--fast",
+        action='store_true',
+        default=False,
+        dest='fast',
+        help=_("trust files, directories and symlinks that haven't changed since "
+               "the last run with --fast instead of checking them in detail"),
+    )
     parser_apply.add_argument(
         "-f",
         "--force",
@@ -99,6 +142,22 @@ def build_parser_bw():
         dest='profiling',
         help=_("print time elapsed for each item"),
     )
+    parser_apply.add_argument(
+        "--skip-unchanged",
+        action='store_true',
+        default=False,
+        dest='skip_unchanged',
+        help=_("skip nodes whose configuration hasn't changed since their last successful apply"),
+    )
+    parser_apply.add_argument(
+        "-w",
+        "--workers",
+        default=None,
+        dest='workers',
+        help=_("total number of worker processes shared by all nodes "
+               "(defaults to parallel nodes times parallel items)"),
+        type=int,
+    )
 
     # bw debug
     parser_debug = subparsers.add_parser("debug")
@@ -138,6 +197,15 @@ def build_parser_bw():
     # bw hash
     parser_hash = subparsers.add_parser("hash", description="Shows a SHA1 hash that summarizes the entire configuration for this repo, node, group, or item.")
     parser_hash.set_defaults(func=bw_hash)
+    parser_hash.add_argument(
+        "-c",
+        "--changed-since",
+        default=None,
+        dest='changed_since',
+        metavar=_("SNAPSHOT"),
+        type=str,
+        help=_("list nodes whose hash differs from the one stored in SNAPSHOT"),
+    )
     parser_hash.add_argument(
         "-d",
         "--dict",
@@ -146,6 +214,15 @@ def build_parser_bw():
         dest='dict',
         help=_("instead show the data this hash is derived from"),
     )
+    parser_hash.add_argument(
+        "-s",
+        "--save-snapshot",
+        default=None,
+        dest='save_snapshot',
+        metavar=_("SNAPSHOT"),
+        type=str,
+        help=_("store node hashes as SNAPSHOT for use with --changed-since"),
+    )
     parser_hash.add_argument(
         'node_or_group',
         metavar=_("NODE|GROUP"),
@@ -191,10 +268,21 @@ def build_parser_bw():
     parser_metadata = subparsers.add_parser("metadata")
     parser_metadata.set_defaults(func=bw_metadata)
     parser_metadata.add_argument(
-        'node',
-        metavar=_("NODE"),
+        'target',
+        metavar=_("NODE1,NODE2,GROUP1,bundle:BUNDLE1..."),
         type=str,
-        help=_("node to print JSON-formatted metadata for"),
+        help=_(
+            "node to print JSON-formatted metadata for "
+            "(multiple targets will print one JSON object per node and line)"
+        ),
+    )
+    parser_metadata.add_argument(
+        "-p",
+        "--parallel-nodes",
+        default=4,
+        dest='node_workers',
+        help=_("number of nodes to compute metadata for simultaneously"),
+        type=int,
     )
 
     # bw nodes
@@ -254,12 +342,6 @@ def build_parser_bw():
         dest='depends_auto',
         help=_("do not show auto-generated dependencies and items"),
     )
-    parser_plot_subparsers_node.add_argument(
-        "--no-depends-conc",
-        action='store_false',
-        dest='depends_concurrency',
-        help=_("do not show concurrency blocker dependencies"),
-    )
     parser_plot_subparsers_node.add_argument(
         "--no-depends-regular",
         action='store_false',
@@ -396,6 +478,13 @@ def build_parser_bw():
         type=str,
         help=_("command to run"),
     )
+    parser_run.add_argument(
+        "--events",
+        default=None,
+        dest='events',
+        help=_("write run progress as JSON lines to PATH or file descriptor N"),
+        metavar=_("PATH|fd:N"),
+    )
     parser_run.add_argument(
         "-f",
         "--may-fail",
@@ -463,6 +552,32 @@ def build_parser_bw():
         dest='show_all',
         help=_("show correct items as well as incorrect ones"),
     )
+    parser_verify.add_argument(
+        "--autoscale",
+        action='store_true',
+        default=False,
+        dest='autoscale',
+        help=_("adjust the number of workers and parallel items while running, "
+               "using --workers and --parallel-items as upper bounds"),
+    )
+    parser_verify.add_argument(
+        "--drift-check-hours",
+        default=None,
+        dest='drift_check_hours',
+        help=_(
+            "like --skip-unchanged, but verify nodes anyway if their last "
+            "apply was more than HOURS ago"
+        ),
+        metavar=_("HOURS"),
+        type=float,
+    )
+    parser_verify.add_argument(
+        "--events",
+        default=None,
+        dest='events',
+        help=_("write verify progress as JSON lines to PATH or file descriptor N"),
+        metavar=_("PATH|fd:N"),
+    )
     parser_verify.add_argument(
         "-p",
         "--parallel-nodes",
@@ -479,6 +594,13 @@ def build_parser_bw():
         help=_("number of items to verify to simultaneously on each node"),
         type=int,
     )
+    parser_verify.add_argument(
+        "--skip-unchanged",
+        action='store_true',
+        default=False,
+        dest='skip_unchanged',
+        help=_("skip nodes whose configuration hasn't changed since their last successful apply"),
+    )
     parser_verify.add_argument(
         "-S",
         "---no-summary",
@@ -486,6 +608,15 @@ def build_parser_bw():
         dest='summary',
         help=_("show stats summary"),
     )
+    parser_verify.add_argument(
+        "-w",
+        "--workers",
+        default=None,
+        dest='workers',
+        help=_("total number of worker processes shared by all nodes "
+               "(defaults to parallel nodes times parallel items)"),
+        type=int,
+    )
 
     # bw zen
     parser_zen = subparsers.add_parser("zen")
@@ -11,7 +11,6 @@ def bw_plot_node(repo, args):
         node.name,
         prepare_dependencies(node.items),
         cluster=args['cluster'],
-        concurrency=args['depends_concurrency'],
         static=args['depends_static'],
         regular=args['depends_regular'],
         reverse=args['depends_reverse'],
@@ -5,12 +5,18 @@ from datetime import datetime
 
 from ..concurrency import WorkerPool
 from ..exceptions import WorkerException
-from ..utils.cmdline import get_target_nodes
-from ..utils.text import mark_for_translation as _
+from ..operations import connection_limiter
+from ..scheduler import longest_first, record_durations
+from ..utils.cmdline import get_target_nodes, ssh_connection_summary
+from ..utils.events import EventLog, emit
+from ..utils.text import force_text, mark_for_translation as _
 from ..utils.text import error_summary, green, red
 
 
 def run_on_node(node, command, may_fail, log_output):
+    """
+    Returns the return code of the command and the lines to be printed.
+    """
     node.repo.hooks.node_run_start(
         node.repo,
         node,
@@ -37,7 +43,7 @@ def run_on_node(node, command, may_fail, log_output):
     )
 
     if result.return_code == 0:
-        yield "[{}] {} {}".format(
+        line = "[{}] {} {}".format(
             node.name,
             green("✓"),
             _("completed successfully after {time}s").format(
@@ -45,7 +51,7 @@ def run_on_node(node, command, may_fail, log_output):
             ),
         )
     else:
-        yield "[{}] {} {}".format(
+        line = "[{}] {} {}".format(
             node.name,
             red("✘"),
             _("failed after {time}s (return code {rcode})").format(
@@ -53,12 +59,16 @@ def run_on_node(node, command, may_fail, log_output):
                 time=duration.total_seconds(),
             ),
         )
+    return result.return_code, [line]
 
 
 def bw_run(repo, args):
     errors = []
     target_nodes = get_target_nodes(repo, args['target'])
-    pending_nodes = target_nodes[:]
+    # the slowest nodes go last so they are pop()ed first
+    pending_nodes = longest_first(repo, target_nodes, 'run')
+    pending_nodes.reverse()
+    durations = {}
 
     repo.hooks.run_start(
         repo,
@@ -67,48 +77,96 @@ def bw_run(repo, args):
         args['command'],
     )
     start_time = datetime.now()
+    events = None if args['events'] is None else EventLog(args['events'])
+    emit(
+        events,
+        'run_start',
+        command=args['command'],
+        nodes=[node.name for node in target_nodes],
+        target=args['target'],
+    )
+
+    try:
+        connection_limiter.configure(target_nodes)
 
-    with WorkerPool(workers=args['node_workers']) as worker_pool:
-        while worker_pool.keep_running():
-            try:
-                msg = worker_pool.get_event()
-            except WorkerException as e:
-                msg = "[{}] {} {}".format(
-                    e.task_id,
-                    red("!"),
-                    e.wrapped_exception,
-                )
-                if args['debug']:
-                    yield e.traceback
-                yield msg
-                errors.append(msg)
-                continue
-            if msg['msg'] == 'REQUEST_WORK':
-                if pending_nodes:
-                    node = pending_nodes.pop()
-                    worker_pool.start_task(
-                        msg['wid'],
-                        run_on_node,
-                        task_id=node.name,
-                        args=(
-                            node,
-                            args['command'],
-                            args['may_fail'],
-                            True,
-                        ),
+        with WorkerPool(workers=args['node_workers']) as worker_pool:
+            while worker_pool.keep_running():
+                try:
+                    msg = worker_pool.get_event()
+                except WorkerException as e:
+                    msg = "[{}] {} {}".format(
+                        e.task_id,
+                        red("!"),
+                        e.wrapped_exception,
+                    )
+                    if args['debug']:
+                        yield e.traceback
+                    yield msg
+                    errors.append(msg)
+                    emit(
+                        events,
+                        'error',
+                        message=force_text(e.wrapped_exception),
+                        node=e.task_id,
+                        task=e.task_id,
+                    )
+                    emit(
+                        events,
+                        'node_end',
+                        errors=1,
+                        node=e.task_id,
+                        remote_calls=connection_limiter.connection_count(e.task_id),
                     )
-                else:
-                    worker_pool.quit(msg['wid'])
-            elif msg['msg'] == 'FINISHED_WORK':
-                for line in msg['return_value']:
-                    yield line
+                    continue
+                if msg['msg'] == 'REQUEST_WORK':
+                    if pending_nodes:
+                        node = pending_nodes.pop()
+                        emit(events, 'node_start', node=node.name)
+                        worker_pool.start_task(
+                            msg['wid'],
+                            run_on_node,
+                            task_id=node.name,
+                            args=(
+                                node,
+                                args['command'],
+                                args['may_fail'],
+                                True,
+                            ),
+                        )
+                    else:
+                        worker_pool.quit(msg['wid'])
+                elif msg['msg'] == 'FINISHED_WORK':
+                    durations[msg['task_id']] = msg['duration']
+                    return_code, lines = msg['return_value']
+                    emit(
+                        events,
+                        'node_end',
+                        duration=msg['duration'].total_seconds(),
+                        errors=0,
+                        node=msg['task_id'],
+                        remote_calls=connection_limiter.connection_count(msg['task_id']),
+                        return_code=return_code,
+                    )
+                    for line in lines:
+                        yield line
+
+        record_durations(repo, 'run', durations)
 
-    error_summary(errors)
+        for line in ssh_connection_summary():
+            yield line
+
+        error_summary(errors)
+    finally:
+        # terminate the event stream even if the run was aborted
+        duration = datetime.now() - start_time
+        if events is not None:
+            events.emit('run_end', duration=duration.total_seconds(), errors=len(errors))
+            events.close()
 
     repo.hooks.run_end(
         repo,
         args['target'],
         target_nodes,
         args['command'],
-        duration=datetime.now() - start_time,
+        duration=duration,
     )
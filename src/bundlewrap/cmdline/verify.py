@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from ..concurrency import WorkerPool
+from datetime import datetime, timedelta
+
 from ..exceptions import WorkerException
-from ..utils.cmdline import get_target_nodes
+from ..node import VerifyJob
+from ..scheduler import longest_first, record_durations, run_node_jobs
+from ..utils.cmdline import get_target_nodes, ssh_connection_summary
+from ..utils.events import EventLog, emit
 from ..utils.text import error_summary, mark_for_translation as _, red
+from ..utils.ui import io
 
 
 def stats_summary(node_stats):
@@ -62,42 +67,79 @@ def stats_summary(node_stats):
 
 
 def bw_verify(repo, args):
+    start_time = datetime.now()
     errors = []
+    durations = {}
     node_stats = {}
-    pending_nodes = get_target_nodes(repo, args['target'])
-    with WorkerPool(workers=args['node_workers']) as worker_pool:
-        while worker_pool.keep_running():
-            try:
-                msg = worker_pool.get_event()
-            except WorkerException as e:
-                msg = "{} {}: {}".format(
-                    red("!"),
-                    e.task_id,
-                    e.wrapped_exception,
-                )
-                if args['debug']:
-                    yield e.traceback
+    drift_check_interval = None
+    if args['drift_check_hours'] is not None:
+        drift_check_interval = timedelta(hours=args['drift_check_hours'])
+
+    target_nodes = get_target_nodes(repo, args['target'])
+    events = None if args['events'] is None else EventLog(args['events'])
+    emit(
+        events,
+        'run_start',
+        command='verify',
+        nodes=[node.name for node in target_nodes],
+        target=args['target'],
+    )
+
+    try:
+        jobs = [
+            VerifyJob(
+                node,
+                drift_check_interval=drift_check_interval,
+                events=events,
+                show_all=args['show_all'],
+                # --drift-check-hours implies --skip-unchanged
+                skip_unchanged=args['skip_unchanged'] or drift_check_interval is not None,
+            ) for node in longest_first(repo, target_nodes, 'verify')
+        ]
+
+        for job in run_node_jobs(
+            jobs,
+            workers=args['workers'] or args['node_workers'] * args['item_workers'],
+            node_workers=args['node_workers'],
+            item_workers=args['item_workers'],
+            autoscale=args['autoscale'],
+        ):
+            if not job.done:
+                continue
+            for e in job.errors:
+                if isinstance(e, WorkerException):
+                    if args['debug']:
+                        yield e.traceback
+                    msg = "{} {}: {}".format(red("!"), e.task_id, e.wrapped_exception)
+                else:
+                    msg = "{} {}: {}".format(red("!"), job.node.name, e)
                 yield msg
                 errors.append(msg)
+            if job.errors:
                 continue
-            if msg['msg'] == 'REQUEST_WORK':
-                if pending_nodes:
-                    node = pending_nodes.pop()
-                    worker_pool.start_task(
-                        msg['wid'],
-                        node.verify,
-                        task_id=node.name,
-                        kwargs={
-                            'show_all': args['show_all'],
-                            'workers': args['item_workers'],
-                        },
-                    )
-                else:
-                    worker_pool.quit(msg['wid'])
-            elif msg['msg'] == 'FINISHED_WORK':
-                node_stats[msg['task_id']] = msg['return_value']
-
-    if args['summary']:
-        for line in stats_summary(node_stats):
-            yield line
-    error_summary(errors)
+            if job.result is None:
+                io.stdout(_("{node}: skipped (configuration unchanged since last apply)").format(
+                    node=job.node.name,
+                ))
+            else:
+                node_stats[job.node.name] = job.result
+                durations[job.node.name] = job.duration
+
+        record_durations(repo, 'verify', durations)
+
+        if args['summary']:
+            for line in stats_summary(node_stats):
+                yield line
+        for line in ssh_connection_summary():
+            io.stdout(line)
+
+        error_summary(errors)
+    finally:
+        # terminate the event stream even if the run was aborted
+        if events is not None:
+            events.emit(
+                'run_end',
+                duration=(datetime.now() - start_time).total_seconds(),
+                errors=len(errors),
+            )
+            events.close()
@@ -5,8 +5,17 @@ from datetime import datetime
 from inspect import ismethod, isgenerator
 from multiprocessing import Manager, Pipe, Process
 import sys
+try:
+    from queue import Empty
+except ImportError:  # Python 2
+    from Queue import Empty
 from traceback import format_exception
 
+try:
+    import cPickle as pickle
+except ImportError:  # Python 3
+    import pickle
+
 from .exceptions import WorkerException
 from .utils.text import force_text, mark_for_translation as _
 from .utils.ui import io
@@ -28,8 +37,12 @@ def _worker_process(wid, messages, pipe, io_params):
         # request work via the public queue and, eventually, some day,
         # we might get an answer via our private pipe.
         messages.put({'msg': 'REQUEST_WORK', 'wid': wid})
-        msg = pipe.recv()
+        payload = pipe.recv_bytes()
+        unpickle_start = datetime.now()
+        msg = pickle.loads(payload)
+        unpickle_duration = datetime.now() - unpickle_start
         if msg['msg'] == 'DIE':
+            io.flush()
             return
         elif msg['msg'] == 'NOOP':
             pass
@@ -61,6 +74,9 @@ def _worker_process(wid, messages, pipe, io_params):
                 traceback = "".join([force_text(line) for line in format_exception(*sys.exc_info())])
                 return_value = None
 
+            # make sure everything logged by the task is printed
+            # before its result is processed
+            io.flush()
             messages.put({
                 'duration': datetime.now() - start,
                 'exception': exception,
@@ -69,6 +85,7 @@ def _worker_process(wid, messages, pipe, io_params):
                 'return_value': return_value,
                 'task_id': msg['task_id'],
                 'traceback': traceback,
+                'unpickle_duration': unpickle_duration,
                 'wid': wid,
             })
 
@@ -91,12 +108,15 @@ class WorkerPool(object):
         # explicitly as idle (don't confuse this with workers that
         # aren't processing a job right now).
         self.idle_workers = []
-        self.workers_alive = list(range(workers))
+        self.workers_alive = []
 
         # We don't need to know *which* worker is currently processing a
         # job. We only need to know how many there are.
         self.jobs_open = 0
 
+        # maps task ids to the size of the pickled task we sent
+        self.payload_sizes = {}
+
         # The public message queue. Workers ask for jobs here, report
         # finished work and log items.
         # Note: There's (at least) two ways to organize a pool like
@@ -113,11 +133,21 @@ class WorkerPool(object):
         self.messages = Manager().Queue()
 
         for i in range(workers):
-            (parent_conn, child_conn) = Pipe()
-            p = Process(target=_worker_process,
-                        args=(i, self.messages, child_conn, io.child_parameters))
-            p.start()
-            self.workers.append((p, parent_conn))
+            self._start_worker(i)
+
+    def _start_worker(self, wid):
+        (parent_conn, child_conn) = Pipe()
+        p = Process(target=_worker_process,
+                    args=(wid, self.messages, child_conn, io.child_parameters))
+        p.start()
+        self.workers.append((p, parent_conn))
+        self.workers_alive.append(wid)
+
+    def add_worker(self):
+        """
+        Starts another worker process. It will ask for work right away.
+        """
+        self._start_worker(len(self.workers))
 
     def __enter__(self):
         return self
@@ -125,13 +155,26 @@ class WorkerPool(object):
     def __exit__(self, type, value, traceback):
         self.shutdown()
 
-    def get_event(self):
+    def get_event(self, timeout=None):
         """
-        Blocks until a message from a worker is received.
+        Blocks until a message from a worker is received. Returns None
+        if there was no message within timeout seconds.
         """
-        msg = self.messages.get()
+        try:
+            msg = self.messages.get(timeout=timeout)
+        except Empty:
+            return None
         if msg['msg'] == 'FINISHED_WORK':
             self.jobs_open -= 1
+            msg['payload_size'] = self.payload_sizes.pop(msg['task_id'], None)
+            io.debug(_(
+                "task {task_id} ({size} bytes) unpickled by worker {wid} in {time}s"
+            ).format(
+                size=msg['payload_size'],
+                task_id=msg['task_id'],
+                time=msg['unpickle_duration'].total_seconds(),
+                wid=msg['wid'],
+            ))
             # check for exception in child process and raise it
             # here in the parent
             if not msg['traceback'] is None:
@@ -163,8 +206,7 @@ class WorkerPool(object):
         else:
             target_obj = None
 
-        (process, pipe) = self.workers[wid]
-        pipe.send({
+        payload = self._send(wid, {
             'msg': 'RUN',
             'task_id': task_id,
             'target': target,
@@ -172,9 +214,20 @@ class WorkerPool(object):
             'args': args,
             'kwargs': kwargs,
         })
+        self.payload_sizes[task_id] = len(payload)
 
         self.jobs_open += 1
 
+    def _send(self, wid, msg):
+        """
+        Pickles the given message and sends it to the given worker.
+        Returns the pickled message.
+        """
+        payload = pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)
+        (process, pipe) = self.workers[wid]
+        pipe.send_bytes(payload)
+        return payload
+
     def mark_idle(self, wid):
         """
         Mark a worker as "idle".
@@ -190,7 +243,7 @@ class WorkerPool(object):
         """
         (process, pipe) = self.workers[wid]
         try:
-            pipe.send({'msg': 'DIE'})
+            self._send(wid, {'msg': 'DIE'})
         except IOError:
             pass
         pipe.close()
@@ -220,8 +273,7 @@ class WorkerPool(object):
         for wid in self.idle_workers:
             # Send a noop to this worker. He will simply ask for new
             # work again.
-            (process, pipe) = self.workers[wid]
-            pipe.send({'msg': 'NOOP'})
+            self._send(wid, {'msg': 'NOOP'})
         self.idle_workers = []
 
     def keep_running(self):
@@ -229,3 +281,120 @@ class WorkerPool(object):
         Returns True if this pool is not ready to die.
         """
         return self.jobs_open > 0 or self.workers_alive
+
+
+class Autoscaler(object):
+    """
+    Decides how many tasks should be running at the same time, e.g.
+    for a single node or for an entire WorkerPool. Call observe() and
+    task_finished() as things happen, then read the current decision
+    from self.limit.
+
+    After each round (as many finished tasks as the current limit),
+    the limit is adjusted based on what has been observed during that
+    round:
+
+    - if too many tasks failed, the limit is halved
+    - if tasks took a lot longer on average than they did at a lower
+      limit, the limit is decreased by one
+    - if tasks were ready to start, but had to wait for a free slot,
+      the limit is increased by the number of waiting tasks (at most
+      doubling it)
+    - if fewer tasks were running than allowed, the limit is decreased
+      to the highest number of tasks actually running at once
+
+    The limit always stays within minimum and maximum.
+    """
+    ERROR_RATE = 0.25
+    LATENCY_FACTOR = 2.0
+
+    def __init__(self, name, minimum, maximum):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError(_("invalid bounds for {name}: {minimum}..{maximum}").format(
+                maximum=maximum,
+                minimum=minimum,
+                name=name,
+            ))
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = minimum
+        # (limit, avg. task duration in seconds) for the fastest round
+        self.best_round = None
+        self._new_round()
+
+    def _new_round(self):
+        self.duration = 0.0
+        self.failed = 0
+        self.finished = 0
+        self.peak_running = 0
+        self.peak_waiting = 0
+        self.timed = 0
+
+    def observe(self, running, waiting):
+        """
+        Tells the autoscaler how many tasks are running right now and
+        how many more could be started if the limit allowed it.
+        """
+        self.peak_running = max(self.peak_running, running)
+        self.peak_waiting = max(self.peak_waiting, waiting)
+
+    def task_finished(self, duration=None, failed=False):
+        """
+        duration    timedelta (None if unknown, e.g. for failed tasks)
+        failed      True if the task raised an exception
+        """
+        self.finished += 1
+        if failed:
+            self.failed += 1
+        if duration is not None:
+            self.duration += duration.total_seconds()
+            self.timed += 1
+        if self.finished >= self.limit:
+            self._adjust()
+
+    def _adjust(self):
+        error_rate = self.failed / float(self.finished)
+        latency = self.duration / self.timed if self.timed else None
+
+        if error_rate > self.ERROR_RATE:
+            limit = self.limit // 2
+            reason = _("{rate:.0f}% of tasks failed").format(rate=error_rate * 100)
+        elif (
+            latency is not None and
+            self.best_round is not None and
+            self.best_round[0] < self.limit and
+            latency > self.best_round[1] * self.LATENCY_FACTOR
+        ):
+            limit = self.limit - 1
+            reason = _(
+                "tasks took {latency:.2f}s on average, "
+                "{best:.2f}s with a limit of {limit}"
+            ).format(
+                best=self.best_round[1],
+                latency=latency,
+                limit=self.best_round[0],
+            )
+        elif self.peak_waiting:
+            limit = self.limit + min(self.limit, self.peak_waiting)
+            reason = _("up to {count} tasks were waiting").format(count=self.peak_waiting)
+        elif self.peak_running < self.limit:
+            limit = self.peak_running
+            reason = _("no more than {count} tasks were running").format(count=self.peak_running)
+        else:
+            limit = self.limit
+            reason = None
+
+        if latency is not None and (self.best_round is None or latency < self.best_round[1]):
+            self.best_round = (self.limit, latency)
+
+        limit = max(self.minimum, min(self.maximum, limit))
+        if limit != self.limit:
+            io.debug(_("autoscaling {name} from {old} to {new}: {reason}").format(
+                name=self.name,
+                new=limit,
+                old=self.limit,
+                reason=reason,
+            ))
+            self.limit = limit
+        self._new_round()
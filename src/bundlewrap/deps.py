@@ -2,8 +2,9 @@
 from __future__ import unicode_literals
 
 from .exceptions import BundleError, NoSuchItem
-from .items import Item
+from .items import Item, intern_item_id
 from .items.actions import Action
+from .utils.paths import PathIndex
 from .utils.text import mark_for_translation as _
 from .utils.ui import io
 
@@ -12,19 +13,32 @@ class BundleItem(object):
     """
     Represents a dependency on all items in a certain bundle.
     """
+    __slots__ = (
+        'bundle',
+        'preceded_by',
+        'triggers',
+        '_deps',
+        '_flattened_deps',
+        '_id',
+        '_precedes_items',
+        '_reverse_deps',
+    )
+
+    ITEM_TYPE_NAME = 'dummy'
+    NEEDS_STATIC = ()
+    needed_by = ()
+    needs = ()
+    precedes = ()
+    timeout = None
     triggered = False
+    triggered_by = ()
 
     def __init__(self, bundle):
-        self.NEEDS_STATIC = []
         self.bundle = bundle
-        self.ITEM_TYPE_NAME = 'dummy'
-        self.needed_by = []
-        self.needs = []
         self.preceded_by = []
-        self.precedes = []
-        self.triggered_by = []
         self.triggers = []
         self._deps = []
+        self._id = intern_item_id("bundle:{}".format(bundle.name))
         self._precedes_items = []
 
     def __lt__(self, other):
@@ -35,7 +49,7 @@ class BundleItem(object):
 
     @property
     def id(self):
-        return "bundle:{}".format(self.bundle.name)
+        return self._id
 
     def apply(self, *args, **kwargs):
         return Item.STATUS_OK
@@ -48,20 +62,33 @@ class DummyItem(object):
     """
     Represents a dependency on all items of a certain type.
     """
+    __slots__ = (
+        'item_type',
+        'preceded_by',
+        'triggers',
+        '_deps',
+        '_flattened_deps',
+        '_id',
+        '_precedes_items',
+        '_reverse_deps',
+    )
+
+    ITEM_TYPE_NAME = 'dummy'
+    NEEDS_STATIC = ()
     bundle = None
+    needed_by = ()
+    needs = ()
+    precedes = ()
+    timeout = None
     triggered = False
+    triggered_by = ()
 
     def __init__(self, item_type):
-        self.NEEDS_STATIC = []
         self.item_type = item_type
-        self.ITEM_TYPE_NAME = 'dummy'
-        self.needed_by = []
-        self.needs = []
         self.preceded_by = []
-        self.precedes = []
-        self.triggered_by = []
         self.triggers = []
         self._deps = []
+        self._id = intern_item_id("{}:".format(item_type))
         self._precedes_items = []
 
     def __lt__(self, other):
@@ -72,7 +99,7 @@ class DummyItem(object):
 
     @property
     def id(self):
-        return "{}:".format(self.item_type)
+        return self._id
 
     def apply(self, *args, **kwargs):
         return Item.STATUS_OK
@@ -93,6 +120,24 @@ def find_item(item_id, items):
     return item
 
 
+def _check_duplicate_items(items):
+    """
+    Raises BundleError if more than one item in the given list has the
+    same id.
+    """
+    items_by_id = {}
+    for item in items:
+        first_item = items_by_id.setdefault(item.id, item)
+        if first_item is not item:
+            raise BundleError(_(
+                "duplicate definition of {item} in bundles '{bundle1}' and '{bundle2}'"
+            ).format(
+                item=item.id,
+                bundle1=item.bundle.name,
+                bundle2=first_item.bundle.name,
+            ))
+
+
 def _find_items_of_types(item_types, items, include_dummy=False):
     """
     Returns a subset of items with any of the given types.
@@ -111,14 +156,17 @@ def _flatten_dependencies(items):
     This will cause all dependencies - direct AND inherited - to be
     listed in item._deps.
     """
+    items_by_id = {}
+    for item in items:
+        items_by_id.setdefault(item.id, item)
     for item in items:
-        item._flattened_deps = list(set(
-            item._deps + _get_deps_for_item(item, items)
+        item._flattened_deps = tuple(set(
+            item._deps + _get_deps_for_item(item, items_by_id)
         ))
     return items
 
 
-def _get_deps_for_item(item, items, deps_found=None):
+def _get_deps_for_item(item, items_by_id, deps_found=None):
     """
     Recursively retrieves and returns a list of all inherited
     dependencies of the given item.
@@ -126,15 +174,19 @@ def _get_deps_for_item(item, items, deps_found=None):
     Note: This can handle loops, but won't detect them.
     """
     if deps_found is None:
-        deps_found = []
+        deps_found = set()
     deps = []
     for dep in item._deps:
         if dep not in deps_found:
             deps.append(dep)
-            deps_found.append(dep)
+            deps_found.add(dep)
+            try:
+                dep_item = items_by_id[dep]
+            except KeyError:
+                raise NoSuchItem(_("item not found: {}").format(dep))
             deps += _get_deps_for_item(
-                find_item(dep, items),
-                items,
+                dep_item,
+                items_by_id,
                 deps_found,
             )
     return deps
@@ -168,7 +220,7 @@ def _inject_bundle_items(items):
     return list(bundle_items.values()) + items
 
 
-def _inject_canned_actions(items):
+def _inject_canned_actions(items, path_index):
     """
     Looks for canned actions like "svc_upstart:mysql:reload" in item
     triggers and adds them to the list of items.
@@ -219,75 +271,12 @@ def _inject_canned_actions(items):
                 action_attrs,
                 skip_name_validation=True,
             )
-            action._prepare_deps(items)
+            action._prepare_deps(items, path_index)
             added_actions[triggered_item_id] = action
 
     return items + list(added_actions.values())
 
 
-def _inject_concurrency_blockers(items):
-    """
-    Looks for items with BLOCK_CONCURRENT set to True and inserts
-    dependencies to force a sequential apply.
-    """
-    # find every item type that cannot be applied in parallel
-    item_types = []
-    for item in items:
-        item._concurrency_deps = []
-        if (
-            item.ITEM_TYPE_NAME == 'dummy' or
-            item.__class__ in item_types or
-            not item.BLOCK_CONCURRENT
-        ):
-            continue
-        else:
-            item_types.append(item.__class__)
-
-    # daisy-chain all items of the blocking type and all items of the
-    # blocked types while respecting existing dependencies between them
-    for item_type in item_types:
-        blocked_types = item_type.BLOCK_CONCURRENT + [item_type.ITEM_TYPE_NAME]
-        type_items = _find_items_of_types(
-            blocked_types,
-            items,
-        )
-        processed_items = []
-        for item in type_items:
-            # disregard deps to items of other types
-            item.__deps = list(filter(
-                lambda dep: dep.split(":", 1)[0] in blocked_types,
-                item._flattened_deps,
-            ))
-        previous_item = None
-        while len(processed_items) < len(type_items):
-            # find the first item without same-type deps we haven't
-            # processed yet
-            try:
-                item = list(filter(
-                    lambda item: not item.__deps and item not in processed_items,
-                    type_items,
-                ))[0]
-            except IndexError:
-                # this can happen if the flattened deps of all items of
-                # this type already contain a dependency on another
-                # item of this type
-                break
-            if previous_item is not None:  # unless we're at the first item
-                # add dep to previous item -- unless it's already in there
-                if previous_item.id not in item._deps:
-                    item._deps.append(previous_item.id)
-                    item._concurrency_deps.append(previous_item.id)
-                    item._flattened_deps.append(previous_item.id)
-            previous_item = item
-            processed_items.append(item)
-            for other_item in type_items:
-                try:
-                    other_item.__deps.remove(item.id)
-                except ValueError:
-                    pass
-    return items
-
-
 def _inject_dummy_items(items):
     """
     Takes a list of items and adds dummy items depending on each type of
@@ -442,19 +431,19 @@ def prepare_dependencies(items):
     """
     items = list(items)
 
+    _check_duplicate_items(items)
+    path_index = PathIndex(items)
     for item in items:
-        item._check_bundle_collisions(items)
-        item._prepare_deps(items)
+        item._prepare_deps(items, path_index)
 
     items = _inject_dummy_items(items)
     items = _inject_bundle_items(items)
-    items = _inject_canned_actions(items)
+    items = _inject_canned_actions(items, path_index)
     items = _inject_reverse_triggers(items)
     items = _inject_reverse_dependencies(items)
     items = _inject_trigger_dependencies(items)
     items = _inject_preceded_by_dependencies(items)
     items = _flatten_dependencies(items)
-    items = _inject_concurrency_blockers(items)
 
     for item in items:
         if item.ITEM_TYPE_NAME != 'dummy':
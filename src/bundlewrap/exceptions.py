@@ -61,6 +61,16 @@ class RemoteException(UnicodeException):
     pass
 
 
+class RemoteTimeout(RemoteException):
+    """
+    Raised when a shell command on a node takes longer than it is
+    allowed to. The partial output is available as self.result.
+    """
+    def __init__(self, msg="", result=None):
+        super(RemoteTimeout, self).__init__(msg)
+        self.result = result
+
+
 class RepositoryError(UnicodeException):
     """
     Indicates that somethings is wrong with the current repository.
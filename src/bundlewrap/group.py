@@ -43,6 +43,7 @@ class Group(object):
         self.name = group_name
         self.bundle_names = infodict.get('bundles', [])
         self.immediate_subgroup_names = infodict.get('subgroups', [])
+        self.max_ssh_connections = infodict.get('max_ssh_connections', None)
         self.metadata = infodict.get('metadata', {})
         self.metadata_processor_names = infodict.get('metadata_processors', [])
         self.patterns = infodict.get('member_patterns', [])
@@ -1,3 +1,6 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
 from .deps import (
     find_item,
     prepare_dependencies,
@@ -10,12 +13,63 @@ from .utils.text import mark_for_translation as _
 from .utils.ui import io
 
 
+def _concurrency_resources(items):
+    """
+    Returns a dict mapping the names of all resources used by the
+    given items to their capacity and a dict mapping item types to the
+    names of the resources each item of that type occupies while being
+    applied.
+
+    BLOCK_CONCURRENT is translated into a resource named after the
+    blocking item type with a capacity of one.
+    """
+    capacities = {}
+    type_resources = defaultdict(set)
+
+    def add_resource(name, capacity):
+        capacities[name] = min(capacity, capacities.get(name, capacity))
+
+    item_classes = set()
+    for item in items:
+        if item.ITEM_TYPE_NAME != 'dummy':
+            item_classes.add(item.__class__)
+
+    for item_class in item_classes:
+        for name, capacity in item_class.RESOURCES.items():
+            add_resource(name, capacity)
+            type_resources[item_class.ITEM_TYPE_NAME].add(name)
+        if item_class.BLOCK_CONCURRENT:
+            add_resource(item_class.ITEM_TYPE_NAME, 1)
+            for blocked_type in item_class.BLOCK_CONCURRENT + [item_class.ITEM_TYPE_NAME]:
+                type_resources[blocked_type].add(item_class.ITEM_TYPE_NAME)
+
+    return capacities, dict(type_resources)
+
+
 class ItemQueue(object):
     def __init__(self, items):
         self.items_with_deps = prepare_dependencies(items)
         self.items_without_deps = []
         self._split()
         self.pending_items = []
+        # resource names -> capacity
+        self.resource_capacity, self._type_resources = \
+            _concurrency_resources(self.items_with_deps)
+        # resource names -> number of pending items using it
+        self.resources_in_use = defaultdict(int)
+        self._resource_stats = {}
+        for resource in self.resource_capacity:
+            self._resource_stats[resource] = {
+                'delayed_items': set(),
+                'held': timedelta(0),
+            }
+        # item ids -> time at which they acquired their resources
+        self._resources_acquired = {}
+        self._start = datetime.now()
+        # items waiting for the caller to tell us whether their precede
+        # triggers fire (see precede_check_done())
+        self.items_awaiting_precede_check = []
+        self._precede_checks_done = set()
 
     @property
     def all_items(self):
@@ -41,6 +95,7 @@ class ItemQueue(object):
         Called when an item didn't need to be fixed.
         """
         self.pending_items.remove(item)
+        self._release_resources(item)
         # if an item is applied successfully, all dependencies on it can
         # be removed from the remaining items
         self.items_with_deps = remove_dep_from_items(
@@ -55,6 +110,7 @@ class ItemQueue(object):
         been skipped as a result by cascading.
         """
         self.pending_items.remove(item)
+        self._release_resources(item)
         if item.cascade_skip:
             # if an item fails or is skipped, all items that depend on
             # it shall be removed from the queue
@@ -77,52 +133,122 @@ class ItemQueue(object):
             )
         self._split()
 
-    def pop(self, interactive=False):
-        """
-        Gets the next item available for processing and moves it into
-        self.pending_items. Will raise IndexError if no item is
-        available. Otherwise, it will return the item and a list of
-        items that have been skipped while looking for the item.
-        """
-        skipped_items = []
-
-        if not self.items_without_deps:
-            raise IndexError
-
-        while self.items_without_deps:
-            item = self.items_without_deps.pop()
-
-            if item._precedes_items:
-                if item._precedes_incorrect_item(interactive=interactive):
-                    item.has_been_triggered = True
-                else:
-                    # we do not have to cascade here at all because
-                    # all chained preceding items will be skipped by
-                    # this same mechanism
-                    io.debug(
-                        _("skipping {node}:{bundle}:{item} because its precede trigger "
-                          "did not fire").format(
-                            bundle=item.bundle.name,
-                            item=item.id,
-                            node=item.node.name,
-                        ),
-                    )
-                    self.items_with_deps = remove_dep_from_items(self.items_with_deps, item.id)
-                    self._split()
-                    skipped_items.append(item)
-                    item = None
-                    continue
-            break
-        assert item is not None
-        self.pending_items.append(item)
-        return (item, skipped_items)
+    def pop(self):
+        """
+        Gets the next item available for processing. Will raise
+        IndexError if no item is available (either because all remaining
+        items have unmet dependencies or because the resources they need
+        are currently exhausted). Otherwise, it will return the item and
+        a boolean indicating whether the caller must first find out if
+        the item's precede triggers fire.
+
+        Finding that out might involve talking to the node, so we leave
+        it to the caller. Items that need to be checked are moved into
+        self.items_awaiting_precede_check until the caller reports back
+        using precede_check_done(). All other items are moved into
+        self.pending_items and hold their resources until they are
+        reported back as done.
+        """
+        for index in range(len(self.items_without_deps) - 1, -1, -1):
+            item = self.items_without_deps[index]
+
+            if item._precedes_items and item.id not in self._precede_checks_done:
+                del self.items_without_deps[index]
+                self.items_awaiting_precede_check.append(item)
+                return (item, True)
+
+            if self._acquire_resources(item):
+                del self.items_without_deps[index]
+                self.pending_items.append(item)
+                return (item, False)
+
+        raise IndexError
+
+    def precede_check_done(self, item, precedes_incorrect_item):
+        """
+        Called with the result of item._precedes_incorrect_item() for
+        an item returned by pop(). Returns a list of items that have
+        been skipped as a result.
+        """
+        self.items_awaiting_precede_check.remove(item)
+        self._precede_checks_done.add(item.id)
+
+        if precedes_incorrect_item:
+            item.has_been_triggered = True
+            self.items_without_deps.append(item)
+            return []
+
+        # we do not have to cascade here at all because all chained
+        # preceding items will be skipped by this same mechanism
+        io.debug(
+            _("skipping {node}:{bundle}:{item} because its precede trigger "
+              "did not fire").format(
+                bundle=item.bundle.name,
+                item=item.id,
+                node=item.node.name,
+            ),
+        )
+        self.items_with_deps = remove_dep_from_items(self.items_with_deps, item.id)
+        self._split()
+        return [item]
+
+    def resource_usage(self):
+        """
+        Returns a dict mapping resource names to dicts with information
+        on how much the resource was used so far:
+
+            capacity        max. number of items using it at once
+            delayed         number of items that had to wait for it
+            held            total time (timedelta) items have held it
+            utilization     held time in relation to capacity and total
+                            time passed (float between 0 and 1)
+        """
+        total_seconds = (datetime.now() - self._start).total_seconds()
+        result = {}
+        for resource, capacity in self.resource_capacity.items():
+            held = self._resource_stats[resource]['held']
+            result[resource] = {
+                'capacity': capacity,
+                'delayed': len(self._resource_stats[resource]['delayed_items']),
+                'held': held,
+                'utilization': (
+                    held.total_seconds() / (capacity * total_seconds)
+                    if total_seconds else 0.0
+                ),
+            }
+        return result
+
+    def _acquire_resources(self, item):
+        """
+        Reserves all resources needed by the given item. Returns False
+        (without reserving anything) if any of them are exhausted.
+        """
+        resources = self._type_resources.get(item.ITEM_TYPE_NAME, ())
+        for resource in resources:
+            if self.resources_in_use[resource] >= self.resource_capacity[resource]:
+                self._resource_stats[resource]['delayed_items'].add(item.id)
+                return False
+        for resource in resources:
+            self.resources_in_use[resource] += 1
+        if resources:
+            self._resources_acquired[item.id] = datetime.now()
+        return True
+
+    def _release_resources(self, item):
+        acquired = self._resources_acquired.pop(item.id, None)
+        if acquired is None:
+            return
+        held = datetime.now() - acquired
+        for resource in self._type_resources[item.ITEM_TYPE_NAME]:
+            self.resources_in_use[resource] -= 1
+            self._resource_stats[resource]['held'] += held
 
     def _fire_triggers_for_item(self, item):
         for triggered_item_id in item.triggers:
             try:
                 triggered_item = find_item(
                     triggered_item_id,
-                    self.all_items,
+                    self.all_items + self.items_awaiting_precede_check,
                 )
                 triggered_item.has_been_triggered = True
             except NoSuchItem:
@@ -8,8 +8,9 @@ from copy import copy
 from datetime import datetime
 from os.path import join
 
-from bundlewrap.exceptions import BundleError
+from bundlewrap.exceptions import BundleError, NoSuchItem
 from bundlewrap.utils import cached_property
+from bundlewrap.utils.paths import PathIndex
 from bundlewrap.utils.statedict import diff_keys, diff_value, hash_statedict, validate_statedict
 from bundlewrap.utils.text import force_text, mark_for_translation as _
 from bundlewrap.utils.text import bold, wrap_question
@@ -21,14 +22,29 @@ BUILTIN_ITEM_ATTRIBUTES = {
     'needs': [],
     'preceded_by': [],
     'precedes': [],
+    'timeout': None,
     'triggered': False,
     'triggered_by': [],
     'triggers': [],
     'unless': "",
 }
+# builtin attributes that are never modified after an item has been
+# created and can thus be stored as tuples
+IMMUTABLE_ITEM_ATTRIBUTES = ('needed_by', 'needs', 'precedes', 'triggered_by')
 ITEM_CLASSES = {}
 ITEM_CLASSES_LOADED = False
 
+# we use this instead of intern() because Python 2 can't intern unicode
+_ITEM_IDS = {}
+
+
+def intern_item_id(item_id):
+    """
+    Returns a canonical instance of the given item id, so nodes sharing
+    the same items also share a single string object for each id.
+    """
+    return _ITEM_IDS.setdefault(item_id, item_id)
+
 
 def unpickle_item_class(class_name, bundle, name, attributes, has_been_triggered):
     for item_class in bundle.node.repo.item_classes:
@@ -43,6 +59,16 @@ def unpickle_item_class(class_name, bundle, name, attributes, has_been_triggered
     raise RuntimeError(_("unable to unpickle {cls}").format(cls=class_name))
 
 
+def unpickle_item_reference(node, item_id, has_been_triggered):
+    item = node.get_item(item_id)
+    item.has_been_triggered = has_been_triggered
+    # workers keep their items around between tasks, but anything
+    # cached while handling earlier tasks (e.g. cached_status) may
+    # have been changed on the node since
+    item._cache = {}
+    return item
+
+
 class ItemStatus(object):
     """
     Holds information on a particular Item such as whether it needs
@@ -65,12 +91,32 @@ class ItemStatus(object):
 class Item(object):
     """
     A single piece of configuration (e.g. a file, a package, a service).
+
+    Subclasses should define __slots__ as well (listing any additional
+    instance attributes they need) to keep memory usage low on nodes
+    with lots of items.
     """
+    __slots__ = (
+        'attributes',
+        'bundle',
+        'has_been_triggered',
+        'name',
+        'node',
+        '_cache',
+        '_deps',
+        '_flattened_deps',
+        '_id',
+        '_path_index',
+        '_precedes_items',
+        '_reverse_deps',
+    ) + tuple(BUILTIN_ITEM_ATTRIBUTES.keys())
+
     BLOCK_CONCURRENT = []
     BUNDLE_ATTRIBUTE_NAME = None
     ITEM_ATTRIBUTES = {}
     ITEM_TYPE_NAME = None
     REQUIRED_ATTRIBUTES = []
+    RESOURCES = {}
     NEEDS_STATIC = []
     STATUS_OK = 1
     STATUS_FIXED = 2
@@ -83,12 +129,17 @@ class Item(object):
         self.attributes = {}
         self.bundle = bundle
         self.has_been_triggered = has_been_triggered
-        self.item_dir = join(bundle.bundle_dir, self.BUNDLE_ATTRIBUTE_NAME)
-        self.item_data_dir = join(bundle.bundle_data_dir, self.BUNDLE_ATTRIBUTE_NAME)
         self.name = name
         self.node = bundle.node
+        self._path_index = None
         self._precedes_items = []
 
+        if self.ITEM_TYPE_NAME == 'action' and ":" in name:
+            # canned actions don't have an "action:" prefix
+            self._id = intern_item_id(name)
+        else:
+            self._id = intern_item_id("{}:{}".format(self.ITEM_TYPE_NAME, name))
+
         if not skip_validation:
             if not skip_name_validation:
                 self._validate_name(bundle, name)
@@ -110,10 +161,13 @@ class Item(object):
 
         for attribute_name, attribute_default in \
                 BUILTIN_ITEM_ATTRIBUTES.items():
-            setattr(self, attribute_name, force_text(attributes.get(
+            value = force_text(attributes.get(
                 attribute_name,
                 copy(attribute_default),
-            )))
+            ))
+            if attribute_name in IMMUTABLE_ITEM_ATTRIBUTES:
+                value = tuple([intern_item_id(item_id) for item_id in value])
+            setattr(self, attribute_name, value)
 
         if self.cascade_skip is None:
             self.cascade_skip = not (self.unless or self.triggered)
@@ -133,6 +187,20 @@ class Item(object):
         return self.id
 
     def __reduce__(self):
+        node = self.bundle.node
+        if getattr(node, 'repo', None) is not None and node.repo.path != "/dev/null":
+            try:
+                referenceable = node.get_item(self.id) is self
+            except NoSuchItem:
+                # e.g. canned actions
+                referenceable = False
+            if referenceable:
+                # the worker process can find this item on its copy of
+                # the node, so there is no need to send all attributes
+                return (
+                    unpickle_item_reference,
+                    (node, self.id, self.has_been_triggered),
+                )
         attrs = copy(self.attributes)
         for attribute_name in BUILTIN_ITEM_ATTRIBUTES.keys():
             attrs[attribute_name] = getattr(self, attribute_name)
@@ -150,19 +218,6 @@ class Item(object):
     def __repr__(self):
         return "<Item {}>".format(self.id)
 
-    def _check_bundle_collisions(self, items):
-        for item in items:
-            if item == self:
-                continue
-            if item.id == self.id:
-                raise BundleError(_(
-                    "duplicate definition of {item} in bundles '{bundle1}' and '{bundle2}'"
-                ).format(
-                    item=item.id,
-                    bundle1=item.bundle.name,
-                    bundle2=self.bundle.name,
-                ))
-
     def _check_redundant_dependencies(self):
         """
         Alerts the user if they have defined a redundant dependency
@@ -221,13 +276,23 @@ class Item(object):
         else:
             return False
 
-    def _precedes_incorrect_item(self, interactive=False):
+    def _precede_chain(self):
+        """
+        Returns the items preceded by this item as a list of
+        (item, chain) tuples, where chain is the same for that item.
+        This is only known after prepare_dependencies(), so it has to be
+        sent to workers along with precede checks.
+        """
+        return [(item, item._precede_chain()) for item in self._precedes_items]
+
+    def _precedes_incorrect_item(self, precede_chain, interactive=False):
         """
         Returns True if this item precedes another and the triggering
-        item is in need of fixing.
+        item is in need of fixing. precede_chain is the result of
+        _precede_chain().
         """
-        for item in self._precedes_items:
-            if item._precedes_incorrect_item():
+        for item, chain in precede_chain:
+            if item._precedes_incorrect_item(chain):
                 return True
         if self.cached_unless_result:
             # triggering item failed unless, so there is nothing to do
@@ -240,11 +305,26 @@ class Item(object):
                 return True
         return not self.cached_status.correct
 
-    def _prepare_deps(self, items):
+    def _prepare_deps(self, items, path_index):
         # merge static and user-defined deps
         self._deps = list(self.NEEDS_STATIC)
         self._deps += self.needs
-        self._deps += list(self.get_auto_deps(items))
+        # get_auto_deps() is public API with a fixed signature, so the
+        # index is handed to it through _get_path_index() instead
+        self._path_index = path_index
+        try:
+            self._deps += list(self.get_auto_deps(items))
+        finally:
+            self._path_index = None
+
+    def _get_path_index(self, items):
+        """
+        Returns the PathIndex built by prepare_dependencies() or a new
+        one for the given items if called from anywhere else.
+        """
+        if self._path_index is None:
+            return PathIndex(items)
+        return self._path_index
 
     @classmethod
     def _validate_attribute_names(cls, bundle, item_id, attributes):
@@ -309,7 +389,7 @@ class Item(object):
 
         if status_code is None:
             status_before = self.cached_status
-            keys_to_fix = diff_keys(self.cached_cdict, status_before)
+            keys_to_fix = status_before.keys
             if not keys_to_fix:
                 status_code = self.STATUS_OK
 
@@ -331,6 +411,8 @@ class Item(object):
                     status_code = self.STATUS_SKIPPED
 
         if status_code is None:
+            # fix() may have changed more than just this item
+            self.node.invalidate_remote_state()
             status_after = self.get_status(cached=False)
             status_code = self.STATUS_FIXED if status_after.correct else self.STATUS_FAILED
 
@@ -344,7 +426,7 @@ class Item(object):
             status_after=status_after,
         )
 
-        return (status_code, status_after.keys)
+        return (status_code, None if status_after is None else status_after.keys)
 
     def ask(self, status_actual, status_should):
         """
@@ -411,10 +493,15 @@ class Item(object):
 
     @property
     def id(self):
-        if self.ITEM_TYPE_NAME == 'action' and ":" in self.name:
-            # canned actions don't have an "action:" prefix
-            return self.name
-        return "{}:{}".format(self.ITEM_TYPE_NAME, self.name)
+        return self._id
+
+    @property
+    def item_data_dir(self):
+        return join(self.bundle.bundle_data_dir, self.BUNDLE_ATTRIBUTE_NAME)
+
+    @property
+    def item_dir(self):
+        return join(self.bundle.bundle_dir, self.BUNDLE_ATTRIBUTE_NAME)
 
     def patch_attributes(self, attributes):
         """
@@ -14,6 +14,8 @@ class Action(Item):
     """
     A command that is run on a node.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = 'actions'
     ITEM_ATTRIBUTES = {
         'command': None,
@@ -101,6 +103,8 @@ class Action(Item):
             self.attributes['command'],
             may_fail=True,
         )
+        # there is no telling what the command changed on the node
+        self.bundle.node.invalidate_remote_state()
 
         if self.attributes['expected_return_code'] is not None and \
                 not result.return_code == self.attributes['expected_return_code']:
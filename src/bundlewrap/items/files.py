@@ -15,9 +15,9 @@ from bundlewrap.exceptions import BundleError, TemplateError
 from bundlewrap.items import BUILTIN_ITEM_ATTRIBUTES, Item
 from bundlewrap.items.directories import validator_mode
 from bundlewrap.utils import cached_property, hash_local_file, sha1
+from bundlewrap.utils.paths import path_auto_deps
 from bundlewrap.utils.remote import PathInfo
 from bundlewrap.utils.text import force_text, mark_for_translation as _
-from bundlewrap.utils.text import is_subdirectory
 from bundlewrap.utils.ui import io
 
 
@@ -164,6 +164,8 @@ class File(Item):
     """
     A file.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "files"
     ITEM_ATTRIBUTES = {
         'content': None,
@@ -297,22 +299,12 @@ class File(Item):
             self._fix_content(status)
 
     def get_auto_deps(self, items):
-        deps = []
-        for item in items:
-            if item.ITEM_TYPE_NAME == "file" and is_subdirectory(item.name, self.name):
-                raise BundleError(_(
-                    "{item1} (from bundle '{bundle1}') blocking path to "
-                    "{item2} (from bundle '{bundle2}')"
-                ).format(
-                    item1=item.id,
-                    bundle1=item.bundle.name,
-                    item2=self.id,
-                    bundle2=self.bundle.name,
-                ))
-            elif item.ITEM_TYPE_NAME in ("directory", "symlink"):
-                if is_subdirectory(item.name, self.name):
-                    deps.append(item.id)
-        return deps
+        path_index = self._get_path_index(items)
+        return path_auto_deps(
+            self,
+            path_index,
+            path_index.items_above(self.name, ("file",)),
+        )
 
     def sdict(self):
         path_info = PathInfo(self.node, self.name)
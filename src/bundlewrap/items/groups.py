@@ -7,6 +7,17 @@ from bundlewrap.items.users import _USERNAME_VALID_CHARACTERS
 from bundlewrap.utils.text import mark_for_translation as _
 
 
+def _fetch_group_state(node):
+    """
+    Reads /etc/group from the node and returns a dictionary mapping
+    group names to their lines.
+    """
+    lines = {}
+    for line in node.run("cat /etc/group").stdout_text.splitlines():
+        lines.setdefault(line.split(":", 1)[0], line)
+    return lines
+
+
 def _parse_group_line(line):
     """
     Parses a line from /etc/group and returns the information as a
@@ -25,6 +36,8 @@ class Group(Item):
     """
     A group.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "groups"
     ITEM_ATTRIBUTES = {
         'delete': False,
@@ -67,14 +80,11 @@ class Group(Item):
 
     def sdict(self):
         # verify content of /etc/group
-        grep_result = self.node.run(
-            "grep -e '^{}:' /etc/group".format(self.name),
-            may_fail=True,
-        )
-        if grep_result.return_code != 0:
+        lines = self.node.remote_state("groups", _fetch_group_state)
+        if self.name not in lines:
             return {}
         else:
-            return _parse_group_line(grep_result.stdout_text)
+            return _parse_group_line(lines[self.name])
 
     def patch_attributes(self, attributes):
         if attributes.get('gid') is not None:
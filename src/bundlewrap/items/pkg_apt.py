@@ -34,12 +34,14 @@ class AptPkg(Item):
     """
     A package installed by apt.
     """
-    BLOCK_CONCURRENT = ["pkg_apt"]
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "pkg_apt"
     ITEM_ATTRIBUTES = {
         'installed': True,
     }
     ITEM_TYPE_NAME = "pkg_apt"
+    RESOURCES = {"dpkg": 1}
 
     def __repr__(self):
         return "<AptPkg name:{} installed:{}>".format(
@@ -35,12 +35,14 @@ class PkgsrcPkg(Item):
     """
     A package installed by apt.
     """
-    BLOCK_CONCURRENT = ["pkg_pkgsrc"]
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "pkg_pkgsrc"
     ITEM_ATTRIBUTES = {
         'installed': True,
     }
     ITEM_TYPE_NAME = "pkg_pkgsrc"
+    RESOURCES = {"pkgsrc": 1}
 
     def __repr__(self):
         return "<PkgsrcPkg name:{} installed:{}>".format(
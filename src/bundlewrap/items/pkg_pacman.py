@@ -40,13 +40,15 @@ class PacmanPkg(Item):
     """
     A package installed by pacman.
     """
-    BLOCK_CONCURRENT = ["pkg_pacman"]
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "pkg_pacman"
     ITEM_ATTRIBUTES = {
         'installed': True,
         'tarball': None,
     }
     ITEM_TYPE_NAME = "pkg_pacman"
+    RESOURCES = {"pacman": 1}
 
     def __repr__(self):
         return "<PacmanPkg name:{} installed:{} tarball:{}>".format(
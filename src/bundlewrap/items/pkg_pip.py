@@ -37,13 +37,15 @@ class PipPkg(Item):
     """
     A package installed by pip.
     """
-    BLOCK_CONCURRENT = ["pkg_pip"]
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "pkg_pip"
     ITEM_ATTRIBUTES = {
         'installed': True,
         'version': None,
     }
     ITEM_TYPE_NAME = "pkg_pip"
+    RESOURCES = {"pip": 1}
 
     def __repr__(self):
         return "<PipPkg name:{} installed:{}>".format(
@@ -31,12 +31,14 @@ class YumPkg(Item):
     """
     A package installed by yum.
     """
-    BLOCK_CONCURRENT = ["pkg_yum"]
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "pkg_yum"
     ITEM_ATTRIBUTES = {
         'installed': True,
     }
     ITEM_TYPE_NAME = "pkg_yum"
+    RESOURCES = {"rpm": 1}
 
     def __repr__(self):
         return "<YumPkg name:{} installed:{}>".format(
@@ -37,12 +37,14 @@ class ZypperPkg(Item):
     """
     A package installed by yum.
     """
-    BLOCK_CONCURRENT = ["pkg_zypper"]
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "pkg_zypper"
     ITEM_ATTRIBUTES = {
         'installed': True,
     }
     ITEM_TYPE_NAME = "pkg_zypper"
+    RESOURCES = {"rpm": 1}
 
     def __repr__(self):
         return "<ZypperPkg name:{} installed:{}>".format(
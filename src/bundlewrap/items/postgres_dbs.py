@@ -5,6 +5,7 @@ from pipes import quote
 
 from bundlewrap.exceptions import BundleError
 from bundlewrap.items import Item, ItemStatus
+from bundlewrap.items.postgres_roles import get_postgres_state
 from bundlewrap.utils.text import bold, red
 from bundlewrap.utils.text import mark_for_translation as _
 
@@ -21,14 +22,7 @@ def drop_db(node, name):
 
 
 def get_databases(node):
-    output = node.run("echo '\\l' | sudo -u postgres psql -Anqt -F '|' | grep '|'").stdout
-    result = {}
-    for line in output.strip().split("\n"):
-        db, owner = line.strip().split("|", 2)[:2]
-        result[db] = {
-            'owner': owner,
-        }
-    return result
+    return get_postgres_state(node)['databases']
 
 
 def set_owner(node, name, owner):
@@ -45,6 +39,8 @@ class PostgresDB(Item):
     """
     A postgres database.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "postgres_dbs"
     ITEM_ATTRIBUTES = {
         'delete': False,
@@ -5,15 +5,15 @@ from passlib.apps import postgres_context
 
 from bundlewrap.exceptions import BundleError
 from bundlewrap.items import Item, ItemStatus
+from bundlewrap.utils.cache import cached_password_hash
 from bundlewrap.utils.text import bold, red
 from bundlewrap.utils.text import mark_for_translation as _
 
 
-AUTHID_COLUMNS = {
-    "rolcanlogin": 'can_login',
-    "rolsuper": 'superuser',
-    "rolpassword": 'password_hash',
-}
+_STATE_QUERY = (
+    "SELECT 'role', rolname, rolcanlogin, rolsuper, rolpassword FROM pg_authid; "
+    "SELECT 'db', datname, pg_get_userbyid(datdba) FROM pg_database;"
+)
 
 ATTRS = {
     'can_login': _("login allowed"),
@@ -39,31 +39,49 @@ def fix_role(node, role, attrs, create=False):
     )
 
 
-def get_role(node, role):
-    result = node.run("echo \"SELECT rolcanlogin, rolsuper, rolpassword from pg_authid "
-                      "WHERE rolname='{}'\" "
-                      "| sudo -u postgres psql -Anqwx -F '|'".format(role))
-
-    role_attrs = {}
-    for line in result.stdout.strip().split("\n"):
-        try:
-            key, value = line.split("|")
-        except ValueError:
-            pass
-        else:
-            role_attrs[AUTHID_COLUMNS[key]] = value
+def get_postgres_state(node):
+    """
+    Returns all roles and databases on the given node, collected with a
+    single psql session and shared by all postgres items on the node
+    until any item on the node has been fixed or an action has been run
+    (see Node.remote_state()).
+    """
+    return node.remote_state("postgres", _fetch_postgres_state)
 
-    for bool_attr in ('can_login', 'superuser'):
-        if bool_attr in role_attrs:
-            role_attrs[bool_attr] = role_attrs[bool_attr] == "t"
 
-    return role_attrs
+def _fetch_postgres_state(node):
+    result = node.run(
+        "echo \"{}\" | sudo -u postgres psql -Anqwt -F '|'".format(_STATE_QUERY),
+    )
+    state = {
+        'databases': {},
+        'roles': {},
+    }
+    for line in result.stdout_text.strip().split("\n"):
+        fields = line.split("|")
+        if fields[0] == "db" and len(fields) == 3:
+            state['databases'][fields[1]] = {
+                'owner': fields[2],
+            }
+        elif fields[0] == "role" and len(fields) == 5:
+            state['roles'][fields[1]] = {
+                'can_login': fields[2] == "t",
+                'password_hash': fields[4],
+                'superuser': fields[3] == "t",
+            }
+    return state
+
+
+def get_role(node, role):
+    return get_postgres_state(node)['roles'].get(role, {})
 
 
 class PostgresRole(Item):
     """
     A postgres role.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "postgres_roles"
     ITEM_ATTRIBUTES = {
         'can_login': True,
@@ -139,9 +157,15 @@ class PostgresRole(Item):
 
     def patch_attributes(self, attributes):
         if 'password' in attributes:
-            attributes['password_hash'] = postgres_context.encrypt(
+            attributes['password_hash'] = cached_password_hash(
+                self.node.repo.path,
+                lambda: postgres_context.encrypt(
+                    attributes['password'],
+                    user=self.name,
+                ),
+                "postgres",
                 attributes['password'],
-                user=self.name,
+                salt=self.name,
             )
         return attributes
 
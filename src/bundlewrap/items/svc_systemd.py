@@ -14,7 +14,33 @@ def svc_start(node, svcname):
     return node.run("systemctl start -- {}".format(quote(svcname)))
 
 
+def _fetch_services_running(node):
+    """
+    Returns a dictionary mapping the names of all svc_systemd items
+    on the given node to whether they are currently running.
+    """
+    svcnames = sorted(set(
+        item.name for item in node.items if item.ITEM_TYPE_NAME == "svc_systemd"
+    ))
+    if not svcnames:
+        return {}
+    result = node.run(
+        "systemctl is-active -- {}".format(" ".join(quote(svcname) for svcname in svcnames)),
+        may_fail=True,
+    )
+    states = result.stdout_text.splitlines()
+    if len(states) != len(svcnames):
+        return {}
+    return {
+        svcname: state in ("active", "reloading")
+        for svcname, state in zip(svcnames, states)
+    }
+
+
 def svc_running(node, svcname):
+    services_running = node.remote_state("svc_systemd", _fetch_services_running)
+    if svcname in services_running:
+        return services_running[svcname]
     result = node.run(
         "systemctl status -- {}".format(quote(svcname)),
         may_fail=True,
@@ -33,6 +59,8 @@ class SvcSystemd(Item):
     """
     A service managed by systemd.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "svc_systemd"
     ITEM_ATTRIBUTES = {
         'running': True,
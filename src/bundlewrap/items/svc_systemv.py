@@ -14,7 +14,35 @@ def svc_start(node, svcname):
     return node.run("/etc/init.d/{} start".format(quote(svcname)))
 
 
+def _fetch_services_running(node):
+    """
+    Returns a dictionary mapping the names of all svc_systemv items
+    on the given node to whether they are currently running.
+    """
+    svcnames = sorted(set(
+        item.name for item in node.items if item.ITEM_TYPE_NAME == "svc_systemv"
+    ))
+    if not svcnames:
+        return {}
+    result = node.run(
+        "for svc in {}; do /etc/init.d/\"$svc\" status >/dev/null 2>&1; echo $?; done".format(
+            " ".join(quote(svcname) for svcname in svcnames),
+        ),
+        may_fail=True,
+    )
+    return_codes = result.stdout_text.splitlines()
+    if len(return_codes) != len(svcnames):
+        return {}
+    return {
+        svcname: return_code == "0"
+        for svcname, return_code in zip(svcnames, return_codes)
+    }
+
+
 def svc_running(node, svcname):
+    services_running = node.remote_state("svc_systemv", _fetch_services_running)
+    if svcname in services_running:
+        return services_running[svcname]
     result = node.run(
         "/etc/init.d/{} status".format(quote(svcname)),
         may_fail=True,
@@ -33,6 +61,8 @@ class SvcSystemV(Item):
     """
     A service managed by traditional System V init scripts.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "svc_systemv"
     ITEM_ATTRIBUTES = {
         'running': True,
@@ -14,9 +14,33 @@ def svc_start(node, svcname):
     return node.run("initctl start --no-wait -- {}".format(quote(svcname)))
 
 
+def _fetch_services_running(node):
+    """
+    Returns a dictionary mapping the names of all svc_upstart items
+    on the given node to whether they are currently running.
+    """
+    svcnames = sorted(set(
+        item.name for item in node.items if item.ITEM_TYPE_NAME == "svc_upstart"
+    ))
+    if not svcnames:
+        return {}
+    jobs_running = {}
+    for line in node.run("initctl list").stdout_text.splitlines():
+        # e.g. "ssh start/running, process 1234"
+        job = line.split(" ", 1)[0]
+        jobs_running[job] = jobs_running.get(job, False) or " start/" in line
+    return {
+        svcname: jobs_running[svcname]
+        for svcname in svcnames if svcname in jobs_running
+    }
+
+
 def svc_running(node, svcname):
+    services_running = node.remote_state("svc_upstart", _fetch_services_running)
+    if svcname in services_running:
+        return services_running[svcname]
     result = node.run("initctl status -- {}".format(quote(svcname)))
-    if " start/" not in result.stdout:
+    if " start/" not in result.stdout_text:
         return False
     else:
         return True
@@ -30,6 +54,8 @@ class SvcUpstart(Item):
     """
     A service managed by Upstart.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "svc_upstart"
     ITEM_ATTRIBUTES = {
         'running': True,
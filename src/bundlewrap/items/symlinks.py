@@ -7,9 +7,10 @@ from pipes import quote
 
 from bundlewrap.exceptions import BundleError
 from bundlewrap.items import Item, ItemStatus
+from bundlewrap.utils.paths import path_auto_deps
 from bundlewrap.utils.remote import PathInfo
 from bundlewrap.utils.text import mark_for_translation as _
-from bundlewrap.utils.text import bold, is_subdirectory
+from bundlewrap.utils.text import bold
 
 
 ATTRIBUTE_VALIDATORS = defaultdict(lambda: lambda id, value: None)
@@ -19,6 +20,8 @@ class Symlink(Item):
     """
     A symbolic link.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "symlinks"
     ITEM_ATTRIBUTES = {
         'group': None,
@@ -86,27 +89,10 @@ class Symlink(Item):
             self._fix_owner(status)
 
     def get_auto_deps(self, items):
-        deps = []
-        for item in items:
-            if item == self:
-                continue
-            if item.ITEM_TYPE_NAME == "file" and (
-                is_subdirectory(item.name, self.name) or
-                item.name == self.name
-            ):
-                raise BundleError(_(
-                    "{item1} (from bundle '{bundle1}') blocking path to "
-                    "{item2} (from bundle '{bundle2}')"
-                ).format(
-                    item1=item.id,
-                    bundle1=item.bundle.name,
-                    item2=self.id,
-                    bundle2=self.bundle.name,
-                ))
-            elif item.ITEM_TYPE_NAME in ("directory", "symlink"):
-                if is_subdirectory(item.name, self.name):
-                    deps.append(item.id)
-        return deps
+        path_index = self._get_path_index(items)
+        blocking_items = path_index.items_above(self.name, ("file",))
+        blocking_items += path_index.items_named(self.name, ("file",))
+        return path_auto_deps(self, path_index, blocking_items)
 
     def sdict(self):
         path_info = PathInfo(self.node, self.name)
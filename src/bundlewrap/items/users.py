@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from collections import defaultdict
 from logging import ERROR, getLogger
 from pipes import quote
 from string import ascii_lowercase, digits
@@ -9,6 +10,7 @@ from passlib.hash import md5_crypt, sha256_crypt, sha512_crypt
 
 from bundlewrap.exceptions import BundleError
 from bundlewrap.items import BUILTIN_ITEM_ATTRIBUTES, Item, ItemStatus
+from bundlewrap.utils.cache import cached_password_hash
 from bundlewrap.utils.text import mark_for_translation as _
 from bundlewrap.utils.text import bold
 from bundlewrap.utils.ui import io
@@ -47,27 +49,59 @@ HASH_METHODS = {
 
 _USERNAME_VALID_CHARACTERS = ascii_lowercase + digits + "-_"
 
+# separates /etc/passwd from /etc/group in the output of
+# _fetch_user_state(), can't be mistaken for a line in either file
+_STATE_SEPARATOR = "--- bundlewrap ---"
 
-def _group_name_for_gid(node, gid):
+
+def _fetch_user_state(node):
     """
-    Returns the group name that matches the gid.
+    Reads /etc/passwd and /etc/group from the node with a single
+    command and returns a dictionary of indexes into both files.
     """
-    group_output = node.run("grep -e ':{}:[^:]*$' /etc/group".format(gid), may_fail=True)
-    if group_output.return_code != 0:
-        return None
-    else:
-        return group_output.stdout_text.split(":")[0]
-
-
-def _groups_for_user(node, username):
+    output = node.run(
+        "cat /etc/passwd && echo && echo '{sep}' && cat /etc/group".format(
+            sep=_STATE_SEPARATOR,
+        ),
+    ).stdout_text
+    passwd, group = output.split("\n{}\n".format(_STATE_SEPARATOR), 1)
+
+    state = {
+        # gid (as a string) -> group name
+        'group_names': {},
+        # username -> names of groups listing that user as a member
+        'member_of': defaultdict(set),
+        # username -> line from /etc/passwd
+        'passwd_lines': {},
+    }
+    for line in passwd.splitlines():
+        if not line:
+            continue
+        state['passwd_lines'].setdefault(line.split(":", 1)[0], line)
+    for line in group.splitlines():
+        fields = line.split(":")
+        if len(fields) != 4:
+            continue
+        state['group_names'].setdefault(fields[2], fields[0])
+        for member in fields[3].split(","):
+            if member:
+                state['member_of'][member].add(fields[0])
+    return state
+
+
+def _fetch_shadow_state(node):
     """
-    Returns the list of group names for the given username on the given
-    node.
+    Returns a dictionary mapping usernames to password hashes from
+    /etc/shadow.
     """
-    groups = node.run("id -Gn {}".format(username)).stdout_text.strip().split(" ")
-    primary_group = node.run("id -gn {}".format(username)).stdout_text.strip()
-    groups.remove(primary_group)
-    return groups
+    result = node.run("cat /etc/shadow", may_fail=True)
+    hashes = {}
+    if result.return_code == 0:
+        for line in result.stdout_text.splitlines():
+            fields = line.split(":")
+            if len(fields) > 1:
+                hashes.setdefault(fields[0], fields[1])
+    return hashes
 
 
 def _parse_passwd_line(line):
@@ -89,6 +123,8 @@ class User(Item):
     """
     A user account.
     """
+    __slots__ = ()
+
     BUNDLE_ATTRIBUTE_NAME = "users"
     ITEM_ATTRIBUTES = {
         'delete': False,
@@ -138,51 +174,55 @@ class User(Item):
             self.node.run(command, may_fail=True)
 
     def sdict(self):
+        state = self.node.remote_state("users", _fetch_user_state)
+
         # verify content of /etc/passwd
-        passwd_grep_result = self.node.run(
-            "grep -e '^{}:' /etc/passwd".format(self.name),
-            may_fail=True,
-        )
-        if passwd_grep_result.return_code != 0:
+        if self.name not in state['passwd_lines']:
             return {}
 
-        sdict = _parse_passwd_line(passwd_grep_result.stdout_text)
+        sdict = _parse_passwd_line(state['passwd_lines'][self.name])
+        primary_group = state['group_names'].get(str(sdict['gid']))
 
         if self.attributes['gid'] is not None and not self.attributes['gid'].isdigit():
-            sdict['gid'] = _group_name_for_gid(self.node, sdict['gid'])
+            sdict['gid'] = primary_group
 
         if self.attributes['password_hash'] is not None:
             if self.attributes['use_shadow']:
                 # verify content of /etc/shadow
-                shadow_grep_result = self.node.run(
-                    "grep -e '^{}:' /etc/shadow".format(self.name),
-                    may_fail=True,
-                )
-                if shadow_grep_result.return_code != 0:
-                    sdict['password_hash'] = None
-                else:
-                    sdict['password_hash'] = shadow_grep_result.stdout_text.split(":")[1]
+                sdict['password_hash'] = self.node.remote_state(
+                    "shadow",
+                    _fetch_shadow_state,
+                ).get(self.name)
             else:
                 sdict['password_hash'] = sdict['passwd_hash']
         del sdict['passwd_hash']
 
         # verify content of /etc/group
-        sdict['groups'] = set(_groups_for_user(self.node, self.name))
+        sdict['groups'] = state['member_of'].get(self.name, set()).difference([primary_group])
 
         return sdict
 
     def patch_attributes(self, attributes):
         if attributes.get('password', None) is not None:
             # defaults aren't set yet
-            hash_method = HASH_METHODS[attributes.get(
+            hash_method = attributes.get(
                 'hash_method',
                 self.ITEM_ATTRIBUTES['hash_method'],
-            )]
+            )
             salt = attributes.get('salt', None)
-            attributes['password_hash'] = hash_method.encrypt(
+            salt = _DEFAULT_SALT if salt is None else salt
+            rounds = 5000  # default from glibc
+            attributes['password_hash'] = cached_password_hash(
+                self.node.repo.path,
+                lambda: HASH_METHODS[hash_method].encrypt(
+                    attributes['password'],
+                    rounds=rounds,
+                    salt=salt,
+                ),
+                hash_method,
                 attributes['password'],
-                rounds=5000,  # default from glibc
-                salt=_DEFAULT_SALT if salt is None else salt,
+                salt=salt,
+                rounds=rounds,
             )
 
         if 'use_shadow' not in attributes:
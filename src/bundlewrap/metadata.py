@@ -1,4 +1,16 @@
+from copy import deepcopy
+from hashlib import sha1
+from json import dumps
+
+from .concurrency import WorkerPool
 from .utils import ATOMIC_TYPES
+from .utils.cache import cache_enabled, read_cache, write_cache
+from .utils.text import mark_for_translation as _
+from .utils.ui import io
+
+# signature used for processors that have looked at all of their input
+# (all other signatures are tuples of keys)
+READS_ALL = "*"
 
 
 def atomic(obj):
@@ -9,3 +21,328 @@ def atomic(obj):
                          "(not: {})".format(repr(obj)))
     else:
         return cls(obj)
+
+
+def memoize(reads=None, per_node=True):
+    """
+    Decorator for metadata processors that allows BundleWrap to reuse
+    their results whenever they are called with the same input.
+
+    reads       an iterable of top-level metadata keys the processor
+                looks at, tracked automatically if None
+    per_node    set this to False if the result does not depend on
+                the node name or its groups, so it can be shared
+                between nodes
+    """
+    def decorator(processor):
+        processor._bw_memoize = {
+            'per_node': per_node,
+            'reads': None if reads is None else tuple(sorted(reads)),
+        }
+        return processor
+    return decorator
+
+
+class _TrackingDict(dict):
+    """
+    Records which top-level keys a metadata processor reads.
+    """
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.read_all = False
+        self.read_keys = set()
+
+    def _track_all(self):
+        self.read_all = True
+
+    def __contains__(self, key):
+        self.read_keys.add(key)
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.read_keys.add(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.read_keys.add(key)
+        return dict.get(self, key, default)
+
+    def has_key(self, key):
+        return self.__contains__(key)
+
+    def pop(self, key, *args):
+        self.read_keys.add(key)
+        return dict.pop(self, key, *args)
+
+    def setdefault(self, key, default=None):
+        self.read_keys.add(key)
+        return dict.setdefault(self, key, default)
+
+    def __eq__(self, other):
+        self._track_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self._track_all()
+        return dict.__ne__(self, other)
+
+    def __iter__(self):
+        self._track_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._track_all()
+        return dict.__len__(self)
+
+    def __repr__(self):
+        self._track_all()
+        return dict.__repr__(self)
+
+    def copy(self):
+        self._track_all()
+        return dict(dict.items(self))
+
+    def items(self):
+        self._track_all()
+        return dict.items(self)
+
+    def iteritems(self):
+        self._track_all()
+        return iter(dict.items(self))
+
+    def iterkeys(self):
+        self._track_all()
+        return iter(dict.keys(self))
+
+    def itervalues(self):
+        self._track_all()
+        return iter(dict.values(self))
+
+    def keys(self):
+        self._track_all()
+        return dict.keys(self)
+
+    def popitem(self):
+        self._track_all()
+        return dict.popitem(self)
+
+    def values(self):
+        self._track_all()
+        return dict.values(self)
+
+    __hash__ = None
+
+
+def _canonical_default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    return repr(obj)
+
+
+def _input_digest(signature, metadata, node_name, groups):
+    """
+    Returns a hash of everything the processor with the given read
+    signature could have based its result on.
+    """
+    if signature == READS_ALL:
+        values = metadata
+    else:
+        values = [[key, key in metadata, metadata.get(key)] for key in signature]
+    return sha1(dumps(
+        [node_name, groups, values],
+        default=_canonical_default,
+        sort_keys=True,
+    ).encode('utf-8')).hexdigest()
+
+
+class MetadataProcessorCache(object):
+    """
+    Keeps the results of memoized metadata processors for a repo in
+    memory and (if enabled by BWREPOCACHE=1) on disk.
+
+    For each processor, we keep a list of "signatures" (the sets of
+    keys it has been seen reading so far) and for each signature the
+    changes the processor made to its input, indexed by a hash of the
+    values of those keys. A processor that reads the same values will
+    take the same path and thus produce the same changes.
+    """
+    def __init__(self, repo):
+        self.repo = repo
+        self._processors = {}
+
+    def _cache_components(self, processor_key, *components):
+        return ("metadata", processor_key) + components
+
+    def _get_processor_cache(self, processor_key):
+        if processor_key not in self._processors:
+            processor_cache = {'results': {}, 'signatures': []}
+            if cache_enabled():
+                processor_cache['signatures'] = read_cache(
+                    self.repo.path,
+                    *self._cache_components(processor_key, "signatures")
+                ) or []
+            self._processors[processor_key] = processor_cache
+        return self._processors[processor_key]
+
+    def _lookup(self, processor_key, processor_cache, digest):
+        if digest in processor_cache['results']:
+            return processor_cache['results'][digest]
+        if cache_enabled():
+            delta = read_cache(
+                self.repo.path,
+                *self._cache_components(processor_key, digest)
+            )
+            if delta is not None:
+                processor_cache['results'][digest] = delta
+            return delta
+        return None
+
+    def _store(self, processor_key, processor_cache, signature, digest, delta):
+        processor_cache['results'][digest] = delta
+        new_signature = signature not in processor_cache['signatures']
+        if new_signature:
+            processor_cache['signatures'].append(signature)
+        if not cache_enabled():
+            return
+        try:
+            write_cache(
+                self.repo.path,
+                delta,
+                *self._cache_components(processor_key, digest)
+            )
+            if new_signature:
+                write_cache(
+                    self.repo.path,
+                    processor_cache['signatures'],
+                    *self._cache_components(processor_key, "signatures")
+                )
+        except Exception as e:
+            io.debug(_("unable to cache metadata processor result: {}").format(repr(e)))
+
+    def run(self, processor, node_name, groups, metadata):
+        options = getattr(processor, '_bw_memoize', None)
+        if options is None:
+            return processor(node_name, groups, metadata)
+
+        processor_name = "{}.{}".format(processor.__module__, processor.__name__)
+        processor_key = sha1(
+            (processor_name + self.repo._libs_hash).encode('utf-8')
+        ).hexdigest()
+        processor_cache = self._get_processor_cache(processor_key)
+        if options['per_node']:
+            key_node_name, key_groups = node_name, list(groups)
+        else:
+            key_node_name, key_groups = None, None
+
+        if options['reads'] is None:
+            signatures = processor_cache['signatures']
+        else:
+            signatures = [options['reads']]
+
+        try:
+            for signature in signatures:
+                digest = _input_digest(signature, metadata, key_node_name, key_groups)
+                delta = self._lookup(processor_key, processor_cache, digest)
+                if delta is not None:
+                    io.debug(_("reusing cached result of metadata processor {}").format(
+                        processor_name,
+                    ))
+                    return _apply_delta(metadata, delta)
+        except (TypeError, ValueError):
+            # input can't be serialized in a stable way, so we can't
+            # cache anything
+            return processor(node_name, groups, metadata)
+
+        before = deepcopy(metadata)
+        if options['reads'] is None:
+            tracking_metadata = _TrackingDict(dict.items(metadata))
+            result = processor(node_name, groups, tracking_metadata)
+            read_all = tracking_metadata.read_all
+            read_keys = tracking_metadata.read_keys
+        else:
+            result = processor(node_name, groups, metadata)
+
+        if isinstance(result, _TrackingDict):
+            result = dict(dict.items(result))
+
+        try:
+            if options['reads'] is not None:
+                signature = options['reads']
+            elif read_all:
+                signature = READS_ALL
+            else:
+                signature = tuple(sorted(read_keys))
+            digest = _input_digest(signature, before, key_node_name, key_groups)
+        except (TypeError, ValueError):
+            return result
+
+        delta = {
+            'del': [key for key in before if key not in result],
+            'set': {},
+        }
+        for key, value in result.items():
+            if key not in before or before[key] != value:
+                delta['set'][key] = deepcopy(value)
+        self._store(processor_key, processor_cache, signature, digest, delta)
+        return result
+
+
+def _apply_delta(metadata, delta):
+    result = dict(metadata)
+    for key in delta['del']:
+        result.pop(key, None)
+    for key, value in delta['set'].items():
+        result[key] = deepcopy(value)
+    return result
+
+
+def _node_metadata(node):
+    return node.metadata
+
+
+def metadata_for_nodes(nodes, workers=4):
+    """
+    Yields (node_name, metadata) tuples for all given nodes as soon as
+    the metadata for each node has been computed. Metadata is computed
+    in up to the given number of worker processes, so the order of
+    results is not guaranteed to match the order of nodes.
+
+    Raises WorkerException if a metadata processor fails.
+    """
+    pending_nodes = []
+    for node in nodes:
+        if '_metadata' in getattr(node, '_cache', {}):
+            # already computed, no need to bother a worker
+            yield (node.name, node.metadata)
+        else:
+            pending_nodes.append(node)
+
+    if workers == 1 or len(pending_nodes) < 2:
+        for node in pending_nodes:
+            yield (node.name, node.metadata)
+        return
+
+    nodes_by_name = {node.name: node for node in pending_nodes}
+    pending_nodes.reverse()
+    with WorkerPool(workers=min(workers, len(pending_nodes))) as worker_pool:
+        while worker_pool.keep_running():
+            msg = worker_pool.get_event()
+            if msg['msg'] == 'REQUEST_WORK':
+                if pending_nodes:
+                    node = pending_nodes.pop()
+                    worker_pool.start_task(
+                        msg['wid'],
+                        _node_metadata,
+                        task_id=node.name,
+                        args=(node,),
+                    )
+                else:
+                    worker_pool.quit(msg['wid'])
+            elif msg['msg'] == 'FINISHED_WORK':
+                node = nodes_by_name[msg['task_id']]
+                # remember the result so subsequent access to
+                # node.metadata in this process is free
+                if not hasattr(node, '_cache'):
+                    node._cache = {}
+                node._cache['_metadata'] = msg['return_value']
+                yield (node.name, msg['return_value'])
@@ -3,8 +3,10 @@ from __future__ import unicode_literals
 
 from datetime import datetime, timedelta
 from getpass import getuser
+from hashlib import sha1
 import json
-from os import environ, remove
+from os import environ, fdopen, remove
+from os.path import dirname
 from pipes import quote
 from socket import gethostname
 from tempfile import mkstemp
@@ -21,11 +23,17 @@ from .exceptions import (
     ItemDependencyError,
     NodeAlreadyLockedException,
     NoSuchBundle,
+    NoSuchItem,
+    NoSuchNode,
+    RemoteTimeout,
     RepositoryError,
 )
 from .itemqueue import ItemQueue
 from .items import Item
+from .scheduler import NodeJob, run_node_jobs
 from .utils import cached_property, graph_for_items, merge_dict, names
+from .utils.cache import cache_enabled, read_cache, write_cache
+from .utils.paths import PATH_ITEM_TYPES
 from .utils.statedict import hash_statedict
 from .utils.text import bold, green, red, validate_name, yellow
 from .utils.text import force_text, mark_for_translation as _
@@ -33,6 +41,17 @@ from .utils.ui import io
 
 LOCK_PATH = "/tmp/bundlewrap.lock"
 LOCK_FILE = LOCK_PATH + "/info"
+ITEM_RECORD_FILE = "/var/lib/bundlewrap/items"
+LAST_APPLY_FILE = "/var/lib/bundlewrap/last_apply"
+
+
+ITEM_STATUS_NAMES = {
+    Item.STATUS_OK: "ok",
+    Item.STATUS_FIXED: "fixed",
+    Item.STATUS_FAILED: "failed",
+    Item.STATUS_SKIPPED: "skipped",
+    Item.STATUS_ACTION_SUCCEEDED: "action_succeeded",
+}
 
 
 class ApplyResult(object):
@@ -46,6 +65,7 @@ class ApplyResult(object):
         self.skipped = 0
         self.failed = 0
         self.profiling_info = []
+        self.resource_usage = {}
 
         for item_id, result, time_elapsed in item_results:
             self.profiling_info.append((time_elapsed, item_id))
@@ -82,7 +102,6 @@ def handle_apply_result(node, item, status_code, interactive, sdict_keys=None):
         item.bundle.name if item.bundle else "",  # dummy items don't have bundles
         item.id,
         interactive=interactive,
-        sdict_keys=sdict_keys,
     )
     if formatted_result is not None:
         if status_code == Item.STATUS_FAILED:
@@ -91,93 +110,507 @@ def handle_apply_result(node, item, status_code, interactive, sdict_keys=None):
             io.stdout(formatted_result)
 
 
-def apply_items(node, workers=1, interactive=False, profiling=False):
-    item_queue = ItemQueue(node.items)
-    with WorkerPool(workers=workers) as worker_pool:
-        # This whole thing is set in motion because every worker
-        # initially asks for work. He also reports back when he finished
-        # a job. Actually, all these conditions are internal to
-        # worker_pool -- it will tell us whether we must keep going:
-        while worker_pool.keep_running():
-            msg = worker_pool.get_event()
-            if msg['msg'] == 'REQUEST_WORK':
-                try:
-                    item, skipped_items = item_queue.pop()
-                except IndexError:
-                    if worker_pool.jobs_open > 0:
-                        # No work right now, but another worker might
-                        # finish and "create" a new job. Keep this
-                        # worker idle.
-                        worker_pool.mark_idle(msg['wid'])
-                    else:
-                        # No work, no outstanding jobs. We're done.
-                        # quit() decreases workers_alive.
-                        worker_pool.quit(msg['wid'])
-                else:
-                    for skipped_item in skipped_items:
-                        handle_apply_result(node, skipped_item, Item.STATUS_SKIPPED, interactive)
-                        yield(skipped_item.id, Item.STATUS_SKIPPED, timedelta(0))
-
-                    # start_task() increases jobs_open.
-                    worker_pool.start_task(
-                        msg['wid'],
-                        item.get_result if item.ITEM_TYPE_NAME == 'action' else item.apply,
-                        task_id=item.id,
-                        kwargs={'interactive': interactive},
-                    )
+def apply_item(item, interactive=False, deadline=None, changes=0):
+    """
+    Applies (or runs) a single item in a worker process. Commands run
+    on the node will be aborted once the given deadline (as returned by
+    time.time()) or the item's own timeout has passed, the item is then
+    considered failed.
 
-            elif msg['msg'] == 'FINISHED_WORK':
-                # worker_pool automatically decreases jobs_open when it
-                # sees a 'FINISHED_WORK' message.
+    changes is ApplyJob.changes at the time the task was handed out.
+    """
+    item.node._expire_remote_state(changes)
+    item_deadline = None if item.timeout is None else time() + item.timeout
+    try:
+        with operations.time_limit(deadline), operations.time_limit(item_deadline):
+            if item.ITEM_TYPE_NAME == 'action':
+                return item.get_result(interactive=interactive)
+            return item.apply(interactive=interactive)
+    except RemoteTimeout as e:
+        io.stderr(_("{x} {node}  {item}  timed out: {error}").format(
+            error=e,
+            item=item.id,
+            node=bold(item.node.name),
+            x=red("✘"),
+        ))
+        return (Item.STATUS_FAILED, None)
+
+
+def check_precedes(item, precede_chain, interactive=False, changes=0):
+    """
+    Runs item._precedes_incorrect_item() in a worker process. See
+    apply_item() for changes.
+    """
+    item.node._expire_remote_state(changes)
+    return item._precedes_incorrect_item(precede_chain, interactive=interactive)
 
-                # The task's id is the item we just processed.
-                item_id = msg['task_id']
-                item = find_item(item_id, item_queue.pending_items)
-
-                status_code, keys = msg['return_value']
-
-                if status_code == Item.STATUS_FAILED:
-                    for skipped_item in item_queue.item_failed(item):
-                        handle_apply_result(node, skipped_item, Item.STATUS_SKIPPED, interactive)
-                        yield(skipped_item.id, Item.STATUS_SKIPPED, timedelta(0))
-                elif status_code in (Item.STATUS_FIXED, Item.STATUS_ACTION_SUCCEEDED):
-                    item_queue.item_fixed(item)
-                elif status_code == Item.STATUS_OK:
-                    item_queue.item_ok(item)
-                elif status_code == Item.STATUS_SKIPPED:
-                    for skipped_item in item_queue.item_skipped(item):
-                        handle_apply_result(node, skipped_item, Item.STATUS_SKIPPED, interactive)
-                        yield(skipped_item.id, Item.STATUS_SKIPPED, timedelta(0))
-                else:
-                    raise AssertionError(_(
-                        "unknown item status return for {item}: {status}".format(
-                            item=item.id,
-                            status=repr(status_code),
-                        ),
-                    ))
 
-                handle_apply_result(node, item, status_code, interactive, sdict_keys=keys)
-                if item.ITEM_TYPE_NAME != 'dummy':
-                    yield (item.id, status_code, msg['duration'])
-
-                # Finally, we have a new job queue. Thus, tell all idle
-                # workers to ask for work again.
-                worker_pool.activate_idle_workers()
-
-    # we have no items without deps left and none are processing
-    # there must be a loop
-    if item_queue.items_with_deps:
-        io.debug(_(
-            "There was a dependency problem. Look at the debug.svg generated "
-            "by the following command and try to find a loop:\n"
-            "echo '{}' | dot -Tsvg -odebug.svg"
-        ).format("\\n".join(graph_for_items(node.name, item_queue.items_with_deps))))
-
-        raise ItemDependencyError(
-            _("bad dependencies between these items: {}").format(
-                ", ".join([i.id for i in item_queue.items_with_deps]),
+def _path_fingerprints(node, items):
+    """
+    Returns a dict mapping the ids of the given file, directory and
+    symlink items to a string summarizing the current state of their
+    paths on the node (inode, size, mtime, ctime, mode, owner, group and
+    type). Uses a single command for all paths.
+    """
+    path_items = [item for item in items if item.ITEM_TYPE_NAME in PATH_ITEM_TYPES]
+    if not path_items:
+        return {}
+    result = node.run(
+        "for path in {}; do "
+        "stat -c '%i %s %Y %Z %a %U %G %F' -- \"$path\" 2>/dev/null || echo; "
+        "done".format(" ".join(quote(item.name) for item in path_items)),
+        may_fail=True,
+    )
+    fingerprints = result.stdout_text.splitlines()
+    if len(fingerprints) != len(path_items):
+        return {}
+    return {item.id: fingerprint for item, fingerprint in zip(path_items, fingerprints)}
+
+
+def _read_item_record(node):
+    """
+    Returns the item record written by _write_item_record() during the
+    last apply in fast mode.
+    """
+    result = node.run("cat {}".format(quote(ITEM_RECORD_FILE)), may_fail=True)
+    if result.return_code != 0:
+        return {}
+    try:
+        return json.loads(result.stdout_text)
+    except ValueError:
+        io.debug(_("unable to parse {path} on {node}").format(
+            node=node.name,
+            path=ITEM_RECORD_FILE,
+        ))
+        return {}
+
+
+def _trusted_items(node):
+    """
+    Returns the ids of all items on the node that can be assumed to be
+    correct because neither their configuration nor the fingerprint of
+    their state on the node have changed since the last apply in fast
+    mode.
+    """
+    record = _read_item_record(node)
+    candidates = [
+        item for item in node.items
+        if item.id in record and
+        not item.triggered and
+        not item.unless
+    ]
+    trusted_items = set()
+    for item_id, fingerprint in _path_fingerprints(node, candidates).items():
+        if record[item_id] == {
+            'cdict': node.get_item(item_id).hash(),
+            'fingerprint': fingerprint,
+        }:
+            trusted_items.add(item_id)
+    io.debug(_("trusting {count} of {total} items on {node}").format(
+        count=len(trusted_items),
+        node=node.name,
+        total=len(record),
+    ))
+    return trusted_items
+
+
+def _write_item_record(node, item_results):
+    """
+    Stores config hashes and state fingerprints of all items that are
+    now known to be correct on the node for use by _trusted_items().
+    """
+    correct_items = [
+        node.get_item(item_id) for item_id, status_code, time_elapsed in item_results
+        if status_code in (Item.STATUS_OK, Item.STATUS_FIXED)
+    ]
+    record = {}
+    for item_id, fingerprint in _path_fingerprints(node, correct_items).items():
+        record[item_id] = {
+            'cdict': node.get_item(item_id).hash(),
+            'fingerprint': fingerprint,
+        }
+
+    handle, local_path = mkstemp()
+    try:
+        with fdopen(handle, 'w') as f:
+            f.write(json.dumps(record))
+        node.run("mkdir -p {}".format(quote(dirname(ITEM_RECORD_FILE))))
+        node.upload(local_path, ITEM_RECORD_FILE, mode="0600")
+    finally:
+        remove(local_path)
+
+
+class ApplyJob(NodeJob):
+    """
+    Applies all items of a node when run by run_node_jobs().
+
+    The node is locked and unlocked by workers, all items are applied
+    by workers as well. This object only keeps track of which items
+    are ready to be applied next.
+    """
+    def __init__(
+        self,
+        node,
+        interactive=False,
+        force=False,
+        skip_unchanged=False,
+        drift_check_interval=None,
+        fast=False,
+        events=None,
+    ):
+        super(ApplyJob, self).__init__(node, events=events)
+        self.drift_check_interval = drift_check_interval
+        self.fast = fast
+        self.force = force
+        self.interactive = interactive
+        self.item_queue = None
+        self.item_results = []
+        self.locked = False
+        # start -> items -> end -> done
+        self.phase = 'start'
+        self.skip_unchanged = skip_unchanged
+        self.start = None
+        # items must be done by then (as returned by time.time())
+        self.deadline = None
+        self.trusted_items = set()
+        # number of items that have (or might have) changed something
+        # on the node so far, workers throw away remote state fetched
+        # earlier when they see this change
+        self.changes = 0
+        # ids of those items and whether any of them was an action
+        self.changed_items = set()
+        self.action_changes = False
+
+    def next_task(self):
+        if self.phase == 'start':
+            self.phase = 'starting'
+            self.start = datetime.now()
+            return {
+                'task_id': 'apply_start',
+                'target': self.node._apply_start,
+                'kwargs': {
+                    'drift_check_interval': self.drift_check_interval,
+                    'fast': self.fast,
+                    'force': self.force,
+                    'interactive': self.interactive,
+                    'skip_unchanged': self.skip_unchanged,
+                },
+            }
+
+        while self.phase == 'items':
+            try:
+                item, needs_precede_check = self.item_queue.pop()
+            except IndexError:
+                if self.tasks_running:
+                    return None
+                self._check_for_leftover_items()
+                self.phase = 'end'
+                break
+
+            if self.deadline is not None and time() > self.deadline:
+                self.errors.append(RemoteTimeout(_(
+                    "items on {node} did not finish within {timeout}s"
+                ).format(
+                    node=self.node.name,
+                    timeout=self.node.apply_timeout,
+                )))
+                self.phase = 'end'
+                break
+
+            if needs_precede_check:
+                # Finding out whether the precede trigger fires means
+                # looking at other items on the node. Let a worker do
+                # that so we can keep handing out tasks in the meantime.
+                return {
+                    'task_id': item.id,
+                    'target': check_precedes,
+                    'args': (item, item._precede_chain()),
+                    'kwargs': {'changes': self.changes, 'interactive': self.interactive},
+                }
+
+            if item.ITEM_TYPE_NAME == 'dummy' or self._is_trusted(item):
+                # no need to look at this item (dummy items don't
+                # even belong to the node, so don't send them to a
+                # worker)
+                self.item_queue.item_ok(item)
+                self._item_result(item, Item.STATUS_OK, timedelta(0))
+                continue
+
+            return {
+                'task_id': item.id,
+                'target': apply_item,
+                'args': (item,),
+                'kwargs': {
+                    'changes': self.changes,
+                    'deadline': self.deadline,
+                    'interactive': self.interactive,
+                },
+            }
+
+        if self.phase == 'end' and not self.tasks_running:
+            self.phase = 'ending'
+            return {
+                'task_id': 'apply_end',
+                'target': self.node._apply_end,
+                'args': (self.item_results, self.start),
+                'kwargs': {
+                    'complete': not self.errors,
+                    'fast': self.fast,
+                    'interactive': self.interactive,
+                    'locked': self.locked,
+                    'resource_usage': (
+                        {} if self.item_queue is None else self.item_queue.resource_usage()
+                    ),
+                },
+            }
+
+        return None
+
+    def node_end_event(self):
+        if self.result is None:
+            return {'skipped': not self.errors}
+        return {
+            'correct': self.result.correct,
+            'failed': self.result.failed,
+            'fixed': self.result.fixed,
+            'skipped': False,
+            'skipped_items': self.result.skipped,
+        }
+
+    def prepare(self):
+        self.node._items_by_id
+
+    def ready_tasks(self):
+        if self.phase != 'items':
+            return 0
+        return len(self.item_queue.items_without_deps)
+
+    def task_failed(self, task_id, exception):
+        self.errors.append(exception)
+        if task_id in ('apply_start', 'apply_end'):
+            self.done = True
+        else:
+            # stop applying items, but make sure the node is unlocked
+            self.phase = 'end'
+
+    def task_finished(self, task_id, return_value, duration):
+        if task_id == 'apply_start':
+            if return_value is None:
+                # nothing has changed since the last apply
+                self.done = True
+                return
+            self.locked = return_value['locked']
+            self.trusted_items = return_value['trusted_items']
+            if not self.locked:
+                self.phase = 'end'
+                return
+            try:
+                self.item_queue = ItemQueue(self.node.items)
+            except Exception as e:
+                self.errors.append(e)
+                self.phase = 'end'
+            else:
+                self.phase = 'items'
+                if self.node.apply_timeout is not None:
+                    self.deadline = time() + self.node.apply_timeout
+            return
+
+        if task_id == 'apply_end':
+            self.result = return_value
+            self.done = True
+            return
+
+        try:
+            item = find_item(task_id, self.item_queue.items_awaiting_precede_check)
+        except NoSuchItem:
+            item = find_item(task_id, self.item_queue.pending_items)
+        else:
+            for skipped_item in self.item_queue.precede_check_done(item, return_value):
+                self._item_result(skipped_item, Item.STATUS_SKIPPED, timedelta(0), cause=item)
+            return
+
+        status_code, keys = return_value
+
+        if status_code == Item.STATUS_FAILED:
+            for skipped_item in self.item_queue.item_failed(item):
+                self._item_result(skipped_item, Item.STATUS_SKIPPED, timedelta(0), cause=item)
+        elif status_code in (Item.STATUS_FIXED, Item.STATUS_ACTION_SUCCEEDED):
+            self.item_queue.item_fixed(item)
+        elif status_code == Item.STATUS_OK:
+            self.item_queue.item_ok(item)
+        elif status_code == Item.STATUS_SKIPPED:
+            for skipped_item in self.item_queue.item_skipped(item):
+                self._item_result(skipped_item, Item.STATUS_SKIPPED, timedelta(0), cause=item)
+        else:
+            raise AssertionError(_(
+                "unknown item status return for {item}: {status}".format(
+                    item=item.id,
+                    status=repr(status_code),
+                ),
+            ))
+
+        self._item_result(item, status_code, duration, sdict_keys=keys)
+
+    def _check_for_leftover_items(self):
+        # we have no items without deps left and none are processing
+        # there must be a loop
+        if self.item_queue.items_with_deps:
+            io.debug(_(
+                "There was a dependency problem. Look at the debug.svg generated "
+                "by the following command and try to find a loop:\n"
+                "echo '{}' | dot -Tsvg -odebug.svg"
+            ).format("\\n".join(graph_for_items(
+                self.node.name,
+                self.item_queue.items_with_deps,
+            ))))
+
+            self.errors.append(ItemDependencyError(
+                _("bad dependencies between these items: {}").format(
+                    ", ".join([i.id for i in self.item_queue.items_with_deps]),
+                )
+            ))
+
+    def _is_trusted(self, item):
+        """
+        Items found to be correct in apply_start can still be broken by
+        the items they depend on. Actions may change anything, so after
+        one has run, no item is trusted anymore.
+        """
+        if item.id not in self.trusted_items or self.action_changes:
+            return False
+        return self.changed_items.isdisjoint(item._flattened_deps)
+
+    def _item_result(self, item, status_code, duration, sdict_keys=None, cause=None):
+        """
+        cause is the item whose failure or skipping caused this item to
+        be skipped (if any).
+        """
+        handle_apply_result(
+            self.node,
+            item,
+            status_code,
+            self.interactive,
+            sdict_keys=sdict_keys,
+        )
+        if status_code in (Item.STATUS_FIXED, Item.STATUS_FAILED, Item.STATUS_ACTION_SUCCEEDED):
+            self.changes += 1
+            self.changed_items.add(item.id)
+            if item.ITEM_TYPE_NAME == 'action':
+                self.action_changes = True
+        if item.ITEM_TYPE_NAME != 'dummy':
+            self.item_results.append((item.id, status_code, duration))
+            self.emit(
+                'item',
+                cause=None if cause is None else cause.id,
+                duration=duration.total_seconds(),
+                item=item.id,
+                status=ITEM_STATUS_NAMES[status_code],
             )
+
+
+class VerifyJob(NodeJob):
+    """
+    Checks the status of all items of a node when run by
+    run_node_jobs(). The result is a dict with the number of 'good' and
+    'bad' items.
+    """
+    def __init__(
+        self,
+        node,
+        show_all=False,
+        skip_unchanged=False,
+        drift_check_interval=None,
+        events=None,
+    ):
+        super(VerifyJob, self).__init__(node, events=events)
+        self.drift_check_interval = drift_check_interval
+        self.items = None
+        self.result = {'good': 0, 'bad': 0}
+        self.show_all = show_all
+        self.skip_unchanged = skip_unchanged
+        self.started = False
+
+    def next_task(self):
+        if not self.started:
+            self.started = True
+            if self.skip_unchanged:
+                return {
+                    'task_id': 'verify_start',
+                    'target': self.node.unchanged_since_last_apply,
+                    'args': (self.drift_check_interval,),
+                }
+            self._prepare_items()
+
+        if self.items:
+            item = self.items.pop()
+            return {
+                'task_id': item.id,
+                'target': item.get_status,
+            }
+        return None
+
+    def node_end_event(self):
+        if self.result is None:
+            return {'skipped': True}
+        return {
+            'bad': self.result['bad'],
+            'good': self.result['good'],
+            'skipped': False,
+        }
+
+    def prepare(self):
+        self.node._items_by_id
+
+    def ready_tasks(self):
+        return len(self.items or [])
+
+    def task_failed(self, task_id, exception):
+        self.errors.append(exception)
+        self.items = []
+        if not self.tasks_running:
+            self.done = True
+
+    def task_finished(self, task_id, return_value, duration):
+        if task_id == 'verify_start':
+            if return_value:
+                # nothing has changed since the last apply
+                self.result = None
+                self.done = True
+            else:
+                self._prepare_items()
+            return
+
+        self.emit(
+            'item',
+            correct=return_value.correct,
+            duration=duration.total_seconds(),
+            item=task_id,
         )
+        item_id = "{}:{}".format(self.node.name, task_id)
+        if not return_value.correct:
+            io.stderr("{} {}".format(
+                red("✘"),
+                item_id,
+            ))
+            self.result['bad'] += 1
+        else:
+            if self.show_all:
+                io.stdout("{} {}".format(
+                    green("✓"),
+                    item_id,
+                ))
+            self.result['good'] += 1
+
+        if not self.items and not self.tasks_running:
+            self.done = True
+
+    def _prepare_items(self):
+        self.items = []
+        for item in self.node.items:
+            if not item.ITEM_TYPE_NAME == 'action' and not item.triggered:
+                self.items.append(item)
+        if not self.items:
+            self.done = True
 
 
 def _flatten_group_hierarchy(groups):
@@ -279,6 +712,24 @@ def format_item_result(result, node, bundle, item, interactive=False):
             )
 
 
+def _json_default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    return repr(obj)
+
+
+def _metadata_digest(metadata):
+    return sha1(json.dumps(
+        metadata,
+        default=_json_default,
+        sort_keys=True,
+    ).encode('utf-8')).hexdigest()
+
+
+def _unpickle_node_reference(repo, node_name):
+    return repo.get_node(node_name)
+
+
 class Node(object):
     def __init__(self, name, infodict=None):
         if infodict is None:
@@ -291,35 +742,108 @@ class Node(object):
         self._bundles = infodict.get('bundles', [])
         self._node_metadata = infodict.get('metadata', {})
         self.add_ssh_host_keys = False
+        self.apply_timeout = infodict.get('apply_timeout', None)
+        self.command_timeout = infodict.get('command_timeout', None)
         self.hostname = infodict.get('hostname', self.name)
+        self.max_ssh_connections = infodict.get('max_ssh_connections', None)
+        # see _expire_remote_state()
+        self._remote_state_changes = 0
         self.use_shadow_passwords = infodict.get('use_shadow_passwords', True)
 
     def __lt__(self, other):
         return self.name < other.name
 
+    def __reduce_ex__(self, protocol):
+        """
+        Nodes that are part of a repo are pickled as a reference to
+        avoid sending the entire repo (and all our cached bundles and
+        items) to a worker process.
+        """
+        repo = getattr(self, 'repo', None)
+        if repo is None or repo.path == "/dev/null" or \
+                repo.node_dict.get(self.name) is not self:
+            return object.__reduce_ex__(self, protocol)
+        return (_unpickle_node_reference, (repo, self.name))
+
     def __repr__(self):
         return "<Node '{}'>".format(self.name)
 
     @cached_property
-    def _generated_items_by_bundle(self):
-        items = list(self._static_items)
+    def _items_by_id(self):
+        return {item.id: item for item in self.items}
+
+    @cached_property
+    def _remote_state(self):
+        return {}
+
+    @cached_property
+    def _item_generator_results(self):
+        """
+        Runs all item generators until no more items are generated.
+        Each round calls every generator once for each item created in
+        the previous round (skipping items whose types the generator
+        isn't interested in).
+
+        Returns a dict mapping bundle names to lists of generated items
+        and a dict with statistics for each generator.
+        """
         generated_items_by_bundle = {}
-        while items:
-            item = items.pop()
-            for bundle in self.bundles:
-                if bundle.name not in generated_items_by_bundle:
-                    generated_items_by_bundle[bundle.name] = []
-                for item_generator_name in bundle.item_generator_names:
-                    module_name, function_name = item_generator_name.split(".")
-                    module = getattr(self.repo.libs, module_name)
-                    item_generator = getattr(module, function_name)
-                    new_items = item_generator(self, bundle, item)
-                    for item_attribute in new_items:
-                        for item_name, item_dict in new_items[item_attribute].items():
+        generators = []
+        stats = {}
+        for bundle in self.bundles:
+            generated_items_by_bundle[bundle.name] = []
+            for item_generator_name in bundle.item_generator_names:
+                module_name, function_name = item_generator_name.split(".")
+                module = getattr(self.repo.libs, module_name)
+                item_generator = getattr(module, function_name)
+                item_types = getattr(item_generator, 'item_types', None)
+                if item_types is not None:
+                    item_types = frozenset(item_types)
+                generators.append((bundle, item_generator_name, item_generator, item_types))
+                stats[item_generator_name] = {
+                    'calls': 0,
+                    'duration': timedelta(0),
+                    'items': 0,
+                }
+
+        items = list(self._static_items)
+        while items and generators:
+            new_items = []
+            for bundle, item_generator_name, item_generator, item_types in generators:
+                start = datetime.now()
+                generator_stats = stats[item_generator_name]
+                for item in items:
+                    if item_types is not None and item.ITEM_TYPE_NAME not in item_types:
+                        continue
+                    generator_stats['calls'] += 1
+                    with self.repo._metadata_reader(self):
+                        generated_items = item_generator(self, bundle, item)
+                    for item_attribute in generated_items:
+                        for item_name, item_dict in generated_items[item_attribute].items():
                             new_item_obj = bundle.make_item(item_attribute, item_name, item_dict)
-                            items.append(new_item_obj)
+                            new_items.append(new_item_obj)
                             generated_items_by_bundle[bundle.name].append(new_item_obj)
-        return generated_items_by_bundle
+                            generator_stats['items'] += 1
+                generator_stats['duration'] += datetime.now() - start
+            items = new_items
+
+        for item_generator_name, generator_stats in sorted(stats.items()):
+            io.debug(_(
+                "item generator {generator} on {node}: {calls} calls, "
+                "{items} items generated in {time}s"
+            ).format(
+                calls=generator_stats['calls'],
+                generator=item_generator_name,
+                items=generator_stats['items'],
+                node=self.name,
+                time=generator_stats['duration'].total_seconds(),
+            ))
+
+        return (generated_items_by_bundle, stats)
+
+    @property
+    def _generated_items_by_bundle(self):
+        return self._item_generator_results[0]
 
     def _generated_items_for_bundle(self, bundle):
         return self._generated_items_by_bundle.get(bundle, [])
@@ -345,19 +869,105 @@ class Node(object):
                         node=self.name,
                     ))
 
+    @cached_property
+    def _cdict_inputs(self):
+        """
+        Returns a hash of everything the items on this node are derived
+        from (except for the metadata of other nodes, see
+        _metadata_reads) or None if we can't build one.
+        """
+        try:
+            node_info = json.dumps(
+                {
+                    'bundles': list(names(self.bundles)),
+                    'groups': list(names(self.groups)),
+                    'hostname': self.hostname,
+                    'metadata': self.metadata,
+                    'name': self.name,
+                    'use_shadow_passwords': self.use_shadow_passwords,
+                },
+                default=_json_default,
+                sort_keys=True,
+            )
+        except (TypeError, ValueError) as e:
+            io.debug(_("unable to hash metadata for {node}: {error}").format(
+                error=repr(e),
+                node=self.name,
+            ))
+            return None
+        return sha1("\0".join(
+            [node_info, self.repo._cdict_inputs_hash] +
+            [self.repo._bundle_hash(bundle.name) for bundle in self.bundles]
+        ).encode('utf-8')).hexdigest()
+
+    def _cached_cdict(self, inputs):
+        """
+        Returns the item hashes stored by cdict() if neither the given
+        inputs nor the metadata of other nodes used by the items have
+        changed since. Returns None otherwise.
+        """
+        cached = read_cache(self.repo.path, "hashes", self.name)
+        if cached is None or cached['inputs'] != inputs or 'metadata_reads' not in cached:
+            return None
+        for node_name, digest in cached['metadata_reads'].items():
+            try:
+                if _metadata_digest(self.repo.get_node(node_name).metadata) != digest:
+                    return None
+            except (NoSuchNode, TypeError, ValueError):
+                return None
+        return cached['cdict']
+
     def cdict(self):
+        inputs = self._cdict_inputs if cache_enabled() else None
+        if inputs is not None:
+            cached_cdict = self._cached_cdict(inputs)
+            if cached_cdict is not None:
+                io.debug(_("using cached item hashes for {}").format(self.name))
+                return cached_cdict
+
         node_dict = {}
-        for item in self.items:
+        with self.repo._metadata_reader(self):
+            for item in self.items:
+                try:
+                    node_dict[item.id] = item.hash()
+                except AttributeError:  # actions have no cdict
+                    pass
+
+        if inputs is not None:
             try:
-                node_dict[item.id] = item.hash()
-            except AttributeError:  # actions have no cdict
-                pass
+                write_cache(
+                    self.repo.path,
+                    {
+                        'cdict': node_dict,
+                        'inputs': inputs,
+                        'metadata_reads': {
+                            node_name: _metadata_digest(self.repo.get_node(node_name).metadata)
+                            for node_name in self._metadata_reads
+                        },
+                    },
+                    "hashes",
+                    self.name,
+                )
+            except Exception as e:
+                io.debug(_("unable to cache item hashes for {node}: {error}").format(
+                    error=repr(e),
+                    node=self.name,
+                ))
         return node_dict
 
     @cached_property
     def groups(self):
         return self.repo.groups_for_node(self)
 
+    @property
+    def item_generator_stats(self):
+        """
+        A dict mapping item generator names to dicts with the number of
+        times they were called, the number of items they generated and
+        the total time spent in them.
+        """
+        return self._item_generator_results[1]
+
     def has_any_bundle(self, bundle_list):
         for bundle_name in bundle_list:
             if self.has_bundle(bundle_name):
@@ -385,6 +995,26 @@ class Node(object):
                 return True
         return False
 
+    def _expire_remote_state(self, changes):
+        """
+        Throws away all remote state if changes (as counted by ApplyJob)
+        differs from what it was last time we were called. This makes
+        worker processes notice changes made by other workers.
+        """
+        if changes != self._remote_state_changes:
+            self.invalidate_remote_state()
+            self._remote_state_changes = changes
+
+    def invalidate_remote_state(self, *keys):
+        """
+        Makes the next call to remote_state() fetch the given keys
+        again (all keys if none are given).
+        """
+        if not keys:
+            self._remote_state.clear()
+        for key in keys:
+            self._remote_state.pop(key, None)
+
     @property
     def items(self):
         for bundle in self.bundles:
@@ -397,31 +1027,106 @@ class Node(object):
             for item in bundle._static_items:
                 yield item
 
-    def apply(self, interactive=False, force=False, workers=4, profiling=False):
+    def apply(
+        self,
+        interactive=False,
+        force=False,
+        workers=4,
+        profiling=False,
+        skip_unchanged=False,
+        drift_check_interval=None,
+        fast=False,
+    ):
+        job = ApplyJob(
+            self,
+            drift_check_interval=drift_check_interval,
+            fast=fast,
+            force=force,
+            interactive=interactive,
+            skip_unchanged=skip_unchanged,
+        )
+        worker_count = 1 if interactive else workers
+        for job in run_node_jobs(
+            [job],
+            workers=worker_count,
+            node_workers=1,
+            item_workers=worker_count,
+        ):
+            pass
+        if job.errors:
+            raise job.errors[0]
+        return job.result
+
+    def _apply_start(
+        self,
+        interactive=False,
+        force=False,
+        skip_unchanged=False,
+        drift_check_interval=None,
+        fast=False,
+    ):
+        """
+        Called by a worker before any items are applied. Returns None if
+        the node doesn't need to be applied at all. Otherwise returns a
+        dict telling whether the node could be locked and which items
+        don't need to be looked at because of fast mode.
+        """
+        if skip_unchanged and self.unchanged_since_last_apply(drift_check_interval):
+            return None
+
         self.repo.hooks.node_apply_start(
             self.repo,
             self,
             interactive=interactive,
         )
 
-        start = datetime.now()
-        worker_count = 1 if interactive else workers
+        lock = NodeLock(self, interactive, ignore=force)
         try:
-            with NodeLock(self, interactive, ignore=force):
-                item_results = list(apply_items(
-                    self,
-                    workers=worker_count,
-                    interactive=interactive,
-                    profiling=profiling,
-                ))
+            lock.acquire()
         except NodeAlreadyLockedException as e:
             if not interactive:
-                io.error(_("Node '{node}' already locked: {info}").format(
+                io.stderr(_("Node '{node}' already locked: {info}").format(
                     node=self.name,
                     info=e.args,
                 ))
-            item_results = []
+            return {'locked': False, 'trusted_items': set()}
+
+        try:
+            trusted_items = _trusted_items(self) if fast else set()
+        except:
+            lock.release()
+            raise
+        return {'locked': True, 'trusted_items': trusted_items}
+
+    def _apply_end(
+        self,
+        item_results,
+        start,
+        complete=True,
+        fast=False,
+        interactive=False,
+        locked=True,
+        resource_usage=None,
+    ):
+        """
+        Called by a worker after all items have been applied. Records
+        the run on the node, releases the lock and returns an
+        ApplyResult.
+        """
+        if locked:
+            try:
+                if complete and fast:
+                    _write_item_record(self, item_results)
+                if complete and not interactive and not [
+                    status_code for item_id, status_code, time_elapsed in item_results
+                    if status_code == Item.STATUS_FAILED
+                ]:
+                    self._record_apply()
+            finally:
+                NodeLock(self, interactive).release()
+
         result = ApplyResult(self, item_results)
+        result.resource_usage = resource_usage or {}
         result.start = start
         result.end = datetime.now()
 
@@ -435,19 +1140,59 @@ class Node(object):
 
         return result
 
-    def download(self, remote_path, local_path, ignore_failure=False):
+    def download(self, remote_path, local_path, ignore_failure=False, timeout=None):
         return operations.download(
             self.hostname,
             remote_path,
             local_path,
             add_host_keys=True if environ.get('BWADDHOSTKEYS', False) == "1" else False,
+            node_name=self.name,
+            timeout=self.command_timeout if timeout is None else timeout,
         )
 
     def get_item(self, item_id):
-        return find_item(item_id, self.items)
+        try:
+            return self._items_by_id[item_id]
+        except KeyError:
+            raise NoSuchItem(_("item not found: {}").format(item_id))
+
+    def last_apply(self):
+        """
+        Returns information about the last successful apply recorded on
+        the node (a dict with 'date', 'hash', 'host' and 'user') or None.
+        """
+        result = self.run("cat {}".format(quote(LAST_APPLY_FILE)), may_fail=True)
+        if result.return_code != 0:
+            return None
+        try:
+            return json.loads(result.stdout_text)
+        except ValueError:
+            io.debug(_("unable to parse {path} on {node}").format(
+                node=self.name,
+                path=LAST_APPLY_FILE,
+            ))
+            return None
 
-    @cached_property
+    @property
     def metadata(self):
+        for reader in self.repo._metadata_readers:
+            if reader is not self:
+                reader._metadata_reads.add(self.name)
+        return self._metadata
+
+    @cached_property
+    def _metadata(self):
+        return self.repo._snapshot_metadata(self.name, self._build_metadata)
+
+    @cached_property
+    def _metadata_reads(self):
+        """
+        Names of other nodes whose metadata has been looked at while
+        building the items of this node.
+        """
+        return set()
+
+    def _build_metadata(self):
         m = {}
 
         # step 1: group metadata
@@ -462,11 +1207,58 @@ class Node(object):
         for group_name in group_order:
             group = self.repo.get_group(group_name)
             for metadata_processor in group.metadata_processors:
-                m = metadata_processor(self.name, group_order, m)
+                m = self.repo._metadata_processor_cache.run(
+                    metadata_processor,
+                    self.name,
+                    group_order,
+                    m,
+                )
 
         return m
 
-    def run(self, command, may_fail=False, log_output=False):
+    def remote_state(self, key, fetch):
+        """
+        Returns the result of fetch(node). fetch is only called once per
+        key (and process) until the key is invalidated, allowing items to
+        share information collected from the node in a single command.
+
+        All keys are invalidated whenever an item has been fixed or an
+        action has been run, since they might have changed anything on
+        the node (e.g. a package install that creates users or starts
+        services).
+        """
+        if key not in self._remote_state:
+            io.debug(_("fetching remote state '{key}' from {node}").format(
+                key=key,
+                node=self.name,
+            ))
+            self._remote_state[key] = fetch(self)
+        return self._remote_state[key]
+
+    def _record_apply(self):
+        """
+        Stores the current config hash on the node so later runs can
+        tell whether there is anything new to apply.
+        """
+        result = self.run(
+            "mkdir -p {dir} && echo {info} > {path}".format(
+                dir=quote(dirname(LAST_APPLY_FILE)),
+                info=quote(json.dumps({
+                    'date': time(),
+                    'hash': self.hash(),
+                    'host': gethostname(),
+                    'user': getuser(),
+                })),
+                path=quote(LAST_APPLY_FILE),
+            ),
+            may_fail=True,
+        )
+        if result.return_code != 0:
+            io.stderr(_("Could not record successful apply on node '{node}'").format(
+                node=self.name,
+            ))
+
+    def run(self, command, may_fail=False, log_output=False, timeout=None):
         if log_output:
             def log_function(msg):
                 io.stdout("[{}] {}".format(self.name, force_text(msg).rstrip("\n")))
@@ -478,6 +1270,8 @@ class Node(object):
             ignore_failure=may_fail,
             add_host_keys=True if environ.get('BWADDHOSTKEYS', False) == "1" else False,
             log_function=log_function,
+            node_name=self.name,
+            timeout=self.command_timeout if timeout is None else timeout,
         )
 
     def test(self, workers=4):
@@ -486,7 +1280,22 @@ class Node(object):
             workers=workers,
         )
 
-    def upload(self, local_path, remote_path, mode=None, owner="", group=""):
+    def unchanged_since_last_apply(self, drift_check_interval=None):
+        """
+        Returns True if the config of this node hasn't changed since the
+        last successful apply. If drift_check_interval (a timedelta) is
+        given and the last apply is older than that, returns False to
+        make sure the node is looked at every once in a while.
+        """
+        last_apply = self.last_apply()
+        if last_apply is None:
+            return False
+        if drift_check_interval is not None and \
+                time() - last_apply.get('date', 0) > drift_check_interval.total_seconds():
+            return False
+        return last_apply.get('hash') == self.hash()
+
+    def upload(self, local_path, remote_path, mode=None, owner="", group="", timeout=None):
         return operations.upload(
             self.hostname,
             local_path,
@@ -495,22 +1304,22 @@ class Node(object):
             owner=owner,
             group=group,
             add_host_keys=True if environ.get('BWADDHOSTKEYS', False) == "1" else False,
+            node_name=self.name,
+            timeout=self.command_timeout if timeout is None else timeout,
         )
 
-    def verify(self, show_all=False, workers=4):
-        bad = 0
-        good = 0
-        for item_status in verify_items(
-            self.items,
+    def verify(self, show_all=False, workers=4, skip_unchanged=False, drift_check_interval=None):
+        job = VerifyJob(
+            self,
+            drift_check_interval=drift_check_interval,
             show_all=show_all,
-            workers=workers,
-        ):
-            if item_status:
-                good += 1
-            else:
-                bad += 1
-
-        return {'good': good, 'bad': bad}
+            skip_unchanged=skip_unchanged,
+        )
+        for job in run_node_jobs([job], workers=workers, node_workers=1, item_workers=workers):
+            pass
+        if job.errors:
+            raise job.errors[0]
+        return job.result
 
 
 class NodeLock(object):
@@ -520,6 +1329,12 @@ class NodeLock(object):
         self.interactive = interactive
 
     def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, type, value, traceback):
+        self.release()
+
+    def acquire(self):
         handle, local_path = mkstemp()
 
         try:
@@ -550,7 +1365,7 @@ class NodeLock(object):
         finally:
             remove(local_path)
 
-    def __exit__(self, type, value, traceback):
+    def release(self):
         result = self.node.run("rm -R {}".format(quote(LOCK_PATH)), may_fail=True)
 
         if result.return_code != 0:
@@ -611,40 +1426,3 @@ def test_items(items, workers=1):
                     green("✓"),
                     item_id,
                 ))
-
-
-def verify_items(all_items, show_all=False, workers=1):
-    items = []
-    for item in all_items:
-        if not item.ITEM_TYPE_NAME == 'action' and not item.triggered:
-            items.append(item)
-
-    with WorkerPool(workers=workers) as worker_pool:
-        while worker_pool.keep_running():
-            msg = worker_pool.get_event()
-            if msg['msg'] == 'REQUEST_WORK':
-                if items:
-                    item = items.pop()
-                    worker_pool.start_task(
-                        msg['wid'],
-                        item.get_status,
-                        task_id=item.node.name + ":" + item.id,
-                    )
-                else:
-                    worker_pool.quit(msg['wid'])
-            elif msg['msg'] == 'FINISHED_WORK':
-                item_id = msg['task_id']
-                item_status = msg['return_value']
-                if not item_status.correct:
-                    io.stderr("{} {}".format(
-                        red("✘"),
-                        item_id,
-                    ))
-                    yield False
-                else:
-                    if show_all:
-                        io.stdout("{} {}".format(
-                            green("✓"),
-                            item_id,
-                        ))
-                    yield True
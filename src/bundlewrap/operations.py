@@ -1,18 +1,212 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from contextlib import contextmanager
+from multiprocessing import BoundedSemaphore, Value
 from pipes import quote
 from select import select
 from subprocess import Popen, PIPE
-from threading import Event, Thread
-from os import close, pipe, read
+from threading import Event, Thread, Timer
+from time import time
+from os import close, environ, pipe, read
 
-from .exceptions import RemoteException
+from .exceptions import RemoteException, RemoteTimeout
 from .utils import cached_property
 from .utils.text import force_text, LineBuffer, mark_for_translation as _, randstr
 from .utils.ui import io
 
 
+class ConnectionLimiter(object):
+    """
+    Limits the number of simultaneous SSH connections (including scp)
+    in this process and all worker processes forked after configure()
+    has been called.
+
+    Limits can be set globally (BWMAXSSHCONNECTIONS), for all nodes in a
+    group combined and for individual nodes (both using the
+    max_ssh_connections attribute). A connection has to acquire a slot
+    from each applicable limit. Slots are always acquired in the same
+    order (global, groups sorted by name, node), so two connections
+    can't end up waiting on each other.
+
+    Connections to each node are counted regardless of limits. Both
+    limits and counters are kept per node name since several nodes may
+    share the same hostname.
+    """
+    def __init__(self):
+        # node names -> number of connections made
+        self.counters = {}
+        # node names -> list of semaphores
+        self.limits = {}
+        self.global_limit = None
+        self.stats = None
+
+    @contextmanager
+    def connection(self, hostname, node_name=None):
+        """
+        hostname is only used for logging. Connections without a
+        node_name are subject to the global limit only.
+        """
+        if node_name in self.counters:
+            with self.counters[node_name].get_lock():
+                self.counters[node_name].value += 1
+
+        if self.stats is None:
+            yield
+            return
+
+        semaphores = self.limits.get(node_name, [])
+        if self.global_limit is not None:
+            semaphores = [self.global_limit] + semaphores
+
+        start = time()
+        waited = False
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                if not semaphore.acquire(False):
+                    waited = True
+                    semaphore.acquire()
+                acquired.append(semaphore)
+            wait_time = time() - start
+
+            with self.stats['connections'].get_lock():
+                self.stats['connections'].value += 1
+            if waited:
+                io.debug(_("waited {time:.3f}s for a free SSH connection to {host}").format(
+                    host=hostname,
+                    time=wait_time,
+                ))
+                with self.stats['waited'].get_lock():
+                    self.stats['waited'].value += 1
+                    self.stats['wait_time'].value += wait_time
+                    self.stats['max_wait_time'].value = max(
+                        self.stats['max_wait_time'].value,
+                        wait_time,
+                    )
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    def configure(self, nodes):
+        """
+        Sets up limits for connections to the given nodes. Must be called
+        before starting worker processes.
+        """
+        global_limit = environ.get('BWMAXSSHCONNECTIONS', None)
+        self.global_limit = None if global_limit is None else \
+            BoundedSemaphore(int(global_limit))
+
+        group_limits = {}
+        self.counters = {}
+        self.limits = {}
+        for node in nodes:
+            self.counters[node.name] = Value('i', 0)
+            keys = []
+            for group in sorted(node.groups):
+                if group.max_ssh_connections is None:
+                    continue
+                if group.name not in group_limits:
+                    group_limits[group.name] = BoundedSemaphore(group.max_ssh_connections)
+                keys.append(group_limits[group.name])
+            if node.max_ssh_connections is not None:
+                keys.append(BoundedSemaphore(node.max_ssh_connections))
+            if keys:
+                self.limits[node.name] = keys
+
+        if self.global_limit is None and not self.limits:
+            self.stats = None
+        else:
+            self.stats = {
+                'connections': Value('i', 0),
+                'max_wait_time': Value('d', 0.0),
+                'wait_time': Value('d', 0.0),
+                'waited': Value('i', 0),
+            }
+
+    def connection_count(self, node_name):
+        """
+        Returns the number of connections made to the given node since
+        configure() was called (None if it wasn't configured for it).
+        """
+        if node_name not in self.counters:
+            return None
+        return self.counters[node_name].value
+
+    def summary(self):
+        """
+        Returns a dict with the total number of connections made so far,
+        the number of connections that had to wait for a free slot and
+        the total and maximum time spent waiting (in seconds). Returns
+        None if no limits have been configured.
+        """
+        if self.stats is None:
+            return None
+        return {key: value.value for key, value in self.stats.items()}
+
+
+connection_limiter = ConnectionLimiter()
+
+# deadlines (as returned by time()) set by time_limit() in this process
+_deadlines = []
+
+
+@contextmanager
+def time_limit(deadline):
+    """
+    Makes all commands started within this context give up once the
+    given deadline (as returned by time.time()) has passed. Can be
+    nested, the earliest deadline wins. None means no limit.
+    """
+    if deadline is None:
+        yield
+        return
+    _deadlines.append(deadline)
+    try:
+        yield
+    finally:
+        _deadlines.remove(deadline)
+
+
+def _remaining_time(timeout):
+    """
+    Returns the number of seconds a command may take given its own
+    timeout and all active deadlines (None if unlimited).
+    """
+    limits = [deadline - time() for deadline in _deadlines]
+    if timeout is not None:
+        limits.append(timeout)
+    if not limits:
+        return None
+    return min(limits)
+
+
+def _communicate(process, timeout):
+    """
+    Waits for the given process to exit, killing it after timeout
+    seconds (None means wait forever). Returns stdout, stderr (as
+    returned by Popen.communicate()) and True if the process had to be
+    killed.
+    """
+    if timeout is None:
+        stdout, stderr = process.communicate()
+        return stdout, stderr, False
+    killed = Event()
+
+    def kill():
+        killed.set()
+        process.kill()
+
+    timer = Timer(max(0, timeout), kill)
+    timer.start()
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        timer.cancel()
+    return stdout, stderr, killed.is_set()
+
+
 def output_thread_body(line_buffer, read_fd, quit_event):
     while not quit_event.is_set():
         r, w, x = select([read_fd], [], [], 0.1)
@@ -20,7 +214,8 @@ def output_thread_body(line_buffer, read_fd, quit_event):
             line_buffer.write(read(read_fd, 1024))
 
 
-def download(hostname, remote_path, local_path, add_host_keys=False):
+def download(hostname, remote_path, local_path, add_host_keys=False, timeout=None,
+             node_name=None):
     """
     Download a file.
     """
@@ -31,6 +226,8 @@ def download(hostname, remote_path, local_path, add_host_keys=False):
         hostname,
         "cat {}".format(quote(remote_path)),  # See issue #39.
         add_host_keys=add_host_keys,
+        node_name=node_name,
+        timeout=timeout,
     )
 
     if result.return_code == 0:
@@ -61,10 +258,21 @@ class RunResult(object):
         return force_text(self.stdout)
 
 
-def run(hostname, command, ignore_failure=False, add_host_keys=False, log_function=None):
+def run(hostname, command, ignore_failure=False, add_host_keys=False, log_function=None,
+        timeout=None, node_name=None):
     """
-    Runs a command on a remote system.
+    Runs a command on a remote system. Raises RemoteTimeout if the
+    command takes longer than timeout seconds (or runs past a deadline
+    set with time_limit()). node_name is used to apply connection
+    limits (see ConnectionLimiter).
     """
+    remaining = _remaining_time(timeout)
+    if remaining is not None and remaining <= 0:
+        raise RemoteTimeout(_("out of time before running '{command}' on '{host}'").format(
+            command=command,
+            host=hostname,
+        ))
+
     stderr_lb = LineBuffer(log_function)
     stdout_lb = LineBuffer(log_function)
 
@@ -73,17 +281,6 @@ def run(hostname, command, ignore_failure=False, add_host_keys=False, log_functi
     stdout_fd_r, stdout_fd_w = pipe()
     stderr_fd_r, stderr_fd_w = pipe()
 
-    ssh_process = Popen(
-        [
-            "ssh",
-            "-o",
-            "StrictHostKeyChecking=no" if add_host_keys else "StrictHostKeyChecking=yes",
-            hostname,
-            "LANG=C sudo bash -c " + quote(command),
-        ],
-        stderr=stderr_fd_w,
-        stdout=stdout_fd_w,
-    )
     quit_event = Event()
     stdout_thread = Thread(
         args=(stdout_lb, stdout_fd_r, quit_event),
@@ -96,7 +293,21 @@ def run(hostname, command, ignore_failure=False, add_host_keys=False, log_functi
     stdout_thread.start()
     stderr_thread.start()
     try:
-        ssh_process.communicate()
+        with connection_limiter.connection(hostname, node_name=node_name):
+            ssh_process = Popen(
+                [
+                    "ssh",
+                    "-o",
+                    "StrictHostKeyChecking=no" if add_host_keys else "StrictHostKeyChecking=yes",
+                    hostname,
+                    "LANG=C sudo bash -c " + quote(command),
+                ],
+                stderr=stderr_fd_w,
+                stdout=stdout_fd_w,
+            )
+            # waiting for a free connection counts against deadlines
+            remaining = _remaining_time(timeout)
+            timed_out = _communicate(ssh_process, remaining)[2]
     finally:
         quit_event.set()
         stdout_thread.join()
@@ -113,6 +324,17 @@ def run(hostname, command, ignore_failure=False, add_host_keys=False, log_functi
     result.stderr = stderr_lb.record.getvalue()
     result.return_code = ssh_process.returncode
 
+    if timed_out:
+        raise RemoteTimeout(_(
+            "'{command}' on '{host}' did not finish within {timeout:.1f}s, "
+            "output so far:\n\n{result}"
+        ).format(
+            command=command,
+            host=hostname,
+            result=force_text(result.stdout) + force_text(result.stderr),
+            timeout=remaining,
+        ), result=result)
+
     if not result.return_code == 0 and not ignore_failure:
         raise RemoteException(_(
             "Non-zero return code ({rcode}) running '{command}' on '{host}':\n\n{result}"
@@ -126,26 +348,33 @@ def run(hostname, command, ignore_failure=False, add_host_keys=False, log_functi
 
 
 def upload(hostname, local_path, remote_path, mode=None, owner="",
-           group="", add_host_keys=False):
+           group="", add_host_keys=False, timeout=None, node_name=None):
     """
-    Upload a file.
+    Upload a file. timeout applies to each individual step.
     """
     io.debug(_("uploading {path} -> {host}:{target}").format(
         host=hostname, path=local_path, target=remote_path))
     temp_filename = ".bundlewrap_tmp_" + randstr()
 
-    scp_process = Popen(
-        [
-            "scp",
-            "-o",
-            "StrictHostKeyChecking=no" if add_host_keys else "StrictHostKeyChecking=yes",
-            local_path,
-            "{}:{}".format(hostname, temp_filename),
-        ],
-        stdout=PIPE,
-        stderr=PIPE,
-    )
-    stdout, stderr = scp_process.communicate()
+    with connection_limiter.connection(hostname, node_name=node_name):
+        scp_process = Popen(
+            [
+                "scp",
+                "-o",
+                "StrictHostKeyChecking=no" if add_host_keys else "StrictHostKeyChecking=yes",
+                local_path,
+                "{}:{}".format(hostname, temp_filename),
+            ],
+            stdout=PIPE,
+            stderr=PIPE,
+        )
+        stdout, stderr, timed_out = _communicate(scp_process, _remaining_time(timeout))
+
+    if timed_out:
+        raise RemoteTimeout(_("upload to {host} did not finish in time for {failed}").format(
+            failed=remote_path,
+            host=hostname,
+        ))
 
     if scp_process.returncode != 0:
         raise RemoteException(_(
@@ -167,6 +396,8 @@ def upload(hostname, local_path, remote_path, mode=None, owner="",
                 quote(temp_filename),
             ),
             add_host_keys=add_host_keys,
+            node_name=node_name,
+            timeout=timeout,
         )
 
     if mode:
@@ -177,6 +408,8 @@ def upload(hostname, local_path, remote_path, mode=None, owner="",
                 quote(temp_filename),
             ),
             add_host_keys=add_host_keys,
+            node_name=node_name,
+            timeout=timeout,
         )
 
     run(
@@ -186,4 +419,6 @@ def upload(hostname, local_path, remote_path, mode=None, owner="",
             quote(remote_path),
         ),
         add_host_keys=add_host_keys,
+        node_name=node_name,
+        timeout=timeout,
     )
@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from contextlib import contextmanager
 from copy import copy
 from imp import load_source
-from os import listdir, mkdir
+from os import getpid, listdir, mkdir
 from os.path import isdir, isfile, join
+from weakref import WeakValueDictionary
 
 from . import items
 from .exceptions import NoSuchGroup, NoSuchNode, NoSuchRepository, RepositoryError
 from .group import Group
+from .metadata import MetadataProcessorCache
 from .node import Node
 from . import utils
+from .utils.cache import cache_enabled, hash_paths, read_cache, write_cache
 from .utils.scm import get_rev
 from .utils.statedict import hash_statedict
 from .utils.text import mark_for_translation as _, validate_name
@@ -71,12 +75,29 @@ nodes = {
 }
 
 
-def groups_from_file(filepath, libs):
-    """
-    Returns all groups as defined in the given groups.py.
-    """
+# Repository objects created in this process (or inherited from the
+# parent process if this is a forked worker) by their repo_id. This
+# lets us send references to workers instead of entire repositories.
+_REPOSITORIES = WeakValueDictionary()
+# repositories loaded by workers that didn't inherit the original
+_REPOSITORIES_LOADED = {}
+
+
+def _unpickle_repository_reference(path, repo_id):
+    try:
+        return _REPOSITORIES[repo_id]
+    except KeyError:
+        pass
+    if repo_id not in _REPOSITORIES_LOADED:
+        io.debug(_("loading repository at {} in worker process").format(path))
+        repo = Repository(path)
+        _REPOSITORIES_LOADED[repo_id] = repo
+    return _REPOSITORIES_LOADED[repo_id]
+
+
+def _flat_group_dict_from_file(filepath, libs):
     try:
-        flat_group_dict = utils.getattr_from_file(
+        return utils.getattr_from_file(
             filepath,
             'groups',
             base_env={'libs': libs},
@@ -85,16 +106,22 @@ def groups_from_file(filepath, libs):
         raise RepositoryError(_(
             "{} must define a 'groups' variable"
         ).format(filepath))
-    for groupname, infodict in flat_group_dict.items():
+
+
+def groups_from_file(filepath, libs):
+    """
+    Returns all groups as defined in the given groups.py.
+    """
+    for groupname, infodict in _flat_group_dict_from_file(filepath, libs).items():
         yield Group(groupname, infodict)
 
 
 class HooksProxy(object):
-    def __init__(self, path):
+    def __init__(self, path, registered_hooks=None):
         self.__hook_cache = {}
         self.__module_cache = {}
         self.__path = path
-        self.__registered_hooks = None
+        self.__registered_hooks = registered_hooks
 
     def __getattr__(self, attrname):
         if attrname not in HOOK_EVENTS:
@@ -140,6 +167,15 @@ class HooksProxy(object):
         self.__path = state[0]
         self.__registered_hooks = state[1]
 
+    @property
+    def registered_hooks(self):
+        """
+        A dict mapping hook filenames to the events they handle.
+        """
+        if self.__registered_hooks is None:
+            self._register_hooks()
+        return self.__registered_hooks
+
     def _register_hooks(self):
         """
         Builds an internal dictionary of defined hooks that is used in
@@ -231,12 +267,9 @@ class LibsProxy(object):
         self.__path = state
 
 
-def nodes_from_file(filepath, libs, repo_path):
-    """
-    Returns a list of nodes as defined in the given nodes.py.
-    """
+def _flat_node_dict_from_file(filepath, libs, repo_path):
     try:
-        flat_node_dict = utils.getattr_from_file(
+        return utils.getattr_from_file(
             filepath,
             'nodes',
             base_env={'libs': libs, 'repo_path': repo_path},
@@ -245,19 +278,29 @@ def nodes_from_file(filepath, libs, repo_path):
         raise RepositoryError(
             _("{} must define a 'nodes' variable").format(filepath)
         )
-    for nodename, infodict in flat_node_dict.items():
+
+
+def nodes_from_file(filepath, libs, repo_path):
+    """
+    Returns a list of nodes as defined in the given nodes.py.
+    """
+    for nodename, infodict in _flat_node_dict_from_file(filepath, libs, repo_path).items():
         yield Node(nodename, infodict)
 
 
 class Repository(object):
     def __init__(self, repo_path=None):
         self.path = "/dev/null" if repo_path is None else repo_path
+        self.repo_id = "{}-{}".format(getpid(), id(self))
+        _REPOSITORIES[self.repo_id] = self
 
         self._set_path(self.path)
 
         self.bundle_names = []
         self.group_dict = {}
         self.node_dict = {}
+        self._metadata_readers = []
+        self._snapshot_key = None
 
         if repo_path is not None:
             self.populate_from_path(repo_path)
@@ -277,6 +320,7 @@ class Repository(object):
         """
         state = copy(self.__dict__)
         state['item_classes'] = []
+        state['_metadata_readers'] = []
         return state
 
     def __setstate__(self, state):
@@ -285,6 +329,21 @@ class Repository(object):
         if self.path != "/dev/null":
             self.item_classes += list(items_from_path(self.items_dir))
 
+    def __reduce_ex__(self, protocol):
+        """
+        Repositories loaded from disk are pickled as a reference. Forked
+        worker processes will find the original object in
+        _REPOSITORIES, others will load the repo from disk once.
+        Note that this means changes made to such a repo through the API
+        are not visible to workers that weren't forked after the
+        changes were made.
+
+        In-memory repos have to be pickled in their entirety.
+        """
+        if self.path == "/dev/null":
+            return object.__reduce_ex__(self, protocol)
+        return (_unpickle_repository_reference, (self.path, self.repo_id))
+
     def __repr__(self):
         return "<Repository at '{}'>".format(self.path)
 
@@ -305,10 +364,10 @@ class Repository(object):
         """
         Adds the given group object to this repo.
         """
-        if group.name in utils.names(self.nodes):
+        if group.name in self.node_dict:
             raise RepositoryError(_("you cannot have a node and a group "
                                     "both named '{}'").format(group.name))
-        if group.name in utils.names(self.groups):
+        if group.name in self.group_dict:
             raise RepositoryError(_("you cannot have two groups "
                                     "both named '{}'").format(group.name))
         group.repo = self
@@ -318,10 +377,10 @@ class Repository(object):
         """
         Adds the given node object to this repo.
         """
-        if node.name in utils.names(self.groups):
+        if node.name in self.group_dict:
             raise RepositoryError(_("you cannot have a node and a group "
                                     "both named '{}'").format(node.name))
-        if node.name in utils.names(self.nodes):
+        if node.name in self.node_dict:
             raise RepositoryError(_("you cannot have two nodes "
                                     "both named '{}'").format(node.name))
 
@@ -438,10 +497,32 @@ class Repository(object):
             if validate_name(dir_entry):
                 self.bundle_names.append(dir_entry)
 
+        snapshot_key = None
+        snapshot = None
+        if cache_enabled():
+            snapshot_key = hash_paths(
+                self.path,
+                FILENAME_GROUPS,
+                FILENAME_NODES,
+                DIRNAME_HOOKS,
+                DIRNAME_LIBS,
+            )
+            snapshot = read_cache(self.path, "repo", snapshot_key)
+        self._snapshot_key = snapshot_key
+
+        if snapshot is None:
+            flat_group_dict = _flat_group_dict_from_file(self.groups_file, self.libs)
+            flat_node_dict = _flat_node_dict_from_file(self.nodes_file, self.libs, self.path)
+        else:
+            io.debug(_("using cached repository snapshot {}").format(snapshot_key))
+            flat_group_dict = snapshot['groups']
+            flat_node_dict = snapshot['nodes']
+            self.hooks = HooksProxy(self.hooks_dir, registered_hooks=snapshot['hooks'])
+
         # populate groups
         self.group_dict = {}
-        for group in groups_from_file(self.groups_file, self.libs):
-            self.add_group(group)
+        for group_name, infodict in flat_group_dict.items():
+            self.add_group(Group(group_name, infodict))
 
         # populate items
         self.item_classes = list(items_from_path(items.__path__[0]))
@@ -450,8 +531,129 @@ class Repository(object):
 
         # populate nodes
         self.node_dict = {}
-        for node in nodes_from_file(self.nodes_file, self.libs, self.path):
-            self.add_node(node)
+        for node_name, infodict in flat_node_dict.items():
+            self.add_node(Node(node_name, infodict))
+
+        if snapshot is not None:
+            self._restore_snapshot(snapshot)
+        elif snapshot_key is not None:
+            self._write_snapshot(snapshot_key, flat_group_dict, flat_node_dict)
+
+    def _restore_snapshot(self, snapshot):
+        """
+        Primes group and node caches with the results of a previous
+        run (see _write_snapshot()).
+        """
+        for group_name, member_names in snapshot['members'].items():
+            group = self.group_dict[group_name]
+            group._cache = {
+                'nodes': tuple([self.node_dict[name] for name in member_names]),
+            }
+        for node_name, node in self.node_dict.items():
+            node._cache = {
+                'groups': tuple([
+                    self.group_dict[name] for name in snapshot['groups_for_node'][node_name]
+                ]),
+            }
+
+    def _write_snapshot(self, snapshot_key, flat_group_dict, flat_node_dict):
+        """
+        Stores everything we know about nodes and groups in the on-disk
+        cache so subsequent invocations on the same repo state don't
+        have to execute nodes.py, groups.py and hooks again. Metadata is
+        added to the snapshot by _snapshot_metadata() once a command
+        needs it.
+        """
+        try:
+            snapshot = {
+                'groups': flat_group_dict,
+                'groups_for_node': {},
+                'hooks': self.hooks.registered_hooks,
+                'members': {},
+                'nodes': flat_node_dict,
+            }
+            for group in self.groups:
+                snapshot['members'][group.name] = list(utils.names(group.nodes))
+            for node in self.nodes:
+                snapshot['groups_for_node'][node.name] = list(utils.names(node.groups))
+            write_cache(self.path, snapshot, "repo", snapshot_key)
+        except Exception as e:
+            # errors will surface again once the offending part of the
+            # repo is actually used, we just won't cache anything
+            io.debug(_("unable to write repository snapshot: {}").format(repr(e)))
+
+    @contextmanager
+    def _metadata_reader(self, node):
+        """
+        Attributes all reads of other nodes' metadata within this
+        context to the given node (see Node._metadata_reads).
+        """
+        self._metadata_readers.append(node)
+        try:
+            yield
+        finally:
+            self._metadata_readers.pop()
+
+    def _snapshot_metadata(self, node_name, build):
+        """
+        Returns the metadata of the given node stored alongside the
+        repository snapshot. If there is none, it is built by calling
+        build() and stored for the next invocation.
+        """
+        if self._snapshot_key is None:
+            return build()
+        metadata = read_cache(self.path, "repo_metadata", self._snapshot_key, node_name)
+        if metadata is not None:
+            return metadata
+        metadata = build()
+        try:
+            write_cache(self.path, metadata, "repo_metadata", self._snapshot_key, node_name)
+        except Exception as e:
+            io.debug(_("unable to cache metadata for {node}: {error}").format(
+                error=repr(e),
+                node=node_name,
+            ))
+        return metadata
+
+    @utils.cached_property
+    def _bundle_hashes(self):
+        return {}
+
+    def _bundle_hash(self, bundle_name):
+        """
+        Returns a hash of all files belonging to the given bundle
+        (including those in data/).
+        """
+        if bundle_name not in self._bundle_hashes:
+            self._bundle_hashes[bundle_name] = hash_paths(
+                self.path,
+                join(DIRNAME_BUNDLES, bundle_name),
+                join(DIRNAME_DATA, bundle_name),
+            )
+        return self._bundle_hashes[bundle_name]
+
+    @utils.cached_property
+    def _cdict_inputs_hash(self):
+        """
+        Returns a hash of all files outside of bundles that item
+        configuration may be derived from. Metadata is taken care of by
+        Node._cdict_inputs and Node._metadata_reads.
+        """
+        return hash_paths(
+            self.path,
+            FILENAME_GROUPS,
+            FILENAME_NODES,
+            DIRNAME_ITEM_TYPES,
+            DIRNAME_LIBS,
+        )
+
+    @utils.cached_property
+    def _libs_hash(self):
+        return hash_paths(self.path, DIRNAME_LIBS)
+
+    @utils.cached_property
+    def _metadata_processor_cache(self):
+        return MetadataProcessorCache(self)
 
     @utils.cached_property
     def revision(self):
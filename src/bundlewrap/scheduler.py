@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime
+from time import time
+
+from .concurrency import Autoscaler, WorkerPool
+from .exceptions import WorkerException
+from .metadata import metadata_for_nodes
+from .operations import connection_limiter
+from .utils.cache import cache_enabled, read_cache, write_cache
+from .utils.text import force_text, mark_for_translation as _
+from .utils.ui import io
+
+
+class NodeJob(object):
+    """
+    Base class for everything BundleWrap has to do on a single node
+    during a run (e.g. applying or verifying all of its items).
+
+    A job is driven by run_node_jobs() in the parent process. Whenever a
+    worker is available, the job is asked for its next task. Results
+    are fed back into the job until it declares itself done.
+    """
+    def __init__(self, node, events=None):
+        self.node = node
+        self.done = False
+        # an EventLog (see bundlewrap.utils.events) or None
+        self.events = events
+        self.errors = []
+        self.result = None
+        self.tasks_running = 0
+        # set by run_node_jobs()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def duration(self):
+        return self.finished_at - self.started_at
+
+    def next_task(self):
+        """
+        Returns a dict describing the next task to be handed to a worker
+        or None if there is nothing to do for this job right now. The
+        dict must contain 'task_id' (unique among the tasks of this job)
+        and 'target' (a callable to run in the worker) and may contain
+        'args' and 'kwargs'.
+
+        MUST be overridden by subclasses.
+        """
+        raise NotImplementedError
+
+    def emit(self, event, **kwargs):
+        """
+        Adds an event concerning this job's node to the event log (if
+        there is one).
+        """
+        if self.events is not None:
+            self.events.emit(event, node=self.node.name, **kwargs)
+
+    def node_end_event(self):
+        """
+        Returns a dict with additional information for the 'node_end'
+        event (e.g. the number of items fixed).
+
+        MAY be overridden by subclasses.
+        """
+        return {}
+
+    def prepare(self):
+        """
+        Called by run_node_jobs() before any worker processes are
+        started. Workers inherit everything built here (e.g. the items
+        of the node) instead of each building it again. Exceptions are
+        ignored, the same work will fail again (and be reported) once
+        the job is running.
+
+        MAY be overridden by subclasses.
+        """
+        pass
+
+    def ready_tasks(self):
+        """
+        Returns the number of tasks that could be handed out right now.
+        Only used to guide autoscaling, so an estimate is fine.
+        """
+        return 0
+
+    def task_failed(self, task_id, exception):
+        """
+        Called with the WorkerException raised by a task of this job.
+
+        MUST be overridden by subclasses.
+        """
+        raise NotImplementedError
+
+    def task_finished(self, task_id, return_value, duration):
+        """
+        Called with the return value of each task of this job.
+
+        MUST be overridden by subclasses.
+        """
+        raise NotImplementedError
+
+
+# how often the status line is updated (seconds)
+STATUS_INTERVAL = 1.0
+# number of nodes listed on the status line
+STATUS_NODES = 3
+
+# weight of the most recent run when updating duration history
+DURATION_HISTORY_WEIGHT = 0.5
+
+
+def expected_durations(repo, nodes, operation):
+    """
+    Returns a dict mapping the names of the given nodes to the number of
+    seconds the given operation ('apply', 'verify' or 'run') is expected
+    to take on each of them, based on previous runs (see
+    record_durations()).
+
+    Nodes without history are assumed to take as long as the slowest
+    known node. Finding out anything else about them (like the number
+    of items) would take longer than we could hope to save.
+    """
+    history = {}
+    if cache_enabled():
+        history = read_cache(repo.path, "durations", operation) or {}
+    slowest = max(list(history.values()) or [0.0])
+    return {node.name: history.get(node.name, slowest) for node in nodes}
+
+
+def longest_first(repo, nodes, operation):
+    """
+    Returns the given nodes ordered so that those expected to take the
+    longest come first. Starting them early keeps them from holding up
+    the end of the run.
+    """
+    durations = expected_durations(repo, nodes, operation)
+    return sorted(nodes, key=lambda node: (-durations[node.name], node.name))
+
+
+def record_durations(repo, operation, durations):
+    """
+    Updates the duration history for the given operation. durations is
+    a dict mapping node names to timedeltas.
+    """
+    if not durations or not cache_enabled():
+        return
+    history = read_cache(repo.path, "durations", operation) or {}
+    for node_name, duration in durations.items():
+        seconds = duration.total_seconds()
+        if node_name in history:
+            seconds = DURATION_HISTORY_WEIGHT * seconds + \
+                (1 - DURATION_HISTORY_WEIGHT) * history[node_name]
+        history[node_name] = seconds
+    try:
+        write_cache(repo.path, history, "durations", operation)
+    except Exception as e:
+        io.debug(_("unable to store durations: {}").format(repr(e)))
+
+
+def _emit_job_finished(job):
+    for e in job.errors:
+        if isinstance(e, WorkerException):
+            job.emit('error', message=force_text(e.wrapped_exception), task=e.task_id)
+        else:
+            job.emit('error', message=force_text(str(e)), task=None)
+    job.emit(
+        'node_end',
+        duration=job.duration.total_seconds(),
+        errors=len(job.errors),
+        remote_calls=connection_limiter.connection_count(job.node.name),
+        **job.node_end_event()
+    )
+
+
+def _prepare_jobs(jobs, workers):
+    """
+    Calls prepare() on all jobs after computing metadata for their
+    nodes in parallel.
+    """
+    try:
+        for node_name, metadata in metadata_for_nodes(
+            [job.node for job in jobs],
+            workers=workers,
+        ):
+            pass
+    except Exception as e:
+        # will be reported properly once we get to this node
+        io.debug(_("unable to compute metadata in advance: {}").format(repr(e)))
+    for job in jobs:
+        try:
+            job.prepare()
+        except Exception as e:
+            io.debug(_("unable to prepare {node}: {error}").format(
+                error=repr(e),
+                node=job.node.name,
+            ))
+
+
+def _straggler_report(running_tasks, task_start_times):
+    """
+    Returns a line describing the nodes with the oldest tasks still in
+    progress or None if nothing is running.
+    """
+    # node names -> (seconds, task id)
+    oldest = {}
+    now = time()
+    for global_task_id, (job, task_id) in running_tasks.items():
+        seconds = now - task_start_times[global_task_id]
+        if seconds > oldest.get(job.node.name, (-1, None))[0]:
+            oldest[job.node.name] = (seconds, task_id)
+    if not oldest:
+        return None
+    slowest = sorted(oldest.items(), key=lambda node: -node[1][0])[:STATUS_NODES]
+    return _("slowest: {}").format(", ".join([
+        "{} ({}, {:.0f}s)".format(node_name, task_id, seconds)
+        for node_name, (seconds, task_id) in slowest
+    ]))
+
+
+def _global_task_id(job, task_id):
+    return "{}:{}".format(job.node.name, task_id)
+
+
+class NodeJobScheduler(object):
+    """
+    Runs NodeJobs using a single pool of worker processes shared by all
+    nodes. See run_node_jobs().
+
+    Exceptions raised by the methods of a job (in this process) only
+    affect that job: they are added to job.errors and the job is
+    considered done.
+    """
+    def __init__(self, jobs, workers=4, node_workers=4, item_workers=4, autoscale=False):
+        self.jobs = list(jobs)
+        self.workers = max(1, min(workers, len(self.jobs) * item_workers))
+        self.node_workers = node_workers
+        self.item_workers = item_workers
+        self.autoscale = autoscale
+
+        self.pending_jobs = list(reversed(self.jobs))
+        self.active_jobs = []
+        # jobs that have been started, but haven't been yielded yet
+        self.started_jobs = []
+        # jobs that are done, but haven't been yielded yet
+        self.finished_jobs = []
+
+        # global task ids -> (job, task id within job)
+        self.running_tasks = {}
+        # global task ids -> time()
+        self.task_start_times = {}
+        self.status_line = None
+        self.status_updated = time()
+
+        # jobs -> Autoscalers
+        self.job_scalers = {}
+        self.pool_scaler = None
+        if autoscale:
+            self.pool_scaler = Autoscaler(
+                _("worker pool"),
+                min(node_workers, self.workers),
+                self.workers,
+            )
+        self.worker_pool = None
+
+    def run(self):
+        """
+        Yields each job once when work on it begins and again as soon as
+        it is done (job.done will be True).
+        """
+        # must happen before forking the workers, so they don't have to
+        # build the items of each node they work on by themselves and
+        # share the connection limits
+        _prepare_jobs(self.jobs, self.workers)
+        connection_limiter.configure([job.node for job in self.jobs])
+
+        initial_workers = self.pool_scaler.limit if self.autoscale else self.workers
+        with WorkerPool(workers=initial_workers) as self.worker_pool:
+            while self.worker_pool.keep_running():
+                self._update_status_line()
+                msg = self._get_event()
+                if msg is None:
+                    # nothing happened, but the status line might need
+                    # an update
+                    continue
+                if msg['msg'] == 'REQUEST_WORK':
+                    self._request_work(msg['wid'])
+                else:
+                    # there might be new tasks available now, so tell
+                    # all idle workers to ask for work again
+                    self.worker_pool.activate_idle_workers()
+                self._scale()
+                for job in self._jobs_to_yield():
+                    yield job
+
+        if self.status_line is not None:
+            io.job_del(self.status_line)
+
+        if self.active_jobs or self.pending_jobs:
+            raise RuntimeError(_("unable to finish work on nodes: {}").format(
+                ", ".join([job.node.name for job in self.active_jobs + self.pending_jobs]),
+            ))
+
+    def _call(self, job, method, *args):
+        """
+        Calls the given method of job and returns its return value. If
+        it raises an exception, the job fails and None is returned.
+        """
+        try:
+            return getattr(job, method)(*args)
+        except Exception as e:
+            io.debug(_("{method}() of job for {node} failed: {error}").format(
+                error=repr(e),
+                method=method,
+                node=job.node.name,
+            ))
+            job.errors.append(e)
+            job.done = True
+            return None
+
+    def _finish_task(self, global_task_id, duration=None, return_value=None, exception=None):
+        """
+        Called with the result of a task or the WorkerException raised
+        by it.
+        """
+        self.task_start_times.pop(global_task_id)
+        job, task_id = self.running_tasks.pop(global_task_id)
+        job.tasks_running -= 1
+        if self.autoscale:
+            self.job_scalers[job].task_finished(duration, failed=exception is not None)
+            self.pool_scaler.task_finished(duration, failed=exception is not None)
+        if job.done:
+            # the job has failed in the meantime
+            return
+        if exception is not None:
+            io.debug(_("task {task} failed on {node}").format(
+                node=job.node.name,
+                task=task_id,
+            ))
+            self._call(job, 'task_failed', task_id, exception)
+        else:
+            self._call(job, 'task_finished', task_id, return_value, duration)
+        self._check_done(job)
+
+    def _check_done(self, job):
+        if job.done and job in self.active_jobs:
+            self.active_jobs.remove(job)
+            self.finished_jobs.append(job)
+
+    def _get_event(self):
+        """
+        Waits for a message from a worker. Finished tasks are handled
+        here, so the caller only has to care about whether a worker
+        requests work or not.
+        """
+        try:
+            msg = self.worker_pool.get_event(timeout=STATUS_INTERVAL)
+        except WorkerException as e:
+            self._finish_task(e.task_id, exception=e)
+            return {'msg': 'FINISHED_TASK'}
+        if msg is not None and msg['msg'] == 'FINISHED_WORK':
+            self._finish_task(
+                msg['task_id'],
+                duration=msg['duration'],
+                return_value=msg['return_value'],
+            )
+            return {'msg': 'FINISHED_TASK'}
+        return msg
+
+    def _job_limit(self, job):
+        if self.autoscale:
+            return self.job_scalers[job].limit
+        return self.item_workers
+
+    def _jobs_to_yield(self):
+        while self.started_jobs:
+            job = self.started_jobs.pop(0)
+            job.emit('node_start')
+            yield job
+        while self.finished_jobs:
+            job = self.finished_jobs.pop(0)
+            job.finished_at = datetime.now()
+            _emit_job_finished(job)
+            yield job
+
+    def _next_task(self):
+        """
+        Returns the next task to run and the job it belongs to (or None,
+        None if there is nothing to do right now).
+        """
+        for job in self.active_jobs[:]:
+            if job.tasks_running >= self._job_limit(job):
+                continue
+            task = self._call(job, 'next_task')
+            # some jobs may turn out to be done without running a
+            # single task
+            self._check_done(job)
+            if task is not None and not job.done:
+                return job, task
+        while self.pending_jobs and len(self.active_jobs) < self.node_workers:
+            job = self._start_job()
+            task = self._call(job, 'next_task')
+            self._check_done(job)
+            if task is not None and not job.done:
+                return job, task
+        return None, None
+
+    def _observe(self):
+        waiting_total = 0
+        for job in self.active_jobs[:]:
+            ready = self._call(job, 'ready_tasks')
+            self._check_done(job)
+            if job.done:
+                continue
+            scaler = self.job_scalers[job]
+            scaler.observe(
+                job.tasks_running,
+                ready if job.tasks_running >= scaler.limit else 0,
+            )
+            waiting_total += max(0, min(ready, scaler.limit - job.tasks_running))
+        if len(self.active_jobs) < self.node_workers:
+            waiting_total += len(self.pending_jobs)
+        self.pool_scaler.observe(self.worker_pool.jobs_open, waiting_total)
+
+    def _request_work(self, wid):
+        if self.autoscale and \
+                len(self.worker_pool.workers_alive) > max(1, self.pool_scaler.limit):
+            # the pool has been scaled down
+            self.worker_pool.quit(wid)
+            return
+
+        job, task = self._next_task()
+        if task is not None:
+            self._start_task(wid, job, task)
+        elif self.worker_pool.jobs_open > 0:
+            # No work right now, but another worker might finish and
+            # "create" a new task. Keep this worker idle.
+            self.worker_pool.mark_idle(wid)
+        else:
+            # No work, no outstanding tasks. We're done.
+            self.worker_pool.quit(wid)
+
+    def _scale(self):
+        if not self.autoscale or not (self.active_jobs or self.pending_jobs):
+            return
+        self._observe()
+        while len(self.worker_pool.workers_alive) < self.pool_scaler.limit:
+            self.worker_pool.add_worker()
+
+    def _start_job(self):
+        job = self.pending_jobs.pop()
+        job.started_at = datetime.now()
+        self.active_jobs.append(job)
+        if self.autoscale:
+            self.job_scalers[job] = Autoscaler(job.node.name, 1, self.item_workers)
+        self.started_jobs.append(job)
+        return job
+
+    def _start_task(self, wid, job, task):
+        global_task_id = _global_task_id(job, task['task_id'])
+        self.running_tasks[global_task_id] = (job, task['task_id'])
+        self.task_start_times[global_task_id] = time()
+        job.tasks_running += 1
+        # start_task() increases jobs_open.
+        self.worker_pool.start_task(
+            wid,
+            task['target'],
+            task_id=global_task_id,
+            args=task.get('args'),
+            kwargs=task.get('kwargs'),
+        )
+
+    def _update_status_line(self):
+        if time() - self.status_updated < STATUS_INTERVAL:
+            return
+        new_status_line = _straggler_report(self.running_tasks, self.task_start_times)
+        if new_status_line != self.status_line:
+            if self.status_line is not None:
+                io.job_del(self.status_line)
+            if new_status_line is not None:
+                io.job_add(new_status_line)
+            self.status_line = new_status_line
+        self.status_updated = time()
+
+
+def run_node_jobs(jobs, workers=4, node_workers=4, item_workers=4, autoscale=False):
+    """
+    Runs the given NodeJobs using a single pool of worker processes
+    shared by all nodes. Yields each job once when work on it begins
+    and again as soon as it is done (job.done will be True).
+
+    workers         total number of worker processes
+    node_workers    max. number of jobs (nodes) being worked on at once
+    item_workers    max. number of tasks running at once for each job
+    autoscale       if True, workers and item_workers are upper bounds
+                    and the actual numbers are adjusted while running
+                    (see Autoscaler)
+    """
+    return NodeJobScheduler(
+        jobs,
+        autoscale=autoscale,
+        item_workers=item_workers,
+        node_workers=node_workers,
+        workers=workers,
+    ).run()
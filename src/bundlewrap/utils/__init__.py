@@ -112,7 +112,6 @@ def graph_for_items(
     title,
     items,
     cluster=True,
-    concurrency=True,
     static=True,
     regular=True,
     reverse=True,
@@ -176,10 +175,7 @@ def graph_for_items(
 
         if auto:
             for dep in sorted(item._deps):
-                if dep in item._concurrency_deps:
-                    if concurrency:
-                        yield "\"{}\" -> \"{}\" [color=\"#714D99\",penwidth=2]".format(item.id, dep)
-                elif dep in item._reverse_deps:
+                if dep in item._reverse_deps:
                     if reverse:
                         yield "\"{}\" -> \"{}\" [color=\"#D18C57\",penwidth=2]".format(item.id, dep)
                 elif dep not in item.NEEDS_STATIC and dep not in item.needs:
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import hmac
+import json
+from os import chmod, environ, fdopen, makedirs, remove, rename, urandom, walk
+from os.path import dirname, exists, isdir, isfile, join
+import stat
+from tempfile import mkstemp
+
+try:
+    import cPickle as pickle
+except ImportError:  # Python 3
+    import pickle
+
+from .. import VERSION_STRING
+from . import get_file_contents
+from .ui import io
+
+CACHE_DIRNAME = ".bw_cache"
+MODE600 = stat.S_IRUSR | stat.S_IWUSR
+
+
+def cache_enabled():
+    """
+    Returns True if the user has opted into the on-disk cache by
+    setting BWREPOCACHE=1.
+    """
+    return environ.get('BWREPOCACHE', "0") == "1"
+
+
+def cache_path(repo_path, *components):
+    return join(repo_path, CACHE_DIRNAME, *components)
+
+
+def hash_paths(base_path, *paths):
+    """
+    Returns a SHA1 hash summarizing the names and contents of the given
+    files and directories (relative to base_path). Missing paths are
+    part of the hash as well, so creating them will change it.
+    """
+    hasher = hashlib.sha1()
+    hasher.update(VERSION_STRING.encode('utf-8'))
+    for path in paths:
+        full_path = join(base_path, path)
+        if isfile(full_path):
+            hasher.update(b"\0file\0" + path.encode('utf-8') + b"\0")
+            hasher.update(get_file_contents(full_path))
+        elif isdir(full_path):
+            for dirpath, dirnames, filenames in walk(full_path):
+                # make sure we walk in a stable order and skip files
+                # Python creates as a side effect of importing libs
+                dirnames[:] = sorted([d for d in dirnames if d != "__pycache__"])
+                for filename in sorted(filenames):
+                    if filename.endswith(".pyc"):
+                        continue
+                    filepath = join(dirpath, filename)
+                    hasher.update(b"\0file\0" + filepath[len(base_path):].encode('utf-8') + b"\0")
+                    hasher.update(get_file_contents(filepath))
+        else:
+            hasher.update(b"\0missing\0" + path.encode('utf-8') + b"\0")
+    return hasher.hexdigest()
+
+
+def read_cache(repo_path, *components):
+    """
+    Returns the object stored at the given cache location or None if
+    there is no such object (or it can't be read).
+    """
+    path = cache_path(repo_path, *components)
+    if not exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        io.debug("unable to read cache file {path}: {error}".format(
+            error=repr(e),
+            path=path,
+        ))
+        return None
+
+
+def write_cache(repo_path, obj, *components):
+    """
+    Stores the given object at the given cache location. The file is
+    only readable by the current user and is replaced atomically, so
+    concurrent bw processes will never see a partially written file.
+    """
+    path = cache_path(repo_path, *components)
+    if not exists(dirname(path)):
+        makedirs(dirname(path))
+    handle, tmp_path = mkstemp(dir=dirname(path))
+    try:
+        chmod(tmp_path, MODE600)
+        with fdopen(handle, 'wb') as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        rename(tmp_path, path)
+    except:
+        remove(tmp_path)
+        raise
+
+
+_PASSWORD_HASHES = {}
+
+
+def _cache_secret(repo_path):
+    """
+    Returns a random secret for the cache of the given repo, creating
+    it if necessary. Returns None if it can't be stored.
+    """
+    secret = read_cache(repo_path, "secret")
+    if secret is None:
+        secret = urandom(32)
+        try:
+            write_cache(repo_path, secret, "secret")
+        except Exception as e:
+            io.debug("unable to write cache secret: {}".format(repr(e)))
+            return None
+    return secret
+
+
+def cached_password_hash(repo_path, hash_func, method, password, salt=None, rounds=None):
+    """
+    Returns the result of hash_func(), which is expected to hash the
+    given password using the given method, salt and rounds. Results
+    are kept in memory for the lifetime of the process and, if
+    BWREPOCACHE is enabled, in .bw_cache/password_hashes as well.
+
+    On disk, the cache is keyed on an HMAC of all inputs using a random
+    secret stored in .bw_cache, so the file names can't be used to
+    guess passwords without that secret.
+    """
+    inputs = json.dumps([method, password, salt, rounds])
+    try:
+        return _PASSWORD_HASHES[inputs]
+    except KeyError:
+        pass
+
+    password_hash = None
+    key = None
+    if cache_enabled():
+        secret = _cache_secret(repo_path)
+        if secret is not None:
+            key = hmac.new(secret, inputs.encode('utf-8'), hashlib.sha256).hexdigest()
+            password_hash = read_cache(repo_path, "password_hashes", key)
+    if password_hash is None:
+        password_hash = hash_func()
+        if key is not None:
+            try:
+                write_cache(repo_path, password_hash, "password_hashes", key)
+            except Exception as e:
+                io.debug("unable to write password hash to cache: {}".format(repr(e)))
+    _PASSWORD_HASHES[inputs] = password_hash
+    return password_hash
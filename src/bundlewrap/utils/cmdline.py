@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 from ..exceptions import NoSuchNode, NoSuchGroup, UsageException
+from ..operations import connection_limiter
 from . import names
 from .text import mark_for_translation as _
 
@@ -44,3 +45,18 @@ def get_target_nodes(repo, target_string):
                         "unable to find group or node named '{}'"
                     ).format(name))
     return sorted(set(targets))
+
+
+def ssh_connection_summary():
+    """
+    Yields a line describing how long connections had to wait for
+    --max-ssh-connections or max_ssh_connections in nodes.py and
+    groups.py (nothing if no limits are configured).
+    """
+    stats = connection_limiter.summary()
+    if stats is None:
+        return
+    yield _(
+        "{connections} SSH connections, {waited} had to wait for a free slot "
+        "({wait_time:.1f}s total, {max_wait_time:.1f}s max)"
+    ).format(**stats)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from codecs import getwriter
+from datetime import datetime
+from json import dumps
+from os import fdopen
+
+from .text import mark_for_translation as _
+
+
+class EventLog(object):
+    """
+    Writes events as newline-delimited JSON objects, one per line, as
+    soon as they happen. Every event has at least 'event' (its type)
+    and 'time' (ISO 8601, local time).
+    """
+    def __init__(self, target):
+        """
+        target is either a path (the file will be truncated) or "fd:N"
+        to write to an already open file descriptor.
+        """
+        if target.startswith("fd:"):
+            try:
+                fd = int(target[3:])
+            except ValueError:
+                raise ValueError(_("invalid file descriptor: {}").format(target))
+            stream = fdopen(fd, 'wb')
+        else:
+            stream = open(target, 'wb')
+        self.stream = getwriter('utf-8')(stream)
+
+    def close(self):
+        self.stream.close()
+
+    def emit(self, event, **kwargs):
+        kwargs['event'] = event
+        kwargs['time'] = datetime.now().isoformat()
+        self.stream.write(dumps(kwargs, sort_keys=True) + "\n")
+        self.stream.flush()
+
+
+def emit(event_log, event, **kwargs):
+    """
+    Convenience wrapper that does nothing if event_log is None.
+    """
+    if event_log is not None:
+        event_log.emit(event, **kwargs)
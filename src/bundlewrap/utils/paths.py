@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from os.path import dirname, normpath
+
+from ..exceptions import BundleError
+from .text import mark_for_translation as _
+
+PATH_ITEM_TYPES = ("directory", "file", "symlink")
+
+
+def ancestors(path):
+    """
+    Yields all parent directories of the given normalized absolute
+    path, starting with the closest one.
+    """
+    while True:
+        parent = dirname(path)
+        if parent == path:
+            break
+        yield parent
+        path = parent
+    if path != "/":
+        # normpath() preserves a leading double slash
+        yield "/"
+
+
+class PathIndex(object):
+    """
+    Allows path items (files, directories, symlinks) to find other path
+    items above them without looking at every item.
+
+    All lookups return (position, item) tuples, where position is the
+    index of the item in the original list of items.
+    """
+    def __init__(self, items):
+        # normalized path -> path items at that path
+        self._by_path = {}
+        # item name (not normalized) -> path items with that name
+        self._by_name = {}
+
+        for position, item in enumerate(items):
+            if item.ITEM_TYPE_NAME not in PATH_ITEM_TYPES:
+                continue
+            path = normpath(item.name)
+            if not path.startswith("/"):
+                raise ValueError(_("directory paths must be absolute"))
+            self._by_path.setdefault(path, []).append((position, item))
+            self._by_name.setdefault(item.name, []).append((position, item))
+
+    def items_above(self, path, item_types):
+        result = []
+        for parent in ancestors(normpath(path)):
+            for position, item in self._by_path.get(parent, ()):
+                if item.ITEM_TYPE_NAME in item_types:
+                    result.append((position, item))
+        return result
+
+    def items_named(self, name, item_types):
+        return [
+            (position, item) for position, item in self._by_name.get(name, ())
+            if item.ITEM_TYPE_NAME in item_types
+        ]
+
+
+def path_auto_deps(item, path_index, blocking_items):
+    """
+    Implements get_auto_deps() for path items: Returns the ids of all
+    directories and symlinks above the given item or raises BundleError
+    for the first of the given blocking items (in the order of items).
+    """
+    if blocking_items:
+        position, blocking_item = min(blocking_items, key=lambda p_i: p_i[0])
+        raise BundleError(_(
+            "{item1} (from bundle '{bundle1}') blocking path to "
+            "{item2} (from bundle '{bundle2}')"
+        ).format(
+            item1=blocking_item.id,
+            bundle1=blocking_item.bundle.name,
+            item2=item.id,
+            bundle2=item.bundle.name,
+        ))
+    return [
+        parent.id for position, parent in
+        sorted(path_index.items_above(item.name, ("directory", "symlink")), key=lambda p_i: p_i[0])
+    ]
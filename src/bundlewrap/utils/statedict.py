@@ -142,7 +142,7 @@ def statedict_to_json(sdict, pretty=False):
     """
     Returns a canonical JSON representation of the given statedict.
     """
-    return dumps(order_dict(sdict), indent=4 if pretty else None)
+    return dumps(sdict, indent=4 if pretty else None, sort_keys=True)
 
 
 def validate_statedict(sdict):
@@ -1,10 +1,15 @@
 from codecs import getwriter
 from contextlib import contextmanager
 from datetime import datetime
-from multiprocessing import Condition, Lock, Queue
+from multiprocessing import Lock, Queue, Value
 from signal import signal, SIGPIPE, SIG_DFL
 from sys import stderr, stdout
-from threading import Thread
+from threading import Lock as ThreadLock, Thread
+from time import sleep
+try:
+    from queue import Empty
+except ImportError:  # Python 2
+    from Queue import Empty
 
 from .text import ANSI_ESCAPE, mark_for_translation as _
 
@@ -21,6 +26,14 @@ try:
 except NameError:  # Python 3
     input_function = input
 
+# max. number of messages written at once by the printer thread
+BATCH_SIZE = 1000
+# child processes send their messages in batches of this size...
+CHILD_BATCH_SIZE = 100
+# ...or after this many seconds, whichever comes first
+CHILD_FLUSH_INTERVAL = 0.1
+CLEAR_LINE = "\r\033[K"
+
 # prevent BrokenPipeError when piping into `head`
 # http://stackoverflow.com/questions/14207708/ioerror-errno-32-broken-pipe-python
 signal(SIGPIPE, SIG_DFL)
@@ -35,6 +48,15 @@ def write_to_stream(stream, msg):
 
 
 class IOManager(object):
+    """
+    Collects output from all processes and writes it from a single
+    thread in the parent process. Messages are sent through a queue as
+    lists of (log_type, text) tuples: child processes collect their
+    messages for a short while and send them together, since passing
+    each one through the queue individually is expensive. The printer
+    thread blocks until a message arrives, then takes whatever else has
+    piled up in the meantime and writes it all at once.
+    """
     def __init__(self):
         self.capture_mode = False
         self.child_mode = False
@@ -43,9 +65,14 @@ class IOManager(object):
     def activate_as_child(self, output_lock, output_queue, status_line_cleared):
         self.parent_mode = False
         self.child_mode = True
-        self.status_line_cleared = status_line_cleared
         self.output_lock = output_lock
         self.output_queue = output_queue
+        self.status_line_cleared = status_line_cleared
+        self.buffer = []
+        self.buffer_lock = ThreadLock()
+        flush_thread = Thread(target=self._flush_thread)
+        flush_thread.daemon = True
+        flush_thread.start()
 
     def activate_as_parent(self, debug=False):
         assert not self.child_mode
@@ -54,7 +81,11 @@ class IOManager(object):
         self.output_lock = Lock()
         self.parent_mode = True
         self.output_queue = Queue()
-        self.status_line_cleared = Condition()
+        # the status line currently shown (if any)
+        self.status_line = None
+        # set by any process that has cleared the status line while
+        # holding output_lock
+        self.status_line_cleared = Value('b', False, lock=False)
         self.thread = Thread(target=self._print_thread)
         self.thread.daemon = True
         self.thread.start()
@@ -94,19 +125,46 @@ class IOManager(object):
         return (self.output_lock, self.output_queue, self.status_line_cleared)
 
     def debug(self, msg):
-        self.output_queue.put({'msg': 'LOG', 'log_type': 'DBG', 'text': msg})
+        self._put('DBG', msg)
+
+    def flush(self):
+        """
+        Sends all messages collected by this child process to the
+        parent. Must be called before the process exits.
+        """
+        if not self.child_mode:
+            return
+        with self.buffer_lock:
+            if self.buffer:
+                self.output_queue.put(self.buffer)
+                self.buffer = []
 
     def job_add(self, msg):
-        self.output_queue.put({'msg': 'LOG', 'log_type': 'JOB_ADD', 'text': msg})
+        self._put('JOB_ADD', msg)
 
     def job_del(self, msg):
-        self.output_queue.put({'msg': 'LOG', 'log_type': 'JOB_DEL', 'text': msg})
+        self._put('JOB_DEL', msg)
 
     def stderr(self, msg):
-        self.output_queue.put({'msg': 'LOG', 'log_type': 'ERR', 'text': msg})
+        self._put('ERR', msg)
 
     def stdout(self, msg):
-        self.output_queue.put({'msg': 'LOG', 'log_type': 'OUT', 'text': msg})
+        self._put('OUT', msg)
+
+    def _put(self, log_type, msg):
+        if not self.child_mode:
+            self.output_queue.put([(log_type, msg)])
+            return
+        with self.buffer_lock:
+            self.buffer.append((log_type, msg))
+            if len(self.buffer) < CHILD_BATCH_SIZE:
+                return
+        self.flush()
+
+    def _flush_thread(self):
+        while True:
+            sleep(CHILD_FLUSH_INTERVAL)
+            self.flush()
 
     @contextmanager
     def job(self, job_text):
@@ -117,49 +175,88 @@ class IOManager(object):
     @property
     @contextmanager
     def lock(self):
+        """
+        Keeps the printer thread from writing anything (e.g. while
+        asking a question).
+        """
+        self.flush()
         with self.output_lock:
-            self.status_line_cleared.wait()
+            if TTY:
+                STDOUT_WRITER.write(CLEAR_LINE)
+                self.status_line_cleared.value = True
             yield
+        if TTY:
+            # wake up the printer thread so it redraws the status line
+            # even if there is nothing else to print (the message itself
+            # is ignored)
+            self._put('REDRAW', None)
+            self.flush()
 
     def _print_thread(self):
         assert self.parent_mode
         while True:
-            if self.output_lock.acquire(False):
-                msg = self.output_queue.get()
-                if msg['log_type'] == 'QUIT':
+            batch = self.output_queue.get()
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.extend(self.output_queue.get_nowait())
+                except Empty:
+                    break
+            with self.output_lock:
+                if not self._print_batch(batch):
                     break
-                if self.debug_mode and msg['log_type'] in ('OUT', 'DBG', 'ERR'):
-                    msg['text'] = datetime.now().strftime("[%Y-%m-%d %H:%M:%S.%f] ") + msg['text']
-                if self.jobs and TTY:
-                    self._write("\r\033[K")
-                if msg['log_type'] == 'OUT':
-                    self._write(msg['text'] + "\n")
-                elif msg['log_type'] == 'ERR':
-                    self._write(msg['text'] + "\n", err=True)
-                elif msg['log_type'] == 'DBG' and self.debug_mode:
-                    self._write(msg['text'] + "\n")
-                elif msg['log_type'] == 'JOB_ADD' and TTY:
-                    self.jobs.append(msg['text'])
-                elif msg['log_type'] == 'JOB_DEL' and TTY:
-                    self.jobs.remove(msg['text'])
-                if self.jobs and TTY:
-                    self._write("[status] " + self.jobs[0])
-                self.output_lock.release()
-            else:  # someone else is holding the output lock
-                # the process holding the lock should now be waiting for
-                # us to remove any status lines present before it starts
-                # printing
-                if self.jobs and TTY:
-                    self._write("\r\033[K")
-                self.status_line_cleared.notify()
-                # now we wait until the other process has finished and
-                # released the output lock
-                self.output_lock.acquire()
-                self.output_lock.release()
+
+    def _print_batch(self, batch):
+        """
+        Writes the given messages, returns False if the printer thread
+        should quit.
+        """
+        if self.status_line_cleared.value:
+            # somebody else took it off the screen
+            self.status_line = None
+            self.status_line_cleared.value = False
+
+        # list of (err, [text, ...]), consecutive messages for the same
+        # stream are kept together
+        chunks = []
+
+        def add(text, err=False):
+            if chunks and chunks[-1][0] == err:
+                chunks[-1][1].append(text)
+            else:
+                chunks.append((err, [text]))
+
+        keep_running = True
+        for log_type, text in batch:
+            if log_type == 'QUIT':
+                keep_running = False
+                break
+            if self.debug_mode and log_type in ('OUT', 'DBG', 'ERR'):
+                text = datetime.now().strftime("[%Y-%m-%d %H:%M:%S.%f] ") + text
+            if log_type == 'OUT':
+                add(text + "\n")
+            elif log_type == 'ERR':
+                add(text + "\n", err=True)
+            elif log_type == 'DBG' and self.debug_mode:
+                add(text + "\n")
+            elif log_type == 'JOB_ADD' and TTY:
+                self.jobs.append(text)
+            elif log_type == 'JOB_DEL' and TTY:
+                self.jobs.remove(text)
+
+        status_line = "[status] " + self.jobs[0] if self.jobs and TTY else None
+        if chunks or status_line != self.status_line:
+            if self.status_line is not None:
+                chunks.insert(0, (False, [CLEAR_LINE]))
+            if status_line is not None:
+                add(status_line)
+            for err, texts in chunks:
+                self._write("".join(texts), err=err)
+            self.status_line = status_line
+        return keep_running
 
     def shutdown(self):
         assert self.parent_mode
-        self.output_queue.put({'msg': 'LOG', 'log_type': 'QUIT'})
+        self.output_queue.put([('QUIT', None)])
         self.thread.join()
 
     def _write(self, msg, err=False):
@@ -69,3 +69,126 @@ def test_deterministic(tmpdir):
 
     assert len(hashes) == 1
     assert hashes.pop() == "8c155b4e7056463eb2c8a8345f4f316f6d7359f6"
+
+
+def test_changed_since(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {
+                'bundles': ["bundle1"],
+            },
+            "node2": {
+                'bundles': ["bundle2"],
+            },
+        },
+        bundles={
+            "bundle1": {
+                'files': {
+                    "/test": {
+                        'content': "foo",
+                    },
+                },
+            },
+            "bundle2": {},
+        },
+    )
+
+    with io.capture() as captured:
+        main("hash", "--save-snapshot", "before", path=str(tmpdir))
+    assert captured['stdout'] == ""
+
+    with io.capture() as captured:
+        main("hash", "--changed-since", "before", path=str(tmpdir))
+    assert captured['stdout'] == ""
+
+    tmpdir.join("bundles", "bundle1", "bundle.py").write(
+        "files = {'/test': {'content': 'bar'}}\n"
+    )
+    with io.capture() as captured:
+        main("hash", "--changed-since", "before", path=str(tmpdir))
+    assert captured['stdout'] == "node1\n"
+    assert captured['stderr'] == ""
+
+
+def test_cache_other_node_metadata(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {
+                'bundles': ["bundle1"],
+            },
+            "node2": {
+                'metadata': {'foo': "bar"},
+            },
+        },
+        bundles={
+            "bundle1": {
+                'files': {
+                    "/test": {
+                        'content_type': 'mako',
+                        'content': "${repo.get_node('node2').metadata['foo']}",
+                    },
+                },
+            },
+        },
+    )
+
+    with io.capture() as captured:
+        main("hash", "node1", path=str(tmpdir))
+    hash_before = captured['stdout']
+
+    tmpdir.join("nodes.py").write(
+        "nodes = {'node1': {'bundles': ['bundle1']}, 'node2': {'metadata': {'foo': 'baz'}}}\n"
+    )
+    with io.capture() as captured:
+        main("hash", "node1", path=str(tmpdir))
+    assert captured['stdout'] != hash_before
+    assert captured['stderr'] == ""
+
+
+def test_cache_unrelated_node_metadata(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    make_repo(
+        tmpdir,
+        groups={
+            "group1": {
+                'members': ["node3"],
+                'metadata_processors': ["processors.mark"],
+            },
+        },
+        nodes={
+            "node1": {
+                'bundles': ["bundle1"],
+            },
+            "node2": {
+                'metadata': {'foo': "bar"},
+            },
+            "node3": {},
+        },
+        bundles={
+            "bundle1": {
+                'files': {
+                    "/test": {
+                        'content_type': 'mako',
+                        'content': "${repo.get_node('node2').metadata['foo']}",
+                    },
+                },
+            },
+        },
+    )
+    tmpdir.mkdir("libs").join("processors.py").write(
+        "def mark(node_name, groups, metadata, **kwargs):\n"
+        "    open({}, 'w').close()\n"
+        "    return metadata\n".format(repr(str(tmpdir.join("marker"))))
+    )
+
+    for i in range(2):
+        with io.capture() as captured:
+            main("hash", "node1", path=str(tmpdir))
+        assert captured['stderr'] == ""
+    # the metadata of node3 has nothing to do with node1
+    assert not tmpdir.join("marker").exists()
+    assert tmpdir.join(".bw_cache", "hashes", "node1").exists()
@@ -0,0 +1,73 @@
+from json import loads
+
+from bundlewrap.cmdline import main
+from bundlewrap.utils.testing import make_repo
+from bundlewrap.utils.ui import io
+
+
+def test_single(tmpdir):
+    make_repo(tmpdir, nodes={"node1": {'metadata': {"foo": "bar"}}})
+    with io.capture() as captured:
+        main("metadata", "node1", path=str(tmpdir))
+    assert loads(captured['stdout']) == {"foo": "bar"}
+    assert captured['stderr'] == ""
+
+
+def test_multiple(tmpdir):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {'metadata': {"foo": 1}},
+            "node2": {'metadata': {"foo": 2}},
+            "node3": {'metadata': {"foo": 3}},
+        },
+    )
+    with io.capture() as captured:
+        main("metadata", "node1,node2,node3", "-p", "2", path=str(tmpdir))
+    results = {}
+    for line in captured['stdout'].splitlines():
+        result = loads(line)
+        results[result['node']] = result['metadata']
+    assert results == {
+        "node1": {"foo": 1},
+        "node2": {"foo": 2},
+        "node3": {"foo": 3},
+    }
+    assert captured['stderr'] == ""
+
+
+def test_memoized_processor(tmpdir):
+    make_repo(
+        tmpdir,
+        groups={
+            "group1": {
+                'members': ["node1", "node2", "node3"],
+                'metadata_processors': ["processors.double"],
+            },
+        },
+        nodes={
+            "node1": {'metadata': {"foo": 1}},
+            "node2": {'metadata': {"foo": 1, "bar": 5}},
+            "node3": {'metadata': {"foo": 2}},
+        },
+    )
+    tmpdir.mkdir("libs").join("processors.py").write(
+        "from bundlewrap.metadata import memoize\n"
+        "\n"
+        "@memoize(per_node=False)\n"
+        "def double(node_name, groups, metadata, **kwargs):\n"
+        "    metadata['double'] = metadata['foo'] * 2\n"
+        "    return metadata\n"
+    )
+    with io.capture() as captured:
+        main("metadata", "group1", "-p", "1", path=str(tmpdir))
+    results = {}
+    for line in captured['stdout'].splitlines():
+        result = loads(line)
+        results[result['node']] = result['metadata']
+    assert results == {
+        "node1": {"foo": 1, "double": 2},
+        "node2": {"foo": 1, "bar": 5, "double": 2},
+        "node3": {"foo": 2, "double": 4},
+    }
+    assert captured['stderr'] == ""
@@ -1,4 +1,9 @@
+from json import loads
+
+from bundlewrap import repo as repo_module
 from bundlewrap.cmdline import main
+from bundlewrap.repo import _flat_node_dict_from_file
+from bundlewrap.utils.cache import write_cache
 from bundlewrap.utils.testing import make_repo
 from bundlewrap.utils.ui import io
 
@@ -87,3 +92,63 @@ def test_groups(tmpdir):
         "node2: group1",
     ]
     assert captured['stderr'] == ""
+
+
+def test_repo_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    make_repo(
+        tmpdir,
+        groups={
+            "group1": {
+                'members': ["node2"],
+            },
+        },
+        nodes={
+            "node1": {},
+            "node2": {},
+        },
+    )
+    calls = []
+
+    def flat_node_dict_from_file(*args):
+        calls.append(None)
+        return _flat_node_dict_from_file(*args)
+
+    monkeypatch.setattr(repo_module, '_flat_node_dict_from_file', flat_node_dict_from_file)
+    for i in range(2):
+        with io.capture() as captured:
+            main("nodes", "-g", "group1", path=str(tmpdir))
+        assert captured['stdout'] == "node2\n"
+        assert captured['stderr'] == ""
+    # nodes.py was only executed to build the snapshot
+    assert len(calls) == 1
+    # bw nodes doesn't need any metadata
+    assert not tmpdir.join(".bw_cache", "repo_metadata").check()
+
+
+def test_repo_cache_metadata(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {'metadata': {"foo": "bar"}},
+        },
+    )
+    with io.capture() as captured:
+        main("metadata", "node1", path=str(tmpdir))
+    assert loads(captured['stdout']) == {"foo": "bar"}
+    snapshot_dirs = tmpdir.join(".bw_cache", "repo_metadata").listdir()
+    assert len(snapshot_dirs) == 1
+
+    # prove the next invocation reads metadata from the snapshot
+    write_cache(
+        str(tmpdir),
+        {"foo": "cached"},
+        "repo_metadata",
+        snapshot_dirs[0].basename,
+        "node1",
+    )
+    with io.capture() as captured:
+        main("metadata", "node1", path=str(tmpdir))
+    assert loads(captured['stdout']) == {"foo": "cached"}
+    assert captured['stderr'] == ""
@@ -0,0 +1,58 @@
+from bundlewrap.cmdline import apply, verify
+from bundlewrap.repo import Repository
+from bundlewrap.utils.testing import make_repo
+
+
+def _jobs(monkeypatch, module, command, repo, args):
+    jobs = []
+
+    def run_node_jobs(node_jobs, **kwargs):
+        jobs.extend(node_jobs)
+        return []
+
+    monkeypatch.setattr(module, 'run_node_jobs', run_node_jobs)
+    list(command(repo, args))
+    return jobs
+
+
+def _args(**kwargs):
+    args = {
+        'autoscale': False,
+        'debug': False,
+        'drift_check_hours': None,
+        'events': None,
+        'fast': False,
+        'force': False,
+        'interactive': False,
+        'item_workers': 1,
+        'node_workers': 1,
+        'profiling': False,
+        'skip_unchanged': False,
+        'target': "node1",
+        'workers': None,
+    }
+    args.update(kwargs)
+    return args
+
+
+def _repo(tmpdir):
+    make_repo(tmpdir, nodes={"node1": {}})
+    return Repository(str(tmpdir))
+
+
+def test_apply_drift_check_implies_skip_unchanged(tmpdir, monkeypatch):
+    args = _args(drift_check_hours=24)
+    job, = _jobs(monkeypatch, apply, apply.bw_apply, _repo(tmpdir), args)
+    assert job.skip_unchanged
+    assert job.drift_check_interval.total_seconds() == 24 * 3600
+
+
+def test_apply_no_skip_unchanged(tmpdir, monkeypatch):
+    job, = _jobs(monkeypatch, apply, apply.bw_apply, _repo(tmpdir), _args())
+    assert not job.skip_unchanged
+
+
+def test_verify_drift_check_implies_skip_unchanged(tmpdir, monkeypatch):
+    args = _args(drift_check_hours=24, show_all=False, summary=False)
+    job, = _jobs(monkeypatch, verify, verify.bw_verify, _repo(tmpdir), args)
+    assert job.skip_unchanged
@@ -0,0 +1,36 @@
+from json import loads
+
+from pytest import raises
+
+from bundlewrap.cmdline import run
+from bundlewrap.repo import Repository
+from bundlewrap.utils.testing import make_repo
+
+
+def test_run_end_after_exception(tmpdir, monkeypatch):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {},
+        },
+    )
+    repo = Repository(str(tmpdir))
+    events_path = str(tmpdir.join("events.json"))
+
+    def broken_pool(workers=4):
+        raise RuntimeError("worker pool broke")
+
+    monkeypatch.setattr(run, 'WorkerPool', broken_pool)
+    with raises(RuntimeError):
+        list(run.bw_run(repo, {
+            'command': "true",
+            'debug': False,
+            'events': events_path,
+            'may_fail': False,
+            'node_workers': 1,
+            'target': "node1",
+        }))
+
+    with open(events_path) as f:
+        events = [loads(line) for line in f]
+    assert [event['event'] for event in events] == ['run_start', 'run_end']
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from bundlewrap.concurrency import Autoscaler
+
+
+def _round(scaler, running=None, waiting=0, durations=None, failed=0):
+    """
+    Feeds one full round of finished tasks into the given Autoscaler.
+    """
+    limit = scaler.limit
+    if running is None:
+        running = limit
+    if durations is None:
+        durations = [1.0] * (limit - failed)
+    scaler.observe(running, waiting)
+    for i in range(failed):
+        scaler.task_finished(failed=True)
+    for seconds in durations:
+        scaler.task_finished(timedelta(seconds=seconds))
+
+
+def test_grow():
+    scaler = Autoscaler("test", 1, 8)
+    _round(scaler, waiting=5)
+    assert scaler.limit == 2
+    _round(scaler, waiting=1)
+    assert scaler.limit == 3
+    _round(scaler, waiting=5)
+    assert scaler.limit == 6
+    _round(scaler, waiting=10)
+    assert scaler.limit == 8
+
+
+def test_shrink():
+    scaler = Autoscaler("test", 2, 8)
+    scaler.limit = 6
+    _round(scaler, running=3)
+    assert scaler.limit == 3
+    _round(scaler, running=1)
+    assert scaler.limit == 2
+
+
+def test_steady():
+    scaler = Autoscaler("test", 1, 8)
+    scaler.limit = 4
+    _round(scaler)
+    assert scaler.limit == 4
+
+
+def test_error_halving():
+    scaler = Autoscaler("test", 1, 8)
+    scaler.limit = 8
+    _round(scaler, waiting=5, failed=3)
+    assert scaler.limit == 4
+    # 1 out of 4 is not more than ERROR_RATE
+    _round(scaler, failed=1)
+    assert scaler.limit == 4
+    _round(scaler, failed=4)
+    assert scaler.limit == 2
+    _round(scaler, failed=2)
+    assert scaler.limit == 1
+
+
+def test_latency_backoff():
+    scaler = Autoscaler("test", 1, 8)
+    _round(scaler, waiting=1, durations=[1.0])
+    assert scaler.limit == 2
+    assert scaler.best_round == (1, 1.0)
+    _round(scaler, waiting=2, durations=[3.0, 3.0])
+    # waiting tasks are ignored if latency got a lot worse
+    assert scaler.limit == 1
+    _round(scaler, waiting=1, durations=[1.5])
+    # not more than LATENCY_FACTOR times worse
+    assert scaler.limit == 2
+    _round(scaler, waiting=2, durations=[1.5, 2.5])
+    assert scaler.limit == 4
+
+
+def test_latency_same_limit():
+    scaler = Autoscaler("test", 1, 8)
+    scaler.limit = 2
+    _round(scaler, durations=[1.0, 1.0])
+    _round(scaler, waiting=2, durations=[5.0, 5.0])
+    # the best round didn't have a lower limit, so slow tasks are
+    # not blamed on concurrency
+    assert scaler.limit == 4
@@ -0,0 +1,16 @@
+from pytest import fixture
+
+from bundlewrap.utils.ui import io
+
+
+@fixture(autouse=True)
+def parent_io():
+    """
+    Most of BundleWrap logs through io, which only works once it has
+    been activated.
+    """
+    io.activate_as_parent()
+    try:
+        yield
+    finally:
+        io.shutdown()
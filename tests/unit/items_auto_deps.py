@@ -0,0 +1,47 @@
+from bundlewrap.deps import prepare_dependencies
+from bundlewrap.repo import Repository
+from bundlewrap.utils.testing import make_repo
+
+CUSTOM_ITEM = '''
+from bundlewrap.items import Item
+
+
+class Custom(Item):
+    BUNDLE_ATTRIBUTE_NAME = "customs"
+    ITEM_ATTRIBUTES = {}
+    ITEM_TYPE_NAME = "custom"
+
+    def get_auto_deps(self, items):
+        return [item.id for item in items if item.ITEM_TYPE_NAME == "file"]
+'''
+
+
+def test_custom_get_auto_deps(tmpdir):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {
+                'bundles': ["bundle1"],
+            },
+        },
+        bundles={
+            "bundle1": {
+                'customs': {
+                    "foo": {},
+                },
+                'files': {
+                    "/foo/bar": {
+                        'content_type': 'any',
+                    },
+                },
+                'directories': {
+                    "/foo": {},
+                },
+            },
+        },
+    )
+    tmpdir.mkdir("items").join("customs.py").write(CUSTOM_ITEM)
+    node = Repository(str(tmpdir)).get_node("node1")
+    items = {item.id: item for item in prepare_dependencies(node.items)}
+    assert "file:/foo/bar" in items["custom:foo"]._deps
+    assert "directory:/foo" in items["file:/foo/bar"]._deps
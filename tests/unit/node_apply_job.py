@@ -0,0 +1,205 @@
+from os.path import basename
+
+from bundlewrap import node as node_module
+from bundlewrap.items import Item
+from bundlewrap.node import ApplyJob, Node
+from bundlewrap.repo import Repository
+from bundlewrap.scheduler import run_node_jobs
+from bundlewrap.utils.testing import make_repo
+
+LOCAL_FILE_ITEM = '''
+from bundlewrap.items import Item
+
+
+class LocalFile(Item):
+    """
+    A file on the machine running the tests, so items can be applied
+    without SSH.
+    """
+    BUNDLE_ATTRIBUTE_NAME = "local_files"
+    ITEM_ATTRIBUTES = {'content': None}
+    ITEM_TYPE_NAME = "local_file"
+
+    def cdict(self):
+        return {'content': self.attributes['content']}
+
+    def fix(self, status):
+        with open(self.name, 'w') as f:
+            f.write(self.attributes['content'])
+
+    def sdict(self):
+        try:
+            with open(self.name) as f:
+                return {'content': f.read()}
+        except IOError:
+            return {'content': None}
+'''
+
+
+class FakeLock(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+
+def _item_id(tmpdir, name):
+    return "local_file:" + str(tmpdir.join(name))
+
+
+def _make_repo(tmpdir, local_files):
+    """
+    local_files maps file names within tmpdir to the attributes of the
+    local_file items managing them. needs and precedes use these names,
+    too.
+    """
+    bundle_items = {}
+    for name, attributes in local_files.items():
+        attributes = dict(attributes)
+        for attribute in ('needs', 'precedes'):
+            attributes[attribute] = [
+                _item_id(tmpdir, other) for other in attributes.get(attribute, [])
+            ]
+        bundle_items[str(tmpdir.join(name))] = attributes
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {
+                'bundles': ["bundle1"],
+            },
+        },
+        bundles={
+            "bundle1": {
+                'local_files': bundle_items,
+            },
+        },
+    )
+    tmpdir.mkdir("items").join("local_files.py").write(LOCAL_FILE_ITEM)
+    return Repository(str(tmpdir))
+
+
+def _apply(monkeypatch, node, trusted_items=None):
+    """
+    Applies the node the way bw apply does, just without locking it
+    or recording the apply on it. Returns a dict mapping file names to
+    status codes.
+
+    If trusted_items is given, the node is applied in fast mode with
+    these item ids found to be unchanged since the last apply.
+    """
+    monkeypatch.setattr(node_module, 'NodeLock', FakeLock)
+    monkeypatch.setattr(Node, '_record_apply', lambda self: None)
+    if trusted_items is not None:
+        monkeypatch.setattr(node_module, '_trusted_items', lambda node: set(trusted_items))
+        monkeypatch.setattr(node_module, '_write_item_record', lambda node, results: None)
+    job = ApplyJob(node, fast=trusted_items is not None)
+    for job in run_node_jobs([job], workers=2, node_workers=1, item_workers=2):
+        pass
+    assert job.done
+    assert not job.errors
+    return {
+        basename(item_id): status_code
+        for item_id, status_code, duration in job.item_results
+    }
+
+
+def _make_restart_repo(tmpdir):
+    return _make_repo(tmpdir, {
+        "restart": {
+            'content': "restarted",
+            'precedes': ["config"],
+            'triggered': True,
+        },
+        "config": {
+            'content': "config",
+        },
+    })
+
+
+def test_precede_chain_fired(tmpdir, monkeypatch):
+    repo = _make_restart_repo(tmpdir)
+    # the preceding item is correct itself, so only the item it
+    # precedes can trigger it
+    tmpdir.join("restart").write("restarted")
+    assert _apply(monkeypatch, repo.get_node("node1")) == {
+        "config": Item.STATUS_FIXED,
+        "restart": Item.STATUS_OK,
+    }
+    assert tmpdir.join("config").read() == "config"
+
+
+def test_precede_chain_not_fired(tmpdir, monkeypatch):
+    repo = _make_restart_repo(tmpdir)
+    tmpdir.join("restart").write("restarted")
+    tmpdir.join("config").write("config")
+    assert _apply(monkeypatch, repo.get_node("node1")) == {
+        "config": Item.STATUS_OK,
+        "restart": Item.STATUS_SKIPPED,
+    }
+
+
+def test_precede_multiple_items(tmpdir, monkeypatch):
+    repo = _make_repo(tmpdir, {
+        "restart": {
+            'content': "restarted",
+            'precedes': ["config", "unit"],
+            'triggered': True,
+        },
+        "config": {
+            'content': "config",
+        },
+        "unit": {
+            'content': "unit",
+        },
+    })
+    tmpdir.join("restart").write("restarted")
+    tmpdir.join("config").write("config")
+    assert _apply(monkeypatch, repo.get_node("node1")) == {
+        "config": Item.STATUS_OK,
+        "restart": Item.STATUS_OK,
+        "unit": Item.STATUS_FIXED,
+    }
+
+
+def _make_dependent_repo(tmpdir):
+    return _make_repo(tmpdir, {
+        "config": {
+            'content': "config",
+        },
+        "app": {
+            'content': "app",
+            'needs': ["config"],
+        },
+    })
+
+
+def test_trusted_item(tmpdir, monkeypatch):
+    repo = _make_dependent_repo(tmpdir)
+    tmpdir.join("config").write("config")
+    assert _apply(
+        monkeypatch,
+        repo.get_node("node1"),
+        trusted_items=[_item_id(tmpdir, "app")],
+    ) == {
+        "app": Item.STATUS_OK,
+        "config": Item.STATUS_OK,
+    }
+    # trusted items are not looked at
+    assert not tmpdir.join("app").exists()
+
+
+def test_trusted_item_dependency_fixed(tmpdir, monkeypatch):
+    repo = _make_dependent_repo(tmpdir)
+    assert _apply(
+        monkeypatch,
+        repo.get_node("node1"),
+        trusted_items=[_item_id(tmpdir, "app")],
+    ) == {
+        "app": Item.STATUS_FIXED,
+        "config": Item.STATUS_FIXED,
+    }
+    assert tmpdir.join("app").read() == "app"
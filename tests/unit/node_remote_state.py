@@ -0,0 +1,42 @@
+from bundlewrap.node import Node
+
+
+def _counting_fetch():
+    calls = []
+
+    def fetch(node):
+        calls.append(node.name)
+        return len(calls)
+    return fetch, calls
+
+
+def test_remote_state_cached():
+    node = Node("node1")
+    fetch, calls = _counting_fetch()
+    assert node.remote_state("users", fetch) == 1
+    assert node.remote_state("users", fetch) == 1
+    assert len(calls) == 1
+
+
+def test_invalidate_all():
+    node = Node("node1")
+    fetch, calls = _counting_fetch()
+    node.remote_state("users", fetch)
+    node.remote_state("groups", fetch)
+    node.invalidate_remote_state()
+    assert node.remote_state("users", fetch) == 3
+    assert node.remote_state("groups", fetch) == 4
+
+
+def test_expire_on_changes():
+    node = Node("node1")
+    fetch, calls = _counting_fetch()
+    node._expire_remote_state(0)
+    node.remote_state("users", fetch)
+    node._expire_remote_state(0)
+    assert node.remote_state("users", fetch) == 1
+    # another worker fixed an item on this node
+    node._expire_remote_state(1)
+    assert node.remote_state("users", fetch) == 2
+    node._expire_remote_state(1)
+    assert node.remote_state("users", fetch) == 2
@@ -0,0 +1,37 @@
+from bundlewrap.operations import ConnectionLimiter
+from bundlewrap.repo import Repository
+from bundlewrap.utils.testing import make_repo
+
+
+def test_same_hostname(tmpdir):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {
+                'hostname': "host.example.com",
+                'max_ssh_connections': 1,
+            },
+            "node2": {
+                'hostname': "host.example.com",
+                'max_ssh_connections': 2,
+            },
+        },
+    )
+    repo = Repository(str(tmpdir))
+    limiter = ConnectionLimiter()
+    limiter.configure(repo.nodes)
+
+    assert limiter.limits["node1"] != limiter.limits["node2"]
+    with limiter.connection("host.example.com", node_name="node1"):
+        # node1 is at its limit, node2 isn't
+        assert not limiter.limits["node1"][0].acquire(False)
+        assert limiter.limits["node2"][0].acquire(False)
+        limiter.limits["node2"][0].release()
+    with limiter.connection("host.example.com", node_name="node2"):
+        pass
+    with limiter.connection("host.example.com", node_name="node2"):
+        pass
+
+    assert limiter.connection_count("node1") == 1
+    assert limiter.connection_count("node2") == 2
+    assert limiter.summary()['connections'] == 3
@@ -0,0 +1,80 @@
+from subprocess import Popen
+from time import time
+
+from pytest import raises
+
+from bundlewrap import operations
+from bundlewrap.exceptions import RemoteTimeout
+from bundlewrap.operations import _remaining_time, run, time_limit
+
+
+def _local_popen(command, calls=None):
+    """
+    Returns a replacement for Popen that runs the given shell command
+    locally instead of ssh.
+    """
+    def popen(args, **kwargs):
+        if calls is not None:
+            calls.append(args)
+        return Popen(["sh", "-c", command], **kwargs)
+    return popen
+
+
+def test_time_limit_nesting():
+    assert _remaining_time(None) is None
+    assert _remaining_time(5) == 5
+    with time_limit(time() + 100):
+        assert 99 < _remaining_time(None) <= 100
+        assert _remaining_time(5) == 5
+        with time_limit(time() + 10):
+            assert 9 < _remaining_time(None) <= 10
+            # a later deadline doesn't extend the earlier one
+            with time_limit(time() + 1000):
+                assert 9 < _remaining_time(None) <= 10
+            with time_limit(None):
+                assert 9 < _remaining_time(None) <= 10
+        assert 99 < _remaining_time(None) <= 100
+    assert _remaining_time(None) is None
+
+
+def test_time_limit_exception():
+    with raises(ValueError):
+        with time_limit(time() + 100):
+            raise ValueError
+    assert _remaining_time(None) is None
+
+
+def test_run_timeout_partial_output(monkeypatch):
+    monkeypatch.setattr(operations, 'Popen', _local_popen("echo partial; exec sleep 10"))
+    start = time()
+    with raises(RemoteTimeout) as excinfo:
+        run("localhost", "true", timeout=0.5)
+    assert time() - start < 5
+    assert excinfo.value.result.stdout == b"partial\n"
+    assert "partial" in str(excinfo.value)
+
+
+def test_run_deadline(monkeypatch):
+    monkeypatch.setattr(operations, 'Popen', _local_popen("echo partial; exec sleep 10"))
+    with time_limit(time() + 0.5):
+        with raises(RemoteTimeout) as excinfo:
+            run("localhost", "true", timeout=100)
+    assert excinfo.value.result.stdout == b"partial\n"
+
+
+def test_run_deadline_passed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(operations, 'Popen', _local_popen("true", calls=calls))
+    with time_limit(time() - 1):
+        with raises(RemoteTimeout) as excinfo:
+            run("localhost", "true")
+    assert excinfo.value.result is None
+    assert not calls
+
+
+def test_run_within_timeout(monkeypatch):
+    monkeypatch.setattr(operations, 'Popen', _local_popen("echo done"))
+    with time_limit(time() + 100):
+        result = run("localhost", "true", timeout=10)
+    assert result.return_code == 0
+    assert result.stdout == b"done\n"
@@ -0,0 +1,81 @@
+from time import sleep
+
+from bundlewrap import scheduler
+from bundlewrap.concurrency import WorkerPool
+from bundlewrap.repo import Repository
+from bundlewrap.scheduler import NodeJob, run_node_jobs
+from bundlewrap.utils.testing import make_repo
+
+
+class SleepJob(NodeJob):
+    def __init__(self, node, tasks):
+        super(SleepJob, self).__init__(node)
+        self.tasks_left = tasks
+        self.tasks_finished = 0
+        self.total = tasks
+
+    def next_task(self):
+        if not self.tasks_left:
+            return None
+        self.tasks_left -= 1
+        return {
+            'task_id': "sleep{}".format(self.tasks_left),
+            'target': sleep,
+            'args': (0.1,),
+        }
+
+    def ready_tasks(self):
+        return self.tasks_left
+
+    def task_failed(self, task_id, exception):
+        raise exception
+
+    def task_finished(self, task_id, return_value, duration):
+        self.tasks_finished += 1
+        self.done = self.tasks_finished == self.total
+
+
+class ShrinkingAutoscaler(object):
+    """
+    Starts out at the maximum and drops to the minimum as soon as the
+    first task has finished.
+    """
+    def __init__(self, name, minimum, maximum):
+        self.minimum = minimum
+        self.limit = maximum
+
+    def observe(self, running, waiting):
+        pass
+
+    def task_finished(self, duration=None, failed=False):
+        self.limit = self.minimum
+
+
+def test_scale_down(tmpdir, monkeypatch):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {},
+        },
+    )
+    repo = Repository(str(tmpdir))
+    job = SleepJob(repo.get_node("node1"), 6)
+
+    quit_while_busy = []
+    original_quit = WorkerPool.quit
+
+    def quit(self, wid):
+        quit_while_busy.append(not job.done)
+        original_quit(self, wid)
+
+    monkeypatch.setattr(scheduler, 'Autoscaler', ShrinkingAutoscaler)
+    monkeypatch.setattr(WorkerPool, 'quit', quit)
+
+    for j in run_node_jobs([job], workers=3, node_workers=1, item_workers=3, autoscale=True):
+        pass
+
+    assert job.done
+    assert len(quit_while_busy) == 3
+    # two of the three workers must have been shut down before all
+    # tasks were done
+    assert quit_while_busy.count(True) == 2
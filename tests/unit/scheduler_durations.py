@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from bundlewrap.scheduler import expected_durations, longest_first, record_durations
+
+
+class FakeRepo(object):
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeNode(object):
+    def __init__(self, name):
+        self.items_counted = False
+        self.name = name
+
+    @property
+    def items(self):
+        self.items_counted = True
+        return []
+
+
+def _record(repo, **seconds):
+    record_durations(repo, 'apply', {
+        node_name: timedelta(seconds=node_seconds)
+        for node_name, node_seconds in seconds.items()
+    })
+
+
+def test_weighting(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    repo = FakeRepo(str(tmpdir))
+    _record(repo, node1=10)
+    _record(repo, node1=20)
+    _record(repo, node1=40)
+    assert expected_durations(repo, [FakeNode("node1")], 'apply') == {'node1': 27.5}
+
+
+def test_new_node(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    repo = FakeRepo(str(tmpdir))
+    _record(repo, node1=10, node2=60)
+    new_node = FakeNode("node3")
+    assert expected_durations(repo, [FakeNode("node1"), new_node], 'apply') == {
+        'node1': 10.0,
+        'node3': 60.0,
+    }
+    assert not new_node.items_counted
+
+
+def test_no_history(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    repo = FakeRepo(str(tmpdir))
+    assert expected_durations(repo, [FakeNode("node1")], 'apply') == {'node1': 0.0}
+
+
+def test_longest_first(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    repo = FakeRepo(str(tmpdir))
+    _record(repo, node1=10, node2=60, node3=30)
+    nodes = [FakeNode(name) for name in ("node1", "node2", "node3", "node4", "node0")]
+    assert [node.name for node in longest_first(repo, nodes, 'apply')] == \
+        ["node0", "node2", "node4", "node3", "node1"]
+
+
+def test_operations_separate(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    repo = FakeRepo(str(tmpdir))
+    _record(repo, node1=10)
+    assert expected_durations(repo, [FakeNode("node1")], 'verify') == {'node1': 0.0}
+
+
+def test_cache_disabled(tmpdir, monkeypatch):
+    monkeypatch.delenv("BWREPOCACHE", raising=False)
+    repo = FakeRepo(str(tmpdir))
+    _record(repo, node1=10)
+    assert not tmpdir.join(".bw_cache").exists()
+    assert expected_durations(repo, [FakeNode("node1")], 'apply') == {'node1': 0.0}
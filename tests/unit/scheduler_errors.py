@@ -0,0 +1,73 @@
+from bundlewrap.repo import Repository
+from bundlewrap.scheduler import NodeJob, run_node_jobs
+from bundlewrap.utils.testing import make_repo
+
+
+def _nothing():
+    return None
+
+
+class CountingJob(NodeJob):
+    """
+    Runs a few tasks that do nothing. If broken_method is given, that
+    method raises an exception.
+    """
+    def __init__(self, node, broken_method=None):
+        super(CountingJob, self).__init__(node)
+        self.broken_method = broken_method
+        self.tasks_finished = 0
+        self.tasks_left = 3
+
+    def _maybe_break(self, method):
+        if method == self.broken_method:
+            raise ValueError("{} is broken".format(method))
+
+    def next_task(self):
+        self._maybe_break('next_task')
+        if not self.tasks_left:
+            return None
+        self.tasks_left -= 1
+        return {
+            'task_id': "task{}".format(self.tasks_left),
+            'target': _nothing,
+        }
+
+    def task_failed(self, task_id, exception):
+        raise exception
+
+    def task_finished(self, task_id, return_value, duration):
+        self._maybe_break('task_finished')
+        self.tasks_finished += 1
+        self.done = self.tasks_finished == 3
+
+
+def _run(tmpdir, broken_method):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {},
+            "node2": {},
+        },
+    )
+    repo = Repository(str(tmpdir))
+    broken_job = CountingJob(repo.get_node("node1"), broken_method=broken_method)
+    job = CountingJob(repo.get_node("node2"))
+    yielded = [
+        j.node.name
+        for j in run_node_jobs([broken_job, job], workers=2, node_workers=2, item_workers=2)
+    ]
+    # once when started, once when done
+    assert sorted(yielded) == ["node1", "node1", "node2", "node2"]
+    assert broken_job.done
+    assert [str(e) for e in broken_job.errors] == ["{} is broken".format(broken_method)]
+    assert job.done
+    assert not job.errors
+    assert job.tasks_finished == 3
+
+
+def test_next_task_fails(tmpdir):
+    _run(tmpdir, 'next_task')
+
+
+def test_task_finished_fails(tmpdir):
+    _run(tmpdir, 'task_finished')
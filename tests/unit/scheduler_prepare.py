@@ -0,0 +1,52 @@
+from bundlewrap.repo import Repository
+from bundlewrap.scheduler import NodeJob, run_node_jobs
+from bundlewrap.utils.testing import make_repo
+
+
+def _prepared(node):
+    return getattr(node, 'prepared', False)
+
+
+class PreparingJob(NodeJob):
+    def __init__(self, node):
+        super(PreparingJob, self).__init__(node)
+        self.result = []
+        self.tasks_left = 3
+
+    def next_task(self):
+        if not self.tasks_left:
+            return None
+        self.tasks_left -= 1
+        return {
+            'task_id': "task{}".format(self.tasks_left),
+            'target': _prepared,
+            'args': (self.node,),
+        }
+
+    def prepare(self):
+        self.node.prepared = True
+
+    def task_failed(self, task_id, exception):
+        raise exception
+
+    def task_finished(self, task_id, return_value, duration):
+        self.result.append(return_value)
+        self.done = len(self.result) == 3
+
+
+def test_workers_inherit_prepared_nodes(tmpdir):
+    make_repo(
+        tmpdir,
+        nodes={
+            "node1": {},
+            "node2": {},
+        },
+    )
+    repo = Repository(str(tmpdir))
+    jobs = [PreparingJob(node) for node in repo.nodes]
+    for job in run_node_jobs(jobs, workers=3, node_workers=2, item_workers=2):
+        pass
+    for job in jobs:
+        # the node was sent to the worker as a reference, so the worker
+        # looked at its own copy
+        assert job.result == [True, True, True]
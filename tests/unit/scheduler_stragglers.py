@@ -0,0 +1,28 @@
+from time import time
+
+from bundlewrap.node import Node
+from bundlewrap.scheduler import NodeJob, _straggler_report
+
+
+def test_no_tasks():
+    assert _straggler_report({}, {}) is None
+
+
+def test_slowest_nodes():
+    jobs = {name: NodeJob(Node(name)) for name in ("node1", "node2", "node3", "node4")}
+    now = time()
+    running_tasks = {}
+    task_start_times = {}
+    for node_name, task_id, seconds in (
+        ("node1", "file:/foo", 10),
+        ("node1", "file:/bar", 50),
+        ("node2", "pkg_apt:vim", 30),
+        ("node3", "action:reboot", 70),
+        ("node4", "user:jdoe", 1),
+    ):
+        global_task_id = "{}:{}".format(node_name, task_id)
+        running_tasks[global_task_id] = (jobs[node_name], task_id)
+        task_start_times[global_task_id] = now - seconds
+    assert _straggler_report(running_tasks, task_start_times) == (
+        "slowest: node3 (action:reboot, 70s), node1 (file:/bar, 50s), node2 (pkg_apt:vim, 30s)"
+    )
@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from bundlewrap.utils import cache
+
+
+def _hash_func(calls):
+    def hash_func():
+        calls.append(None)
+        return "$6$hash"
+    return hash_func
+
+
+def test_password_hash_not_keyed_on_plain_digest(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    monkeypatch.setattr(cache, '_PASSWORD_HASHES', {})
+    calls = []
+    assert cache.cached_password_hash(
+        str(tmpdir), _hash_func(calls), "sha512", "secret", salt="salt",
+    ) == "$6$hash"
+    plain_key = hashlib.sha256(
+        json.dumps(["sha512", "secret", "salt", None]).encode('utf-8')
+    ).hexdigest()
+    cached_files = [f.basename for f in tmpdir.join(".bw_cache", "password_hashes").listdir()]
+    assert len(cached_files) == 1
+    assert plain_key not in cached_files
+
+    # a new process will find the hash on disk
+    monkeypatch.setattr(cache, '_PASSWORD_HASHES', {})
+    assert cache.cached_password_hash(
+        str(tmpdir), _hash_func(calls), "sha512", "secret", salt="salt",
+    ) == "$6$hash"
+    assert len(calls) == 1
+
+
+def test_password_hash_unwritable_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("BWREPOCACHE", "1")
+    monkeypatch.setattr(cache, '_PASSWORD_HASHES', {})
+    tmpdir.join(".bw_cache").write("not a directory")
+    calls = []
+    assert cache.cached_password_hash(
+        str(tmpdir), _hash_func(calls), "sha512", "secret",
+    ) == "$6$hash"
+    assert len(calls) == 1
@@ -0,0 +1,44 @@
+from time import sleep, time
+
+from bundlewrap.utils import ui
+from bundlewrap.utils.ui import CLEAR_LINE, io
+
+
+class FakeStream(object):
+    def __init__(self):
+        self.written = ""
+
+    def flush(self):
+        pass
+
+    def write(self, msg):
+        self.written += msg
+
+
+def _wait_for(condition):
+    """
+    Gives the printer thread some time to write what we expect.
+    """
+    deadline = time() + 10
+    while not condition():
+        assert time() < deadline
+        sleep(0.01)
+
+
+def test_lock_redraws_status_line(monkeypatch):
+    stream = FakeStream()
+    monkeypatch.setattr(ui, 'STDOUT_WRITER', stream)
+    monkeypatch.setattr(ui, 'TTY', True)
+    io.job_add("job1")
+    _wait_for(lambda: "[status] job1" in stream.written)
+
+    with io.lock:
+        stream.write("question? ")
+    _wait_for(lambda: stream.written.count("[status] job1") == 2)
+    assert stream.written == "[status] job1" + CLEAR_LINE + "question? [status] job1"
+
+    # the status line is known to be on screen again
+    io.job_del("job1")
+    io.stdout("done")
+    _wait_for(lambda: stream.written.endswith("done\n"))
+    assert stream.written.endswith("[status] job1" + CLEAR_LINE + "done\n")